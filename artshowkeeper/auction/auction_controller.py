@@ -20,7 +20,7 @@ import os
 
 from artshowkeeper.common.convert import *
 from artshowkeeper.common.parameter import *
-from artshowkeeper.common.response import respondHtml, respondXml, respondCustomDataFile
+from artshowkeeper.common.response import respondHtml, respondXml, respondCustomDataFile, conditional
 from artshowkeeper.common.result import Result
 from artshowkeeper.common.authentication import auth, UserGroups
 from artshowkeeper.model.item import ItemField, ItemState
@@ -30,6 +30,7 @@ URL_PREFIX = '/auction'
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR_CUSTOM_DATA = None
 blueprint = flask.Blueprint('auction', __name__, template_folder = 'templates', static_folder = 'static')
+STATUS_WAIT_SECONDS = 25
 
 @blueprint.route('/', methods = ['GET', 'POST'])
 def index():
@@ -49,6 +50,7 @@ def getCustomFile(filename):
 
 @blueprint.route('/list', methods = ['GET', 'POST'])
 @auth(UserGroups.SCAN_DEVICE)
+@conditional()
 def listItems():
     items = flask.g.model.getAllItemsInAuction()
     items.sort(key=lambda item: item[ItemField.AUCTION_SORT_CODE])
@@ -70,7 +72,20 @@ def showStatus():
 
 @blueprint.route('/getstatus', methods = ['GET', 'POST'])
 @auth()
+@conditional()
 def getStatus():
+    return __respondStatus()
+
+@blueprint.route('/waitstatus', methods = ['GET'])
+@auth()
+def waitStatus():
+    """Long poll of the status. The status is returned when the auction or totals of items
+    change (compared to the parameter Version) or after STATUS_WAIT_SECONDS.
+    """
+    version = flask.g.model.waitForAuctionChange(toInt(getParameter('Version')), STATUS_WAIT_SECONDS)
+    return __respondStatus(version)
+
+def __respondStatus(statusVersion=None):
     item = formatItem(flask.g.model.getItemInAuction(), flask.g.language)
     if item is not None:
         itemCode = item[ItemField.CODE]
@@ -84,7 +99,8 @@ def getStatus():
     
     return respondXml('getstatus', flask.g.userGroup, flask.g.language, {
         'item': item,
-        'charity': charityAmount })
+        'charity': charityAmount,
+        'version': statusVersion })
 
 @blueprint.route('/auction', methods = ['GET', 'POST'])
 @auth()
@@ -156,17 +156,38 @@ function processResponse(xmlDoc)
     }
 }
 
+var statusVersion = null;
+
 function onRefresh()
 {
+    // The server answers when the auction changes, so the next request is sent right away.
     var request = createHttpRequest()
     request.onreadystatechange = function()
     {
-        if ((request.readyState == 4) && (request.status == 200))
+        if (request.readyState == 4)
         {
-            processResponse(request.responseXML);
+            var version = null;
+            if (request.status == 200)
+            {
+                processResponse(request.responseXML);
+                version = getValueOrNull(request.responseXML, getTagOrNull(request.responseXML, "Auction"), "//Version");
+            }
+            if (version != null)
+            {
+                statusVersion = version;
+                onRefresh();
+            }
+            else
+            {
+                setTimeout(onRefresh, 1500);
+            }
         }
     }
     var url = document.getElementById("statusURL").innerText;
+    if (statusVersion != null)
+    {
+        url = url + "?Version=" + encodeURIComponent(statusVersion);
+    }
     request.open("GET", url, true)
     request.send(null)
 }
@@ -186,7 +207,7 @@ function start()
 {
     if (isBrowserValid())
     {
-        setInterval(onRefresh, 1500);
+        onRefresh();
     }
     else
     {
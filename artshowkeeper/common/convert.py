@@ -18,6 +18,7 @@ import json
 from decimal import Decimal
 from decimal import InvalidOperation
 from datetime import datetime
+from collections.abc import Mapping
 
 def toNonEmptyStr(value, default=None):
     """Convert a value to a string if not None or empty string.
@@ -95,5 +96,7 @@ class JSONDecimalEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, Decimal):
             return str(obj)
+        elif isinstance(obj, Mapping):
+            return dict(obj)
         else:
             return json.JSONEncoder.default(self, obj)
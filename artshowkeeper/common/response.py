@@ -15,11 +15,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import os
+import functools
 import flask
 import jinja2
 import logging
 from xml.dom import minidom
-from . translate import translateXhtml
+from . translate import translateXhtml, translateXhtmlTemplate, translateValue, TRANSLATE_FILTER
 
 def makeXmlResponse(xml):
     response = flask.make_response(xml)
@@ -27,6 +28,33 @@ def makeXmlResponse(xml):
     response.headers['Cache-Control'] = 'no-cache'
     return response
 
+def conditional():
+    """Answer conditional GET requests of a page which depends only on data of the model.
+    The page gets an ETag derived from the version of the data (see Model.getDataVersion),
+    the user group and the language, and Last-Modified. A request whose If-None-Match
+    includes the ETag is answered with 304 Not Modified without rendering the page.
+    """
+    def decorator_conditional(func):
+        @functools.wraps(func)
+        def decorated_function(*args, **kwargs):
+            if flask.request.method not in ['GET', 'HEAD']:
+                return func(*args, **kwargs)
+
+            version, modified = flask.g.model.getDataVersion()
+            etag = '{0}.{1}.{2}'.format(version, flask.g.userGroup, flask.g.language)
+            if flask.request.if_none_match.contains(etag):
+                response = flask.Response(status=304)
+                response.headers['Cache-Control'] = 'no-cache'
+            else:
+                response = flask.make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = modified
+            return response
+        return decorated_function
+    return decorator_conditional
+
 def enhanceXhtml(xmldoc):
     headElement = xmldoc.getElementsByTagName('head')
     if len(headElement) > 0:
@@ -41,12 +69,47 @@ def enhanceXhtml(xmldoc):
 
     return xmldoc
 
+ENHANCED_HEAD = '<meta name="viewport" content="width=device-width, initial-scale=1.0"/><meta charset="UTF-8"/>'
+"""Elements appended to the element head (see enhanceXhtml)."""
+
+class TranslatedTemplateLoader(jinja2.BaseLoader):
+    """Loader of XHTML templates translated to a language and enhanced like by enhanceXhtml."""
+    def __init__(self, language):
+        self.__language = language
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = environment.loader.get_source(environment, template)
+        source = translateXhtmlTemplate(self.__language, source)
+        index = source.find('</head>')
+        if index >= 0:
+            source = source[:index] + ENHANCED_HEAD + source[index:]
+        return source, filename, uptodate
+
+__translatedTemplates = {}
+
+def getTranslatedTemplate(filePath, language):
+    """Get a translated template (see TranslatedTemplateLoader).
+    Templates are translated once per language and kept until their source changes.
+    Raises:
+        jinja2.exceptions.TemplateNotFound if there is no such template.
+    """
+    environment = flask.current_app.jinja_env
+    key = (environment, filePath, language)
+    template = __translatedTemplates.get(key, None)
+    if template is None or (environment.auto_reload and not template.is_up_to_date):
+        if TRANSLATE_FILTER not in environment.filters:
+            environment.filters[TRANSLATE_FILTER] = translateValue
+        template = TranslatedTemplateLoader(language).load(environment, filePath, environment.make_globals(None))
+        __translatedTemplates[key] = template
+    return template
+
 def respondTranslatedXhtml(name, group, language, parameters=None):
-    """Rendered XHTML is post-processed at the server.
-    This processing replaces content of every attributes 'value' and 'title' and elements
-    whose content begins with '__' with a text retrieved from a translation XML.
+    """Respond with a translated XHTML.
+    Content of every attributes 'value' and 'title' and text which begins with '__'
+    is replaced with a text retrieved from a translation XML (see translateXhtml).
     If the message is not found, the original content is stripped of '__' and
-    it is used as the content.
+    it is used as the content. Static text of a template is translated once
+    (see getTranslatedTemplate), values are translated when rendered.
 
     Example:
     Text '__Some Text' searched for a message with id 'Some Text'.
@@ -61,12 +124,13 @@ def respondTranslatedXhtml(name, group, language, parameters=None):
         else:
             filePath = '{0}.xhtml'.format(name)
 
-        xml = flask.render_template(filePath, language=language, **(parameters or {}))
-        xml = enhanceXhtml(translateXhtml(language, minidom.parseString(xml))).toxml()
+        xml = flask.render_template(
+                getTranslatedTemplate(filePath, language), language=language, **(parameters or {}))
+        xml = xml.lstrip('\ufeff')
         if xml.startswith('<?xml'):
             index = xml.find('?>')
             if index > 0:
-                xml = xml[(index + 2):]
+                xml = xml[(index + 2):].lstrip()
         return makeXmlResponse('<!DOCTYPE html>\n' + xml)
                 
     except jinja2.exceptions.TemplateNotFound:
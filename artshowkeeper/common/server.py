@@ -0,0 +1,118 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import logging
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI server which handles requests by a fixed pool of threads."""
+    daemon_threads = True
+
+    def __init__(self, address, threads, listener=None):
+        super().__init__(address, PooledWSGIRequestHandler, bind_and_activate=listener is None)
+        if listener is not None:
+            # Serve a socket shared by more processes
+            self.socket.close()
+            self.socket = listener
+            self.server_address = listener.getsockname()
+            self.server_name = socket.getfqdn(self.server_address[0])
+            self.server_port = self.server_address[1]
+            self.setup_environ()
+        self.__executor = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.__executor.submit(self.__processRequest, request, client_address)
+
+    def __processRequest(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.__executor.shutdown(wait=False)
+
+class PooledWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        logging.getLogger('server').info('%s %s', self.address_string(), format % args)
+
+class StdlibServer:
+    """Server based on the standard library (see PooledWSGIServer)."""
+    def __init__(self, app, host, port, threads, listener):
+        self.__server = PooledWSGIServer((host, port), threads, listener)
+        self.__server.set_app(app)
+
+    @property
+    def port(self):
+        return self.__server.server_port
+
+    def run(self):
+        """Serve requests until close() is called."""
+        self.__server.serve_forever()
+
+    def close(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+class WaitressServer:
+    """Server based on waitress."""
+    def __init__(self, app, host, port, threads, listener):
+        if listener is not None:
+            self.__server = waitress.create_server(app, sockets=[listener], threads=threads)
+        else:
+            self.__server = waitress.create_server(app, host=host, port=port, threads=threads)
+
+    @property
+    def port(self):
+        return self.__server.effective_port
+
+    def run(self):
+        """Serve requests until close() is called."""
+        self.__server.run()
+
+    def close(self):
+        self.__server.close()
+
+def createListener(host, port):
+    """Create a listening socket which can be served by more processes (see createServer)."""
+    return socket.create_server((host, port))
+
+def createServer(app, host, port, threads, useWaitress=True, listener=None):
+    """Create a multi-threaded WSGI server.
+    Args:
+        app: WSGI application.
+        host: Host name or address to listen on.
+        port: Port (0 to pick a free one).
+        threads: Number of threads handling requests.
+        useWaitress: Use waitress if it is installed.
+        listener: Listening socket to serve instead of host and port (see createListener).
+    Returns:
+        Server with methods run() and close() and a property port.
+    """
+    if useWaitress and waitress is not None:
+        return WaitressServer(app, host, port, threads, listener)
+    else:
+        return StdlibServer(app, host, port, threads, listener)
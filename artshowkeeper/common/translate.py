@@ -15,9 +15,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import logging
+import re
 import string
 import xml.dom
 from xml.dom import minidom
+from xml.sax.saxutils import escape, unescape
+from markupsafe import Markup
 
 __phraseDictionaries = {}
 
@@ -69,3 +72,158 @@ def translateXhtml(language, xml):
         logging.getLogger('translate').error(u'XML: {0}'.format(xml.encode('ascii', 'ignore')))
         raise
 
+
+TRANSLATED_ATTRIBUTES = ['value', 'title']
+"""Attributes whose values are translated (see translateXhtmlElement)."""
+
+TRANSLATE_FILTER = 'translate'
+"""Name of the template filter translateValue."""
+
+__TEMPLATE_TAG = re.compile(r'\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\}', re.DOTALL)
+__TEMPLATE_EXPRESSION = re.compile(r'(\{\{[-+]?)(.*?)([-+]?\}\})$', re.DOTALL)
+
+def translateValue(value, language):
+    """Translate a value rendered by a template translated by translateXhtmlTemplate.
+    Markup (e.g. output of a macro) is not translated.
+    """
+    if isinstance(value, str) and not isinstance(value, Markup) and '__' in value:
+        return translateString(language, value)
+    else:
+        return value
+
+class XhtmlTemplateTranslator:
+    """Translator of static text of a template (see translateXhtmlTemplate).
+    It follows XHTML syntax of the static text. Tags of the template do not change it.
+    """
+    TEXT = 'text'
+    TAG = 'tag'
+    ATTRIBUTE_VALUE = 'attribute value'
+    OTHER_MARKUP = 'other markup'
+
+    __OTHER_MARKUP_ENDS = [('<!--', '-->'), ('<![CDATA[', ']]>'), ('<?', '?>'), ('<!', '>')]
+
+    def __init__(self, language):
+        self.__language = language
+        self.__state = self.TEXT
+        self.__markupEnd = None
+        self.__attributeName = ''
+        self.__attributeNameComplete = True
+        self.__quote = None
+
+    def isTranslated(self):
+        """Check whether a value rendered at the current position would be translated."""
+        return self.__state == self.TEXT or \
+            (self.__state == self.ATTRIBUTE_VALUE and self.__attributeName in TRANSLATED_ATTRIBUTES)
+
+    def translate(self, text, final):
+        """Translate a static text.
+        Args:
+            text: Text between the previous and the next tag of the template.
+            final: True if the text is the end of the template.
+        Returns:
+            Translated text.
+        Raises:
+            ValueError if a text node or an attribute value continues by a template tag
+            inside a marker.
+        """
+        translated = []
+        position = 0
+        while position < len(text):
+            if self.__state == self.TEXT:
+                end = text.find('<', position)
+                if end < 0:
+                    end = len(text)
+                translated.append(self.__translateSegment(text[position:end], end < len(text) or final, {}))
+                position = end
+                if position < len(text):
+                    self.__state = self.TAG
+                    for markupStart, markupEnd in self.__OTHER_MARKUP_ENDS:
+                        if text.startswith(markupStart, position):
+                            self.__state = self.OTHER_MARKUP
+                            self.__markupEnd = markupEnd
+                            break
+                    translated.append('<')
+                    position = position + 1
+                    self.__attributeNameComplete = True
+
+            elif self.__state == self.OTHER_MARKUP:
+                end = text.find(self.__markupEnd, position)
+                if end < 0:
+                    end = len(text)
+                else:
+                    end = end + len(self.__markupEnd)
+                    self.__state = self.TEXT
+                translated.append(text[position:end])
+                position = end
+
+            elif self.__state == self.TAG:
+                char = text[position]
+                if char == '>':
+                    self.__state = self.TEXT
+                elif char == '"' or char == "'":
+                    self.__state = self.ATTRIBUTE_VALUE
+                    self.__quote = char
+                elif char.isspace() or char == '/':
+                    self.__attributeNameComplete = True
+                elif char != '=':
+                    if self.__attributeNameComplete:
+                        self.__attributeName = ''
+                        self.__attributeNameComplete = False
+                    self.__attributeName = self.__attributeName + char
+                translated.append(char)
+                position = position + 1
+
+            elif self.__state == self.ATTRIBUTE_VALUE:
+                end = text.find(self.__quote, position)
+                if end < 0:
+                    end = len(text)
+                if self.__attributeName in TRANSLATED_ATTRIBUTES:
+                    translated.append(self.__translateSegment(
+                            text[position:end], end < len(text) or final, {'"': '&quot;', "'": '&apos;'}))
+                else:
+                    translated.append(text[position:end])
+                position = end
+                if position < len(text):
+                    self.__state = self.TAG
+                    self.__attributeNameComplete = True
+                    translated.append(self.__quote)
+                    position = position + 1
+
+        return ''.join(translated)
+
+    def __translateSegment(self, text, complete, entities):
+        """Translate a segment of a text node or of an attribute value like translateString."""
+        segments = text.split('__')
+        if len(segments) % 2 == 0 and not complete:
+            raise ValueError('Marker "{0}" is followed by a template tag.'.format(segments[-1]))
+        for index in range(1, len(segments), 2):
+            segments[index] = escape(translateString(self.__language, '__' + unescape(segments[index], entities)), entities)
+        return ''.join(segments)
+
+def translateXhtmlTemplate(language, source):
+    """Translate a template of XHTML, so that the rendered XHTML is translated like by translateXhtml.
+    Markers in static text are translated once. Expressions rendered in text or in translated
+    attributes are passed to the filter TRANSLATE_FILTER (see translateValue).
+    Args:
+        language: Language.
+        source: Source of a Jinja template.
+    Returns:
+        Source of the translated template.
+    Raises:
+        ValueError if a marker in static text is followed by a template tag.
+    """
+    translator = XhtmlTemplateTranslator(language)
+    translated = []
+    position = 0
+    for match in __TEMPLATE_TAG.finditer(source):
+        translated.append(translator.translate(source[position:match.start()], False))
+        tag = match.group(0)
+        expression = __TEMPLATE_EXPRESSION.match(tag)
+        if expression is not None and translator.isTranslated():
+            tag = '{0} ({1})|{2}({3}) {4}'.format(
+                    expression.group(1), expression.group(2), TRANSLATE_FILTER, repr(language), expression.group(3))
+        translated.append(tag)
+        position = match.end()
+    translated.append(translator.translate(source[position:], True))
+    return ''.join(translated)
+
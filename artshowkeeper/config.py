@@ -30,6 +30,14 @@ CUSTOM_DATA_FOLDER = '.'
 LOG_FILE = 'artshow.log'
 CURRENCY = ['usd']
 LANGUAGES = ['en']
+JOURNAL = False
+STORAGE = 'xml'
+PERSIST_POLICY = 'immediate'
+PERSIST_INTERVAL = 1000
+PERSIST_MUTATIONS = 50
+SESSION_SWEEP_INTERVAL = 60
+IMPORT_WORKERS = 0
+IMPORT_PARALLEL_THRESHOLD = 2000
 
 def __normalize_path(path):
     if not os.path.isabs(path):
@@ -47,6 +55,14 @@ def load(iniFile):
     global LOG_FILE
     global CURRENCY
     global LANGUAGES
+    global JOURNAL
+    global STORAGE
+    global PERSIST_POLICY
+    global PERSIST_INTERVAL
+    global PERSIST_MUTATIONS
+    global SESSION_SWEEP_INTERVAL
+    global IMPORT_WORKERS
+    global IMPORT_PARALLEL_THRESHOLD
 
     if not os.path.isfile(iniFile):
         return
@@ -61,3 +77,11 @@ def load(iniFile):
     CURRENCY = __normalize_list(config['DEFAULT'].get('CURRENCY', ','.join(CURRENCY)).split(','))
     LANGUAGES = __normalize_list(config['DEFAULT'].get('LANGUAGES', ','.join(LANGUAGES)).split(','))
     SESSION_KEY = binascii.unhexlify(config['DEFAULT'].get('SECRET_KEY', SESSION_KEY))
+    JOURNAL = config['DEFAULT'].getboolean('JOURNAL', JOURNAL)
+    STORAGE = config['DEFAULT'].get('STORAGE', STORAGE).lower()
+    PERSIST_POLICY = config['DEFAULT'].get('PERSIST_POLICY', PERSIST_POLICY).lower()
+    PERSIST_INTERVAL = config['DEFAULT'].getint('PERSIST_INTERVAL', PERSIST_INTERVAL)
+    PERSIST_MUTATIONS = config['DEFAULT'].getint('PERSIST_MUTATIONS', PERSIST_MUTATIONS)
+    SESSION_SWEEP_INTERVAL = config['DEFAULT'].getint('SESSION_SWEEP_INTERVAL', SESSION_SWEEP_INTERVAL)
+    IMPORT_WORKERS = config['DEFAULT'].getint('IMPORT_WORKERS', IMPORT_WORKERS)
+    IMPORT_PARALLEL_THRESHOLD = config['DEFAULT'].getint('IMPORT_PARALLEL_THRESHOLD', IMPORT_PARALLEL_THRESHOLD)
@@ -21,7 +21,7 @@ import os
 
 from artshowkeeper.common.convert import *
 from artshowkeeper.common.parameter import *
-from artshowkeeper.common.response import respondHtml, respondXml, respondCustomDataFile
+from artshowkeeper.common.response import respondHtml, respondXml, respondCustomDataFile, conditional
 from artshowkeeper.common.result import Result
 from artshowkeeper.common.authentication import auth, UserGroups
 from artshowkeeper.model.item import ItemField, ItemState
@@ -30,6 +30,7 @@ from artshowkeeper.controller.format import formatItem
 URL_PREFIX = '/items'
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR_CUSTOM_DATA = None
+IMPORT_PAGE_SIZE = 200
 blueprint = flask.Blueprint('items', __name__, template_folder='templates', static_folder='static')
 
 @blueprint.route('/')
@@ -144,6 +145,7 @@ def printAddedPrinted():
         
 @blueprint.route('/list', methods=['GET', 'POST'])
 @auth()
+@conditional()
 def listItems():
     items = flask.g.model.getAllItems()
     items.sort(key = lambda item: item[ItemField.SORT_CODE])
@@ -387,6 +389,24 @@ def selectImportFile():
             'targetUploadText': flask.url_for('.uploadImportText'),
             'targetCancelled': flask.url_for('.leaveImport')})
 
+def __respondApproveImportHtml(importedItems, importedChecksum, page, importFilename=None):
+    """Present a page of imported items (see import_spool.SpooledImport)."""
+    pageCount = max(1, (len(importedItems) + IMPORT_PAGE_SIZE - 1) // IMPORT_PAGE_SIZE)
+    page = min(max(page, 1), pageCount)
+    return respondHtml('approveimport', flask.g.userGroup, flask.g.language, {
+            'importItems': importedItems.page((page - 1) * IMPORT_PAGE_SIZE, IMPORT_PAGE_SIZE),
+            'importCount': len(importedItems),
+            'importChecksum': importedChecksum,
+            'importFilename': importFilename,
+            'importPage': page,
+            'importPageCount': pageCount,
+            'importRequiresOwner': not flask.g.model.isOwnerDefinedInImport(importedItems),
+            'targetPreviousPage': flask.url_for('.approveImport', Page=page - 1, ImportFilename=importFilename) if page > 1 else None,
+            'targetNextPage': flask.url_for('.approveImport', Page=page + 1, ImportFilename=importFilename) if page < pageCount else None,
+            'targetApproved': flask.url_for('.applyImport'),
+            'targetChangeFile': flask.url_for('.selectImportFile'),
+            'targetCancelled': flask.url_for('.leaveImport')})
+
 @blueprint.route('/uploadimportfile', methods = ['POST'])
 @auth()
 def uploadImportFile():
@@ -401,14 +421,8 @@ def uploadImportFile():
     importedItems, importedChecksum = flask.g.model.importCSVFile(flask.g.sessionID, file.stream)
 
     # 3. Present result.
-    return respondHtml('approveimport', flask.g.userGroup, flask.g.language, {
-            'importItems': importedItems,
-            'importChecksum': importedChecksum,
-            'importFilename': werkzeug.utils.secure_filename(file.filename),
-            'importRequiresOwner': not flask.g.model.isOwnerDefinedInImport(importedItems),
-            'targetApproved': flask.url_for('.applyImport'),
-            'targetChangeFile': flask.url_for('.selectImportFile'),
-            'targetCancelled': flask.url_for('.leaveImport')})
+    return __respondApproveImportHtml(
+            importedItems, importedChecksum, 1, werkzeug.utils.secure_filename(file.filename))
 
 @blueprint.route('/uploadimporttext', methods = ['POST'])
 @auth()
@@ -424,13 +438,24 @@ def uploadImportText():
     importedItems, importedChecksum = flask.g.model.importText(flask.g.sessionID, text)
 
     # 3. Present result.
-    return respondHtml('approveimport', flask.g.userGroup, flask.g.language, {
-            'importItems': importedItems,
-            'importChecksum': importedChecksum,
-            'importRequiresOwner': not flask.g.model.isOwnerDefinedInImport(importedItems),
-            'targetApproved': flask.url_for('.applyImport'),
-            'targetChangeFile': flask.url_for('.selectImportFile'),
-            'targetCancelled': flask.url_for('.leaveImport')})
+    return __respondApproveImportHtml(importedItems, importedChecksum, 1)
+
+@blueprint.route('/approveimport', methods = ['GET'])
+@auth()
+def approveImport():
+    # 1. Retrieve input.
+    page = toInt(getParameter('Page'))
+    importFilename = getParameter('ImportFilename')
+
+    # 2. Load import.
+    importedItems, importedChecksum = flask.g.model.getImport(flask.g.sessionID)
+    if importedItems is None:
+        return __respondNewItemHtml(None, message=Result.NO_IMPORT)
+
+    # 3. Present result.
+    return __respondApproveImportHtml(
+            importedItems, importedChecksum, page if page is not None else 1,
+            werkzeug.utils.secure_filename(importFilename) if importFilename is not None else None)
 
 @blueprint.route('/applyimport', methods = ['POST'])
 @auth()
@@ -15,6 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import logging
+import multiprocessing
 import textwrap
 from argparse import ArgumentParser
 
@@ -34,9 +35,13 @@ from artshowkeeper.common.translate import registerDictionary
 from artshowkeeper.common.phrase_dictionary import PhraseDictionary
 from artshowkeeper.common.authentication import UserGroups, auth
 from artshowkeeper.common.parameter import getParameter
+from artshowkeeper.common.server import createServer, createListener
 from artshowkeeper.model.dataset import Dataset
 from artshowkeeper.model.currency import Currency
 from artshowkeeper.model.model import Model
+from artshowkeeper.model.persistence import PersistenceScheduler
+from artshowkeeper.model.remote import ModelServer, connectModel
+from artshowkeeper.model.session import SessionSweeper
 
 from artshowkeeper.items import items_controller
 from artshowkeeper.auction import auction_controller
@@ -63,12 +68,34 @@ app.register_blueprint(settings_controller.blueprint, url_prefix=settings_contro
 app.secret_key = config.SESSION_KEY
 
 # Initialize application
-dataset = Dataset(logging.getLogger('dataset'), config.DATA_FOLDER)
-dataset.restore()
-currency = Currency(logging.getLogger('currency'), dataset, currencyCodes=config.CURRENCY)
-model = Model(
-        logging.getLogger('model'), dataset,
-        currency)
+MODEL_SERVER_VARIABLE = 'ARTSHOWKEEPER_MODEL_SERVER'
+"""Environment variable with an address of the model server of a worker process (see runWorkers)."""
+WORKER_THREADS = 8
+"""Default number of threads of a worker process."""
+
+modelServerAddress = os.environ.get(MODEL_SERVER_VARIABLE, None)
+if modelServerAddress is None:
+    dataset = Dataset(logging.getLogger('dataset'), config.DATA_FOLDER, journal=config.JOURNAL, storage=config.STORAGE)
+    dataset.restore()
+    currency = Currency(logging.getLogger('currency'), dataset, currencyCodes=config.CURRENCY)
+    model = Model(
+            logging.getLogger('model'), dataset,
+            currency,
+            importWorkers=config.IMPORT_WORKERS,
+            importParallelThreshold=config.IMPORT_PARALLEL_THRESHOLD)
+    scheduler = PersistenceScheduler(
+            logging.getLogger('persistence'), dataset,
+            policy=config.PERSIST_POLICY,
+            interval=config.PERSIST_INTERVAL,
+            mutations=config.PERSIST_MUTATIONS)
+    sweeper = SessionSweeper(
+            logging.getLogger('session'), model,
+            interval=config.SESSION_SWEEP_INTERVAL)
+else:
+    # Worker process calls the model owned by the main process
+    dataset = None
+    sweeper = None
+    model, scheduler = connectModel(modelServerAddress)
 dictionaryPath = os.path.join(os.path.dirname(__file__), 'locale')
 for language in config.LANGUAGES:
     registerDictionary(
@@ -113,36 +140,20 @@ def before_request():
     flask.g.language = config.DEFAULT_LANGUAGE
     flask.g.model = model
 
-    localRequest = flask.request.remote_addr == '127.0.0.1'
-    sessionID = flask.session.get('SessionID', None)
-    if localRequest and model.findSession(sessionID):
-        group, ip = model.getSessionUserInfo(sessionID)
-        if ip != '127.0.0.1':
-            print('Local session has been compomised by IP {0}. Resetting.'.format(ip))
-            model.dropSession(sessionID)
-            sessionID = None
-        else:
-            model.renewSession(sessionID)
-
-    model.sweepSessions()
-
-    if not model.findSession(sessionID):
-        userGroup = UserGroups.ADMIN if localRequest else UserGroups.UNKNOWN
-        sessionID = model.startNewSession(
-            userGroup=userGroup,
-            userIP=flask.request.remote_addr)
+    # A single call, so that a worker process calls the model server once
+    sessionID, userGroup, userIP = model.openRequestSession(
+            flask.session.get('SessionID', None), flask.request.remote_addr)
+    if flask.session.get('SessionID', None) != sessionID:
         flask.session['SessionID'] = sessionID
-    else:
-        model.updateSessionUserInfo(sessionID, userIP=flask.request.remote_addr)
 
     flask.g.sessionID = sessionID
-    flask.g.userGroup, flask.g.userIP = model.getSessionUserInfo(sessionID)
+    flask.g.userGroup, flask.g.userIP = userGroup, userIP
 
 
 @app.after_request
 def after_request(response):
     if response.status_code / 100 == 2:
-        flask.g.model.persist()
+        scheduler.notify()
     return response
     
 @app.route("/")
@@ -181,11 +192,23 @@ def parse_arguments():
                         help='Make application available on local access only')
     parser.add_argument('--debug', action='store_true',
                         help='Run application in debug mode.')
+    parser.add_argument('--export-xml', metavar='FOLDER',
+                        help='Export data to XML files in a folder and exit.')
+    parser.add_argument('--threads', metavar='N', type=int, default=0,
+                        help='Serve requests by N threads of a production server (waitress if installed).')
+    parser.add_argument('--workers', metavar='N', type=int, default=0,
+                        help='Serve requests by N processes (each with --threads threads, {0} by default) '
+                             'calling the data of the main process.'.format(WORKER_THREADS))
     return parser.parse_args()
 
 
 def run():
     args = parse_arguments()
+    if args.export_xml is not None:
+        dataset.exportXml(args.export_xml)
+        print("Exported to {0}".format(args.export_xml))
+        return
+
     if args.local_only:
         host = None
     else:
@@ -205,5 +228,62 @@ def run():
             print('   {0}'.format(ipAddress))
 
     print("Starting app on {0}, debug={1}".format(host or 'localhost', args.debug))
-    app.run(host=host, port=5000, debug=args.debug, use_reloader=False)
+    scheduler.start()
+    sweeper.start()
+    if args.workers > 0:
+        runWorkers(host or '127.0.0.1', 5000, args.workers, args.threads or WORKER_THREADS)
+    elif args.threads > 0:
+        server = createServer(app, host or '127.0.0.1', 5000, args.threads)
+        print("Serving by {0} threads".format(args.threads))
+        try:
+            server.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+    else:
+        app.run(host=host, port=5000, debug=args.debug, use_reloader=False)
+    sweeper.stop()
+    scheduler.stop()
+    dataset.compact()
     print("Finished")
+
+
+def runWorkers(host, port, workers, threads):
+    """Serve requests by worker processes. The main process owns the dataset
+    and serves the model to workers (see ModelServer)."""
+    modelServer = ModelServer(model, scheduler)
+    modelServer.start()
+    listener = createListener(host, port)
+
+    # Workers are started the same way on all platforms
+    context = multiprocessing.get_context('spawn')
+    os.environ[MODEL_SERVER_VARIABLE] = modelServer.address()
+    processes = [context.Process(target=serveWorker, args=(listener, threads)) for i in range(workers)]
+    for process in processes:
+        process.start()
+    del os.environ[MODEL_SERVER_VARIABLE]
+
+    print("Serving by {0} processes with {1} threads each".format(workers, threads))
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+        listener.close()
+        modelServer.stop()
+
+
+def serveWorker(listener, threads):
+    """Serve requests in a worker process (see runWorkers)."""
+    server = createServer(app, None, None, threads, listener=listener)
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,178 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import math
+
+INDEX_COEFS = (0, 0.3, 0.6)
+"""Sequence of relative positions (in remaining items ordered by amount) at which an item is picked."""
+
+class AuthorSegmentTree:
+    """Segment tree over positions of items.
+    Each node keeps the number of remaining items and their author if all of
+    them have the same author. It finds the n-th remaining item, the rank of
+    an item and the nearest remaining item of a different author in O(log n).
+    """
+    __EMPTY = object()
+    __MIXED = object()
+
+    def __init__(self, authors):
+        """Create a tree.
+        Args:
+            authors -- Author of each item (position).
+        """
+        self.__size = 1
+        while self.__size < len(authors):
+            self.__size = self.__size * 2
+        self.__counts = [0] * (2 * self.__size)
+        self.__authors = [self.__EMPTY] * (2 * self.__size)
+        for position, author in enumerate(authors):
+            self.__counts[self.__size + position] = 1
+            self.__authors[self.__size + position] = author
+        for node in range(self.__size - 1, 0, -1):
+            self.__updateNode(node)
+
+    def __updateNode(self, node):
+        left = 2 * node
+        right = left + 1
+        self.__counts[node] = self.__counts[left] + self.__counts[right]
+        leftAuthor = self.__authors[left]
+        rightAuthor = self.__authors[right]
+        if leftAuthor is self.__EMPTY:
+            self.__authors[node] = rightAuthor
+        elif rightAuthor is self.__EMPTY or (leftAuthor is not self.__MIXED and leftAuthor == rightAuthor):
+            self.__authors[node] = leftAuthor
+        else:
+            self.__authors[node] = self.__MIXED
+
+    def __len__(self):
+        return self.__counts[1]
+
+    def author(self, position):
+        return self.__authors[self.__size + position]
+
+    def remove(self, position):
+        node = self.__size + position
+        self.__counts[node] = 0
+        self.__authors[node] = self.__EMPTY
+        node = node // 2
+        while node > 0:
+            self.__updateNode(node)
+            node = node // 2
+
+    def select(self, rank):
+        """Find position of a remaining item with a given rank (0 is the first)."""
+        node = 1
+        while node < self.__size:
+            node = 2 * node
+            if rank >= self.__counts[node]:
+                rank = rank - self.__counts[node]
+                node = node + 1
+        return node - self.__size
+
+    def rank(self, position):
+        """Get number of remaining items before a position."""
+        rank = 0
+        node = self.__size + position
+        while node > 1:
+            if node % 2 == 1:
+                rank = rank + self.__counts[node - 1]
+            node = node // 2
+        return rank
+
+    def __isEligible(self, node, suppressedAuthor):
+        """Check whether a node contains an item of other author than the suppressed one."""
+        author = self.__authors[node]
+        return author is not self.__EMPTY and (author is self.__MIXED or author != suppressedAuthor)
+
+    def findLast(self, position, suppressedAuthor):
+        """Find the nearest remaining item of other author at the position or before it.
+        Returns:
+            Position or None.
+        """
+        return self.__findLast(1, 0, self.__size, position, suppressedAuthor)
+
+    def __findLast(self, node, first, end, position, suppressedAuthor):
+        if position < first or not self.__isEligible(node, suppressedAuthor):
+            return None
+        if node >= self.__size:
+            return first
+        middle = (first + end) // 2
+        found = self.__findLast(2 * node + 1, middle, end, position, suppressedAuthor)
+        if found is None:
+            found = self.__findLast(2 * node, first, middle, position, suppressedAuthor)
+        return found
+
+    def findFirst(self, position, suppressedAuthor):
+        """Find the nearest remaining item of other author at the position or after it.
+        Returns:
+            Position or None.
+        """
+        return self.__findFirst(1, 0, self.__size, position, suppressedAuthor)
+
+    def __findFirst(self, node, first, end, position, suppressedAuthor):
+        if position >= end or not self.__isEligible(node, suppressedAuthor):
+            return None
+        if node >= self.__size:
+            return first
+        middle = (first + end) // 2
+        found = self.__findFirst(2 * node, first, middle, position, suppressedAuthor)
+        if found is None:
+            found = self.__findFirst(2 * node + 1, middle, end, position, suppressedAuthor)
+        return found
+
+def calculateAuctionOrder(authors):
+    """Calculate order in which items are auctioned.
+    Items are picked one by one around a position given by INDEX_COEFS in the remaining
+    items. An item at a relative distance x from the position has a score 0.5 * cos(x),
+    which is squared if the item has the same author as the previously picked item.
+    An item with the best score is picked (the first one if more items have the same score).
+
+    As the distance is below 1, the score decreases with the distance and any item of
+    other author is preferred to an item of the previous author. Thus only the nearest
+    items of other author on both sides of the position are compared.
+    Args:
+        authors -- Authors of items ordered by amount ascending.
+    Returns:
+        List of indexes to authors in the order of picking.
+    """
+    tree = AuthorSegmentTree(authors)
+    order = []
+    indexCoefsIndex = 0
+    lastAuthor = None
+    while len(tree) > 0:
+        count = len(tree)
+        idealIndex = int(INDEX_COEFS[indexCoefsIndex] * count)
+        indexCoefsIndex = (indexCoefsIndex + 1) % len(INDEX_COEFS)
+
+        position = tree.select(idealIndex)
+        if lastAuthor is not None and tree.author(position) == lastAuthor:
+            left = tree.findLast(position - 1, lastAuthor) if position > 0 else None
+            right = tree.findFirst(position + 1, lastAuthor)
+            if left is not None:
+                position = left
+                if right is not None:
+                    leftScore = 0.5 * math.cos((idealIndex - tree.rank(left)) / (idealIndex + 1))
+                    rightScore = 0.5 * math.cos((tree.rank(right) - idealIndex) / (count - idealIndex + 1))
+                    if rightScore > leftScore:
+                        position = right
+            elif right is not None:
+                position = right
+
+        order.append(position)
+        lastAuthor = tree.author(position)
+        tree.remove(position)
+
+    return order
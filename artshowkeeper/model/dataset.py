@@ -19,21 +19,41 @@ import random
 import json
 import os
 import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from os import path
 from PIL import Image
 
 from . attendee import Attendee
-from . item import ItemState, ItemField, ImportedItemField
+from . item import ItemState, ItemField, ImportedItemField, Item
 from . currency_field import CurrencyField
 from . session import Field as SessionField
+from . session import SessionStore
+from . import_spool import ImportSpool
+from . item_import import normalizeItemImport
+from . notifier import ChangeNotifier
+from . rwlock import ReadWriteLock, shared, exclusive
 
 from . table import Table
+from . sqlite_table import SqliteDatabase, SqliteTable
 from artshowkeeper.common.convert import *
 from artshowkeeper.common.result import Result
 
+class Storage:
+    XML = 'xml'
+    """Each table is stored in an XML file."""
+    SQLITE = 'sqlite'
+    """All tables are stored in a SQLite database."""
+
+    ALL = [XML, SQLITE]
+
 class Dataset:
     GLOBAL_SESSION_ID = 0
-    RESERVED_ITEM_EXPRESSION = 'Owner is None and Author is None and Title is None'
+    RESERVED_ITEM_EXPRESSION = [
+            (ItemField.OWNER, 'is', None),
+            (ItemField.AUTHOR, 'is', None),
+            (ItemField.TITLE, 'is', None)]
 
     def __init__(
             self, logger, dataPath,
@@ -41,71 +61,311 @@ class Dataset:
             itemsFilename='artshowitems.xml',
             currencyFilename='currency.xml',
             attendeesFilename='attendees.xml',
+            journal=False,
+            storage=Storage.XML,
+            databaseFilename='artshow.sqlite',
     ):
+        """Create a dataset.
+        Args:
+            sessionFilename -- File of a snapshot of sessions or None if sessions should not be persisted.
+            journal -- True to journal changes of tables (see Table).
+            storage -- Storage of tables (see Storage).
+            databaseFilename -- File of the database of the storage SQLITE. If the database
+                does not exist, it is created out of XML files on restore (see importXml).
+        """
+        if storage not in Storage.ALL:
+            raise ValueError('Unknown storage "{0}"'.format(storage))
         self.__logger = logger
         self.__dataPath = dataPath
         self.__imageDataPath = path.join(self.__dataPath, 'image')
-        self.__sessions = Table(
-                self.__logger,
-                path.join(self.__dataPath, sessionFilename),
-                'SessionDictionary',
-                'KeyValuePair',
-                ['SessionID', 'Key', 'Value'])
-        self.__items = Table(
-                self.__logger, path.join(self.__dataPath, itemsFilename),
+        self.__imports = ImportSpool(self.__logger, path.join(self.__dataPath, 'import'))
+        self.__database = None
+        self.__migrate = False
+        if storage == Storage.SQLITE:
+            databaseFilename = path.join(self.__dataPath, databaseFilename)
+            self.__migrate = not path.isfile(databaseFilename)
+            self.__database = SqliteDatabase(self.__logger, databaseFilename)
+        self.__tableFilenames = []
+        self.__lock = ReadWriteLock()
+        self.__batchDepth = 0
+        self.__batchFailed = False
+        self.__modifications = 0
+        self.__versionEpoch = int(time.time() * 1000)
+        self.__versionModifications = None
+        self.__versionTime = None
+        self.__changeNotifier = ChangeNotifier()
+        self.__notifiedModifications = None
+
+        sessionTable = None
+        if sessionFilename is not None:
+            sessionTable = self.__createTable(
+                    sessionFilename,
+                    'SessionDictionary',
+                    'KeyValuePair',
+                    ['SessionID', 'Key', 'Value'])
+            sessionTable.createIndex(['SessionID', 'Key'])
+        self.__sessions = SessionStore(self.__logger, sessionTable)
+        self.__items = self.__createTable(
+                itemsFilename,
                 'ArtShowItems',
                 'Item',
-                ItemField.ALL_PERSISTENT)
-        self.__currency = Table(
-                self.__logger,
-                path.join(self.__dataPath, currencyFilename),
+                ItemField.ALL_PERSISTENT,
+                journal=journal,
+                converter=self.__convertItem,
+                rowFactory=Item)
+        self.__currency = self.__createTable(
+                currencyFilename,
                 'CurrencyList',
                 'Currency',
-                CurrencyField.ALL_PERSISTENT)
-        self.__attendees = Table(
-                self.__logger,
-                path.join(self.__dataPath, attendeesFilename),
+                CurrencyField.ALL_PERSISTENT,
+                journal=journal)
+        self.__attendees = self.__createTable(
+                attendeesFilename,
                 'Attendees',
                 'Attendee',
-                Attendee.ALL_PERSISTENT)
+                Attendee.ALL_PERSISTENT,
+                journal=journal)
+
+        self.__items.createIndex([ItemField.CODE], unique=True)
+        self.__items.createIndex([ItemField.STATE])
+        self.__items.createIndex([ItemField.OWNER])
+        self.__items.createIndex([ItemField.BUYER])
+        self.__items.createIndex([ItemField.OWNER, ItemField.IMPORT_NUMBER])
+        self.__items.createIndex([ItemField.OWNER, ItemField.AUTHOR, ItemField.TITLE])
+        self.__currency.createIndex([CurrencyField.CODE], unique=True)
+        self.__attendees.createIndex([Attendee.REG_ID], unique=True)
 
         self.__jsonDecoder = json.JSONDecoder()
         self.__jsonEncoder = json.JSONEncoder()
 
+    def __createTable(self, filename, tableName, rowName, columnNames, journal=False, converter=None, rowFactory=None):
+        """Create a table in the storage of the dataset."""
+        if self.__database is not None:
+            table = SqliteTable(self.__logger, self.__database, tableName, rowName, columnNames, converter=converter)
+        else:
+            table = Table(
+                    self.__logger, path.join(self.__dataPath, filename), tableName, rowName, columnNames,
+                    journal=journal, converter=converter, rowFactory=rowFactory)
+        self.__tableFilenames.append((table, filename, tableName, rowName, columnNames))
+        return table
+
     def items(self):
         return self.__items
+
+    def reading(self):
+        """Lock the dataset for reading. Other threads may read but they cannot write."""
+        return self.__lock.reading()
+
+    @contextmanager
+    def writing(self):
+        """Lock the dataset for writing. Other threads can neither read nor write.
+        Threads waiting for a change (see waitForChange) are woken up when data change.
+        """
+        with self.__lock.writing():
+            try:
+                yield
+            finally:
+                self.__notifyChange()
+
+    def __notifyChange(self):
+        modifications = self.modifications()
+        if modifications != self.__notifiedModifications:
+            self.__notifiedModifications = modifications
+            self.__changeNotifier.notify()
+
+    def waitForChange(self, version, timeout):
+        """Wait until data shown to users change (see modifications).
+        Args:
+            version: Version known by the caller (None to return immediately).
+            timeout: Maximal time of waiting in seconds.
+        Returns:
+            Current version (see ChangeNotifier).
+        """
+        return self.__changeNotifier.wait(version, timeout)
         
+    @exclusive
     def restore(self):
+        if self.__migrate:
+            self.__migrate = False
+            self.importXml()
         self.__sessions.load()
         self.__items.load()
         self.__currency.load()
         self.__attendees.load()
+        self.sweepImports()
+        self.__modifications = self.__modifications + 1
         
+    @shared
     def persist(self):
         self.__sessions.save()
         self.__items.save()
         self.__currency.save()
         self.__attendees.save()
 
+    def changed(self):
+        """Check whether any table has unsaved changes."""
+        return any(table.changed() for table in self.__tables())
+
+    def mutations(self):
+        """Get a number of changes made to all tables."""
+        return sum(table.mutations() for table in self.__tables())
+
+    def modifications(self):
+        """Get a number of changes of data shown to users: items, currency, attendees,
+        global values and images. Changes of user sessions are not counted.
+        """
+        return self.__items.mutations() + self.__currency.mutations() + self.__attendees.mutations() \
+                + self.__modifications
+
+    def version(self):
+        """Get a version of data shown to users (see modifications).
+        Returns:
+            Pair (version, time when the version has been noticed first). The version
+            is unique across restarts of the application.
+        """
+        modifications = self.modifications()
+        if modifications != self.__versionModifications:
+            self.__versionTime = datetime.now(timezone.utc)
+            self.__versionModifications = modifications
+        return '{0:x}.{1}'.format(self.__versionEpoch, modifications), self.__versionTime
+
+    def itemMutations(self):
+        """Get a number of changes made to the table of items."""
+        return self.__items.mutations()
+
+    def __tables(self):
+        return [self.__sessions, self.__items, self.__currency, self.__attendees]
+
+    @exclusive
+    def compact(self):
+        """Save all tables including changes kept in journals only."""
+        self.__sessions.save(True)
+        self.__items.compact()
+        self.__currency.compact()
+        self.__attendees.compact()
+
+    @contextmanager
+    def batch(self):
+        """Group changes of items, currency and attendees to a batch.
+        Changes are visible inside the batch immediately. When the batch ends, the dataset
+        is persisted once. If an exception is raised, all changes are rolled back instead
+        and the exception is propagated. The dataset is locked for writing during the batch.
+        Nested batches are part of the outermost batch.
+        """
+        self.__beginBatch()
+        try:
+            yield
+        except:
+            self.__endBatch(False)
+            raise
+        self.__endBatch(True)
+
+    def __beginBatch(self):
+        self.__lock.acquireWrite()
+        if self.__batchDepth == 0:
+            for table in self.__batchTables():
+                table.begin()
+        self.__batchDepth = self.__batchDepth + 1
+
+    def __endBatch(self, commit):
+        try:
+            self.__batchFailed = self.__batchFailed or not commit
+            self.__batchDepth = self.__batchDepth - 1
+            if self.__batchDepth == 0:
+                failed = self.__batchFailed
+                self.__batchFailed = False
+                for table in self.__batchTables():
+                    if failed:
+                        table.rollback()
+                    else:
+                        table.commit()
+                if not failed:
+                    self.persist()
+        finally:
+            self.__notifyChange()
+            self.__lock.releaseWrite()
+
+    def __batchTables(self):
+        return [self.__items, self.__currency, self.__attendees]
+
+    @exclusive
+    def importXml(self, dataPath=None):
+        """Replace content of tables by XML files (e.g. to migrate to the storage SQLITE).
+        Tables whose file does not exist are kept.
+        Args:
+            dataPath -- Folder of XML files or None to use the data folder of the dataset.
+        """
+        for table, filename, tableName, rowName, columnNames in self.__tableFilenames:
+            xmlFilename = self.__xmlFilename(dataPath, filename)
+            if not path.isfile(xmlFilename):
+                self.__logger.info('importXml: File "{0}" not found, keeping table "{1}".'.format(xmlFilename, tableName))
+                continue
+            xmlTable = Table(self.__logger, xmlFilename, tableName, rowName, columnNames)
+            if not xmlTable.load():
+                self.__logger.error('importXml: File "{0}" cannot be loaded, keeping table "{1}".'.format(xmlFilename, tableName))
+                continue
+            table.delete(None)
+            for row in xmlTable.select(columnNames):
+                table.insert(row, None)
+            table.save(True)
+            table.load()
+            self.__logger.info('importXml: Table "{0}" imported from "{1}".'.format(tableName, xmlFilename))
+
+    def exportXml(self, dataPath=None):
+        """Save all tables to XML files (e.g. to get back from the storage SQLITE).
+        Args:
+            dataPath -- Folder of XML files or None to use the data folder of the dataset.
+        """
+        if self.__database is None and dataPath is None:
+            # Compacting writes, so it cannot run under the read lock
+            self.compact()
+            return
+        with self.reading():
+            self.__sessions.save(True)
+            for table, filename, tableName, rowName, columnNames in self.__tableFilenames:
+                xmlFilename = self.__xmlFilename(dataPath, filename)
+                xmlTable = Table(self.__logger, xmlFilename, tableName, rowName, columnNames)
+                for row in table.select(columnNames):
+                    xmlTable.insert(row, None)
+                xmlTable.save(True)
+                self.__logger.info('exportXml: Table "{0}" exported to "{1}".'.format(tableName, xmlFilename))
+
+    def __xmlFilename(self, dataPath, filename):
+        if dataPath is None:
+            return path.join(self.__dataPath, filename)
+        else:
+            return path.join(dataPath, path.basename(filename))
+
     def getClientSessionIDs(self):
-        rawSessions = self.__sessions.select(
-                ['SessionID'],
-                'SessionID != "{0}"'.format(self.GLOBAL_SESSION_ID))
-        sessions = {}
-        for rawSession in rawSessions:
-            id = toInt(rawSession['SessionID'])
-            if id != self.GLOBAL_SESSION_ID:
-                sessions[id] = True
-        return [value for value in sessions.keys()]
+        return self.__sessions.getSessionIDs()
+
+    def findSession(self, sessionID):
+        """Find a session.
+        Returns:
+            True if the session exists, has a creation time and has not expired.
+        """
+        session = self.__sessions.findValid(sessionID)
+        return session is not None \
+                and session.values.get(SessionField.CREATED_TIMESTAMP, None) is not None
 
+    def sweepSessions(self):
+        """Drop expired sessions.
+        Spooled imports of dropped sessions are removed as well.
+        Returns:
+            List of IDs of dropped sessions.
+        """
+        droppedSessionIDs = self.__sessions.sweep()
+        if len(droppedSessionIDs) > 0:
+            self.sweepImports()
+        return droppedSessionIDs
+
+    def getSessionStatistics(self):
+        """Get counters of session sweeping (see session.StatisticsField)."""
+        return self.__sessions.getStatistics()
 
     def getSessionPairs(self, sessionID):
-        rawPairs = self.__sessions.select(
-                ['Key', 'Value'],
-                'SessionID == "{0}"'.format(sessionID))
-        pairs = { rawPair['Key']: rawPair['Value'] for rawPair in rawPairs }
-        return pairs
-        
+        return self.__sessions.getPairs(sessionID)
+
     def getSessionValue(self, sessionID, key, defaultValue = None):
         """Retrieve a value of a given key in a given session.
         Args:
@@ -115,11 +375,9 @@ class Dataset:
         Returns:
             Value or defaultValue if not found.
         """
-        rawValue = self.__sessions.select(
-                ['Value'],
-                'SessionID == "{0}" and Key == "{1}"'.format(sessionID, key))
-        if len(rawValue) > 0:
-            return str(rawValue[0]['Value'])
+        value = self.__sessions.getValue(sessionID, key, None)
+        if value is not None:
+            return str(value)
         else:
             return defaultValue
 
@@ -128,25 +386,58 @@ class Dataset:
         Returns:
             True if the update was successful.
         """
-        updated = False
-        for key, value in pairs.items():
-            rawPair = { 'SessionID': str(sessionID), 'Key': str(key), 'Value': value }
-            if value != None:
-                updated = self.__sessions.update(rawPair, 'SessionID == "{0}" and Key == "{1}"'.format(sessionID, key)) > 0 \
-                        or self.__sessions.insert(rawPair, None) > 0
-            else:
-                updated = self.__sessions.delete('SessionID == "{0}" and Key == "{1}"'.format(sessionID, key)) > 0
-        return updated
+        if toInt(sessionID) == self.GLOBAL_SESSION_ID:
+            self.__modifications = self.__modifications + 1
+        return self.__sessions.update(sessionID, **pairs)
 
     def dropValidSession(self, sessionID):
         """Remove a sessions."""
         if toInt(sessionID) != 0:
-            self.__sessions.delete('SessionID == "{0}"'.format(sessionID))
+            self.__sessions.drop(sessionID)
+
+
+    def spoolImport(self, importedItems):
+        """Spool imported items.
+        Args:
+            importedItems -- Iterable of imported items.
+        Returns:
+            SpooledImport (see import_spool).
+        """
+        return self.__imports.create(importedItems)
+
+    def updateSpooledImport(self, spooledImport, updates):
+        """Update fields of spooled imported items.
+        Args:
+            spooledImport -- Spooled import.
+            updates -- Dictionary item index -> dictionary of updated fields.
+        Returns:
+            Updated SpooledImport.
+        """
+        return self.__imports.update(spooledImport, updates)
+
+    def getSpooledImport(self, importID):
+        """Get spooled import.
+        Returns:
+            SpooledImport or None if not found.
+        """
+        return self.__imports.open(importID)
 
+    def dropSpooledImport(self, importID):
+        self.__imports.drop(importID)
+
+    def sweepImports(self):
+        """Remove spooled imports which are not referenced by any session."""
+        importIDs = set()
+        for sessionID in self.__sessions.getSessionIDs():
+            importID = self.__sessions.getValue(sessionID, SessionField.IMPORT_ID, None)
+            if importID is not None:
+                importIDs.add(str(importID))
+        self.__imports.sweep(importIDs)
 
     def getGlobalValue(self, key, defaultValue = None):
         return self.getSessionValue(self.GLOBAL_SESSION_ID, key, defaultValue)
     
+    @exclusive
     def updateGlobalPairs(self, **pairs):
         return self.updateSessionPairs(self.GLOBAL_SESSION_ID, **pairs)    
 
@@ -160,6 +451,7 @@ class Dataset:
         except json.JSONDecodeError:
             return defaultValue
 
+    @exclusive
     def updateGlobalDict(self, key, dict):
         if dict is not None:
             return self.updateSessionPairs(self.GLOBAL_SESSION_ID, **{
@@ -175,6 +467,7 @@ class Dataset:
             item.get(ItemField.AUTHOR, None) is None and \
             item.get(ItemField.TITLE, None) is None
 
+    @exclusive
     def getNextItemCode(self, suggestedCode=None, requestSuggestedCode=False):
         """Get next item code.
         Args:
@@ -218,6 +511,7 @@ class Dataset:
 
         return str(reservedCode)
 
+    @exclusive
     def addItem(self, code, owner, title, author, medium, state, initialAmount, charity, note, importNumber):
         if len(str(code)) == 0:
             self.__logger.error('addItem: Code is invalid')
@@ -244,61 +538,11 @@ class Dataset:
                     ItemField.CODE)                    
 
     def normalizeItemImport(self, itemImport):
-        """Normalizes item import.
+        """Normalizes item import (see item_import.normalizeItemImport).
         Returns:
             (result, item).
         """
-        item = {
-                ImportedItemField.NUMBER: None,
-                ImportedItemField.OWNER: None,
-                ImportedItemField.AUTHOR: None,
-                ImportedItemField.TITLE: None,
-                ImportedItemField.MEDIUM: None,
-                ImportedItemField.NOTE: None,
-                ImportedItemField.INITIAL_AMOUNT: None,
-                ImportedItemField.CHARITY: None }
-
-        component = itemImport.get(ImportedItemField.NUMBER, None)
-        number = toInt(component)
-        if number is None and component is not None and len(component) > 0:
-            self.__logger.error('purifyRawItemImport:  Number "{0}" is not an integer.'.format(component))
-            return Result.INVALID_ITEM_NUMBER, item
-        item[ImportedItemField.NUMBER] = number
-
-        component = itemImport.get(ImportedItemField.OWNER, None)
-        owner = toInt(component)
-        if owner is None and component is not None and len(component) > 0:
-            self.__logger.error('purifyRawItemImport:  Owner "{0}" is not an integer.'.format(component))
-            return Result.INVALID_ITEM_OWNER, item
-        item[ImportedItemField.OWNER] = owner
-
-        item[ImportedItemField.AUTHOR] = toNonEmptyStr(
-                itemImport.get(ImportedItemField.AUTHOR, None))            
-
-        item[ImportedItemField.TITLE] = toNonEmptyStr(
-                itemImport.get(ImportedItemField.TITLE, None))            
-
-        item[ImportedItemField.MEDIUM] = toNonEmptyStr(
-                itemImport.get(ImportedItemField.MEDIUM, None))            
-
-        item[ImportedItemField.NOTE] = toNonEmptyStr(
-                itemImport.get(ImportedItemField.NOTE, None))            
-
-        component = itemImport.get(ImportedItemField.INITIAL_AMOUNT, None)
-        amount = toDecimal(component)
-        if amount is None and component is not None and len(component) > 0:
-            self.__logger.error('purifyRawItemImport:  Amount "{0}" is not a decimal number.'.format(component))
-            return Result.INVALID_AMOUNT, item
-        item[ImportedItemField.INITIAL_AMOUNT] = str(amount) if amount is not None else None
-
-        component = itemImport.get(ImportedItemField.CHARITY, None)
-        charity = toInt(component)
-        if charity is None and component is not None and len(component) > 0:
-            self.__logger.error('purifyRawItemImport:  Charity "{0}" is not an integer.'.format(component))
-            return Result.INVALID_CHARITY, item
-        item[ImportedItemField.CHARITY] = charity
-
-        return Result.SUCCESS, item
+        return normalizeItemImport(self.__logger, itemImport)
 
     def __normalizeItem(self, item):
         """Normalize item data types."""
@@ -311,16 +555,27 @@ class Dataset:
         item[ItemField.IMPORT_NUMBER] = toInt(item[ItemField.IMPORT_NUMBER])
         return item
 
+    def __convertItem(self, row):
+        """Convert a row of the table of items to a normalized item (None for a reserved item).
+        Derived fields (sort code and permissions) are included.
+        """
+        if self.__isReservedItem(row):
+            return None
+        else:
+            return self.__normalizeItem(Item(row, persistentOnly=True).toDict(derived=True))
+
+    @shared
     def getAttendees(self):
         raw_attendees = self.__attendees.select(Attendee.ALL_PERSISTENT)
         return [Attendee.load(raw) for raw in raw_attendees]
 
+    @shared
     def getAttendee(self, regId):
         try:
             return Attendee.load(
                 self.__attendees.select(
                     Attendee.ALL_PERSISTENT,
-                    '{col} == "{id:d}"'.format(col=Attendee.REG_ID, id=int(regId))
+                    (Attendee.REG_ID, '==', str(int(regId)))
                 )[0])
         except IndexError:
             return Attendee.load({
@@ -328,12 +583,13 @@ class Dataset:
                 Attendee.NICKNAME: '',
             })
 
+    @exclusive
     def addAttendee(self, regId, nick):
         if regId is None or nick is None or len(nick) == 0:
             self.__logger.error('addAttendee: Invalid attendee record (id: {0}, nick: {1}).'.format(regId, nick))
             return False
-        elif self.__attendees.count('{0}=="{1}"'.format(Attendee.REG_ID, regId)) >= 1:
-            if self.__attendees.update({Attendee.NICKNAME: nick}, '{0}=="{1}" and {2}!="{3}"'.format(Attendee.REG_ID, regId, Attendee.NICKNAME, nick)) >= 1:
+        elif self.__attendees.count((Attendee.REG_ID, '==', str(regId))) >= 1:
+            if self.__attendees.update({Attendee.NICKNAME: nick}, [(Attendee.REG_ID, '==', str(regId)), (Attendee.NICKNAME, '!=', nick)]) >= 1:
                 self.__logger.info('addAttendee: Attendee {0} updated.'.format(regId))
                 return True
             else:
@@ -345,20 +601,20 @@ class Dataset:
             self.__logger.error('addAttendee: Adding attendee (id: {0}, nick: {1}) failed.'.format(regId, nick))
             return False
 
+    @shared
     def getItems(self, expression):
-        """Get items based on expression. Exclude reserved item.
+        """Get items based on expression (or structured predicate). Exclude reserved item.
         Returns:
             Items.
         """
-        items = self.__items.select(ItemField.ALL_PERSISTENT, expression)
-        items[:] = [self.__normalizeItem(item) for item in items if not self.__isReservedItem(item)]
-        return items
+        return [item.copy() for item in self.__items.selectConverted(expression)]
 
+    @shared
     def getItem(self, itemCode):
         if itemCode is None:
             return None
         else:
-            items = self.getItems('Code == "{0}"'.format(itemCode))
+            items = self.getItems((ItemField.CODE, '==', str(itemCode)))
             if len(items) == 0:
                 self.__logger.error('updateItem: Item {0} not found.'.format(itemCode))
                 return None
@@ -373,6 +629,7 @@ class Dataset:
         """Unify item fiels to pairs (string, string) or (string, None)."""
         return {key: toNonEmptyStr(value) for key, value in fields.items()}
 
+    @exclusive
     def updateItem(self, itemCode, **item):
         """Update an item of a given item code.
         Args:
@@ -388,7 +645,7 @@ class Dataset:
             self.__logger.error('updateItem: Item code "{0}" does not match item code "{1}" in the item structure.'.format(
                     itemCode, item[ItemField.CODE]))
             return False
-        elif self.__items.update(self.__unifyFields(item), 'Code == "{0}"'.format(itemCode)) != 1:
+        elif self.__items.update(self.__unifyFields(item), (ItemField.CODE, '==', str(itemCode))) != 1:
             self.__logger.error('updateItem: Item "{0}" has not been updated.'.format(itemCode))
             return False
         else:
@@ -396,6 +653,7 @@ class Dataset:
                     itemCode, json.dumps(item, cls=JSONDecimalEncoder)))
             return True
 
+    @exclusive
     def updateMultipleItems(self, expression, **fields):
         """Update multiple items that satisfies the expression.
         Args:
@@ -419,6 +677,34 @@ class Dataset:
                             expression, numUpdated, json.dumps(fields, cls=JSONDecimalEncoder)))
             return numUpdated
 
+    @exclusive
+    def createItemAggregate(self, fields, function):
+        """Create running totals over items (see Table.createAggregate). Reserved items are skipped.
+        Args:
+            fields -- Fields which the totals depend on.
+            function -- Function mapping an item to a dictionary name -> number or None.
+        Returns:
+            Aggregate.
+        """
+        def aggregateItem(row):
+            item = self.__convertItem(row)
+            return function(item) if item is not None else None
+
+        return self.__items.createAggregate(
+                list(fields) + [ItemField.OWNER, ItemField.AUTHOR, ItemField.TITLE], aggregateItem)
+
+    @shared
+    def getItemAggregate(self, aggregate, rebuild=False):
+        """Get running totals over items.
+        Args:
+            aggregate -- Aggregate created by createItemAggregate.
+            rebuild -- True to calculate the totals from scratch.
+        Returns:
+            Dictionary name -> total.
+        """
+        return self.__items.aggregate(aggregate, rebuild)
+
+    @shared
     def countItems(self, expression):
         """Count a number of items that matches the expression.
         """
@@ -432,6 +718,7 @@ class Dataset:
         currencyInfo[CurrencyField.FORMAT_SUFFIX] = currencyInfo[CurrencyField.FORMAT_SUFFIX] or ''
         return currencyInfo
 
+    @shared
     def getCurrencyInfo(self, currencyCodes):        
         """Retrieve currency info for a list of currencies.
         Args:
@@ -442,7 +729,7 @@ class Dataset:
         """
         currencyInfoList = self.__currency.select(
                 CurrencyField.ALL_PERSISTENT,
-                'Code in [{0}]'.format(toQuotedStr(currencyCodes)))
+                (CurrencyField.CODE, 'in', [str(code) for code in currencyCodes]))
         currencyInfoList[:] = [self.__normalizeCurrencyInfo(info) for info in currencyInfoList]
         
         # order by the input list
@@ -457,6 +744,7 @@ class Dataset:
 
         return orderedCurrencyInfoList
 
+    @exclusive
     def updateCurrencyInfo(self, currencyInfoList):
         """ Update currency info.
         """
@@ -483,7 +771,7 @@ class Dataset:
             updated = 0
             for currencyInfo in currencyInfoList:
                 if self.__currency.update({
-                            CurrencyField.AMOUNT_IN_PRIMARY: currencyInfo[CurrencyField.AMOUNT_IN_PRIMARY]}, 'Code == "{0}"'.format(toQuoteSafeStr(currencyInfo[CurrencyField.CODE]))) == 1:
+                            CurrencyField.AMOUNT_IN_PRIMARY: currencyInfo[CurrencyField.AMOUNT_IN_PRIMARY]}, (CurrencyField.CODE, '==', str(currencyInfo[CurrencyField.CODE]))) == 1:
                     updated = updated + 1
                 else:
                     self.__logger.error('updateCurrencyInfo: Currency "{0}" failed to update. Skipping.'.format(
@@ -498,6 +786,7 @@ class Dataset:
     def __getItemJpgImageFilename(self, itemCode):
         return self.__imageDataPath, 'item{0}.jpg'.format(itemCode)
 
+    @exclusive
     def updateItemImage(self, itemCode, imageFile):
         result = Result.ERROR
 
@@ -535,8 +824,10 @@ class Dataset:
             os.remove(imageTempFilePath)
         if result != Result.SUCCESS and os.path.isfile(imageFilePath):
             os.remove(imageFilePath)
+        self.__modifications = self.__modifications + 1
         return result
 
+    @shared
     def getItemJpgImage(self, itemCode):
         imagePath, imageFilename = self.__getItemJpgImageFilename(itemCode)
         imageFullPath = path.join(imagePath, imageFilename)
@@ -0,0 +1,188 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import array
+import io
+import json
+import os
+import re
+import uuid
+from os import path
+
+from artshowkeeper.common.convert import *
+
+class SpooledImport:
+    """Read-only sequence of imported items spooled in a file.
+    Items are stored one per line as JSON (JSONL) and read on demand, so
+    only offsets of lines are kept in memory.
+    Attributes:
+        importID -- Import ID.
+    """
+    def __init__(self, importID, filename, offsets):
+        self.importID = importID
+        self.__filename = filename
+        self.__offsets = offsets
+
+    def __len__(self):
+        return len(self.__offsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index = index + len(self.__offsets)
+        if index < 0 or index >= len(self.__offsets):
+            raise IndexError('Imported item {0} is out of range.'.format(index))
+        return self.page(index, 1)[0]
+
+    def __iter__(self):
+        with io.open(self.__filename, mode='rb') as spoolFile:
+            for line in spoolFile:
+                yield json.loads(line.decode('utf-8'))
+
+    def page(self, first, count):
+        """Read a page of items.
+        Args:
+            first -- Index of the first item.
+            count -- Maximal number of items.
+        Returns:
+            List of items.
+        """
+        first = max(0, first)
+        last = min(len(self.__offsets), first + count)
+        items = []
+        if first < last:
+            # Offsets are byte offsets, which are valid positions of a binary file only
+            with io.open(self.__filename, mode='rb') as spoolFile:
+                spoolFile.seek(self.__offsets[first])
+                for index in range(first, last):
+                    items.append(json.loads(spoolFile.readline().decode('utf-8')))
+        return items
+
+class ImportSpool:
+    """Spool of imports.
+    Each import is stored in a file import.<import ID>.jsonl in a folder. Files
+    are written to a temporary file first and renamed when complete.
+    """
+    FILENAME_PATTERN = re.compile(r'^import\.([0-9a-f]{32})\.jsonl$')
+
+    def __init__(self, logger, spoolPath):
+        """Create a spool.
+        Args:
+            spoolPath: Folder of spooled imports. It is created on the first import.
+        """
+        self.__logger = logger
+        self.__spoolPath = spoolPath
+
+    def __filename(self, importID):
+        importID = toNonEmptyStr(importID)
+        if importID is None or self.FILENAME_PATTERN.match('import.{0}.jsonl'.format(importID)) is None:
+            return None
+        return path.join(self.__spoolPath, 'import.{0}.jsonl'.format(importID))
+
+    def __write(self, filename, items):
+        """Write items to a file.
+        Returns:
+            Offsets of items.
+        """
+        offsets = array.array('Q')
+        tempFilename = filename + '.tmp'
+        try:
+            with io.open(tempFilename, mode='wb') as spoolFile:
+                offset = 0
+                for item in items:
+                    line = (json.dumps(item, cls=JSONDecimalEncoder, ensure_ascii=False) + '\n').encode('utf-8')
+                    spoolFile.write(line)
+                    offsets.append(offset)
+                    offset = offset + len(line)
+            os.replace(tempFilename, filename)
+        finally:
+            if path.isfile(tempFilename):
+                os.remove(tempFilename)
+        return offsets
+
+    def create(self, items):
+        """Spool items of a new import.
+        Args:
+            items: Iterable of imported items (dictionaries). Items are consumed one by one.
+        Returns:
+            SpooledImport.
+        """
+        os.makedirs(self.__spoolPath, exist_ok=True)
+        importID = uuid.uuid4().hex
+        filename = self.__filename(importID)
+        offsets = self.__write(filename, items)
+        self.__logger.debug('create: Import {0} with {1} item(s) has been spooled.'.format(importID, len(offsets)))
+        return SpooledImport(importID, filename, offsets)
+
+    def update(self, spooledImport, updates):
+        """Update fields of spooled items.
+        Args:
+            spooledImport: Spooled import.
+            updates: Dictionary item index -> dictionary of updated fields.
+        Returns:
+            Updated SpooledImport.
+        """
+        filename = self.__filename(spooledImport.importID)
+
+        def updateItems():
+            for index, item in enumerate(spooledImport):
+                item.update(updates.get(index, {}))
+                yield item
+
+        offsets = self.__write(filename, updateItems())
+        return SpooledImport(spooledImport.importID, filename, offsets)
+
+    def open(self, importID):
+        """Open a spooled import.
+        Returns:
+            SpooledImport or None if the import does not exist.
+        """
+        filename = self.__filename(importID)
+        if filename is None or not path.isfile(filename):
+            return None
+
+        offsets = array.array('Q')
+        with io.open(filename, mode='rb') as spoolFile:
+            offset = 0
+            for line in spoolFile:
+                offsets.append(offset)
+                offset = offset + len(line)
+        return SpooledImport(importID, filename, offsets)
+
+    def drop(self, importID):
+        """Remove a spooled import."""
+        filename = self.__filename(importID)
+        if filename is not None and path.isfile(filename):
+            os.remove(filename)
+
+    def sweep(self, importIDs):
+        """Remove spooled imports which are not listed.
+        Args:
+            importIDs: Set of IDs of imports which are kept.
+        Returns:
+            Number of removed imports.
+        """
+        if not path.isdir(self.__spoolPath):
+            return 0
+
+        removed = 0
+        for filename in os.listdir(self.__spoolPath):
+            match = self.FILENAME_PATTERN.match(filename)
+            if match is not None and match.group(1) not in importIDs:
+                os.remove(path.join(self.__spoolPath, filename))
+                removed = removed + 1
+        if removed > 0:
+            self.__logger.debug('sweep: {0} spooled import(s) have been removed.'.format(removed))
+        return removed
@@ -14,6 +14,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+import hashlib
+import sys
+from collections.abc import MutableMapping
 
 class ItemState:
     OPEN = 'OPEN' # Next: OPEN, ON_SALE
@@ -68,6 +71,134 @@ class ItemField:
     ALL_PERSISTENT = sorted([CODE, STATE, OWNER, AUTHOR, TITLE, MEDIUM, NOTE, IMPORT_NUMBER, CHARITY, INITIAL_AMOUNT, BUYER, AMOUNT, AMOUNT_IN_AUCTION])
     ALL_AMOUNTS = [INITIAL_AMOUNT, AMOUNT_IN_AUCTION, AMOUNT]
         
+def calculateSortCode(code):
+    """Calculate integer which can be used to sort items by code (e.g. A12 -> 650012)."""
+    sortCode = 0
+    code = code or '0'
+    if len(code) > 0:
+        if code[0].isalpha():
+            sortCode = (ord(code[0]) * 10000) + int(code[1:])
+        else:
+            sortCode = int(code)
+    return sortCode
+
+PERSISTENT_FIELD_INDEX = {colName: index for index, colName in enumerate(ItemField.ALL_PERSISTENT)}
+"""Position of a persistent field in an item record."""
+
+INTERNED_FIELD_INDEXES = [PERSISTENT_FIELD_INDEX[colName] for colName in [
+        ItemField.STATE, ItemField.OWNER, ItemField.BUYER, ItemField.AUTHOR, ItemField.MEDIUM,
+        ItemField.CHARITY, ItemField.INITIAL_AMOUNT, ItemField.AMOUNT]]
+"""Persistent fields whose string values repeat and which are shared by all records."""
+
+DERIVED_FIELDS = {
+        ItemField.SORT_CODE: lambda item: calculateSortCode(item[ItemField.CODE]),
+        ItemField.PRINT_ALLOWED: lambda item: item[ItemField.STATE] in [ItemState.OPEN, ItemState.ON_SHOW, ItemState.ON_SALE],
+        ItemField.DELETE_ALLOWED: lambda item: item[ItemField.STATE] in [ItemState.OPEN, ItemState.ON_SHOW, ItemState.ON_SALE] }
+"""Fields calculated by an item record unless they are assigned."""
+
+class Item(MutableMapping):
+    """Compact record of an item which behaves as a dictionary keyed by ItemField.
+    Records are meant to be kept in memory, use toDict to get a dictionary which is
+    faster to work with. Persistent fields (ItemField.ALL_PERSISTENT) are stored in a list, other fields
+    in a dictionary which is created on the first assignment. Fields SORT_CODE,
+    PRINT_ALLOWED and DELETE_ALLOWED are derived on access unless they are assigned.
+    Derived fields are not enumerated by keys().
+    """
+    __slots__ = ('__values', '__extra')
+
+    def __init__(self, values=None, persistentOnly=False):
+        """Create an item.
+        Args:
+            values -- Mapping of fields to initialize the item with. Missing persistent fields are None.
+            persistentOnly -- True to take over the persistent fields only.
+        """
+        self.__extra = None
+        if values is None:
+            self.__values = [None] * len(ItemField.ALL_PERSISTENT)
+        else:
+            self.__values = [values.get(colName, None) for colName in ItemField.ALL_PERSISTENT]
+            for index in INTERNED_FIELD_INDEXES:
+                value = self.__values[index]
+                if value.__class__ is str:
+                    self.__values[index] = sys.intern(value)
+            if not persistentOnly:
+                for key, value in values.items():
+                    if key not in PERSISTENT_FIELD_INDEX:
+                        self[key] = value
+
+    def __getitem__(self, key):
+        try:
+            return self.__values[PERSISTENT_FIELD_INDEX[key]]
+        except KeyError:
+            pass
+        extra = self.__extra
+        if extra is not None and key in extra:
+            return extra[key]
+        derive = DERIVED_FIELDS.get(key, None)
+        if derive is not None:
+            return derive(self)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        index = PERSISTENT_FIELD_INDEX.get(key, None)
+        if index is not None:
+            self.__values[index] = value
+        elif self.__extra is None:
+            self.__extra = {key: value}
+        else:
+            self.__extra[key] = value
+
+    def __delitem__(self, key):
+        """Delete a field. Persistent fields are set to None."""
+        index = PERSISTENT_FIELD_INDEX.get(key, None)
+        if index is not None:
+            self.__values[index] = None
+        elif self.__extra is not None and key in self.__extra:
+            del self.__extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in PERSISTENT_FIELD_INDEX \
+                or (self.__extra is not None and key in self.__extra) \
+                or key in DERIVED_FIELDS
+
+    def __iter__(self):
+        yield from ItemField.ALL_PERSISTENT
+        if self.__extra is not None:
+            yield from list(self.__extra)
+
+    def __len__(self):
+        return len(self.__values) + (len(self.__extra) if self.__extra is not None else 0)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def toDict(self, derived=False):
+        """Copy the item to a dictionary.
+        Args:
+            derived: True to include derived fields (see DERIVED_FIELDS).
+        """
+        item = dict(zip(ItemField.ALL_PERSISTENT, self.__values))
+        if derived:
+            for key, derive in DERIVED_FIELDS.items():
+                item[key] = derive(self)
+        if self.__extra is not None:
+            item.update(self.__extra)
+        return item
+
+    def copy(self):
+        item = Item.__new__(Item)
+        item.__values = self.__values[:]
+        item.__extra = dict(self.__extra) if self.__extra is not None else None
+        return item
+
+    def __repr__(self):
+        return repr(dict(self))
+
 class ImportedItemField:
     NUMBER = 'NMBR'
     OWNER = 'OWNR'
@@ -79,23 +210,33 @@ class ImportedItemField:
     CHARITY = 'CHAR'
     IMPORT_RESULT = 'IRES'
 
-def __calculateComponentChecksum(value):
-    checksum = 0
-    if value is not None:
-        string = str(value)
-        for ch in string:
-            checksum = checksum ^ ord(ch)
-    return checksum
-
-def calculateImportedItemChecksum(importedItem):
-    """Calculate checksum of an imported item.
-    Returns:
-        Checksum
+class ImportedItemChecksum:
+    """Checksum of imported items (BLAKE2b).
+    The checksum is updated item by item in the order of the import, so
+    reordered or swapped items change it as well.
     """
-    checksum = __calculateComponentChecksum(importedItem.get(ImportedItemField.IMPORT_RESULT, None))
-    checksum = (checksum * 3) ^ __calculateComponentChecksum(importedItem[ImportedItemField.AUTHOR])
-    checksum = (checksum * 3) ^ __calculateComponentChecksum(importedItem[ImportedItemField.TITLE])
-    checksum = (checksum * 3) ^ __calculateComponentChecksum(importedItem[ImportedItemField.INITIAL_AMOUNT])
-    checksum = (checksum * 3) ^ __calculateComponentChecksum(importedItem[ImportedItemField.CHARITY])
+    FIELDS = [
+            ImportedItemField.IMPORT_RESULT,
+            ImportedItemField.NUMBER,
+            ImportedItemField.OWNER,
+            ImportedItemField.AUTHOR,
+            ImportedItemField.TITLE,
+            ImportedItemField.MEDIUM,
+            ImportedItemField.NOTE,
+            ImportedItemField.INITIAL_AMOUNT,
+            ImportedItemField.CHARITY]
+
+    def __init__(self):
+        self.__hash = hashlib.blake2b(digest_size=8)
+
+    def update(self, importedItem):
+        """Add an imported item to the checksum."""
+        # Values are strings, integers or None, so their representation is unambiguous.
+        self.__hash.update(repr(tuple(map(importedItem.get, self.FIELDS))).encode('utf-8'))
 
-    return checksum
+    def value(self):
+        """
+        Returns:
+            Checksum (64-bit integer).
+        """
+        return int.from_bytes(self.__hash.digest(), 'big')
@@ -0,0 +1,216 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import collections
+import itertools
+import json
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . item import ImportedItemField
+from artshowkeeper.common.convert import *
+from artshowkeeper.common.result import Result
+
+def normalizeItemImport(logger, itemImport):
+    """Normalizes item import.
+    Returns:
+        (result, item).
+    """
+    item = {
+            ImportedItemField.NUMBER: None,
+            ImportedItemField.OWNER: None,
+            ImportedItemField.AUTHOR: None,
+            ImportedItemField.TITLE: None,
+            ImportedItemField.MEDIUM: None,
+            ImportedItemField.NOTE: None,
+            ImportedItemField.INITIAL_AMOUNT: None,
+            ImportedItemField.CHARITY: None }
+
+    component = itemImport.get(ImportedItemField.NUMBER, None)
+    number = toInt(component)
+    if number is None and component is not None and len(component) > 0:
+        logger.error('purifyRawItemImport:  Number "{0}" is not an integer.'.format(component))
+        return Result.INVALID_ITEM_NUMBER, item
+    item[ImportedItemField.NUMBER] = number
+
+    component = itemImport.get(ImportedItemField.OWNER, None)
+    owner = toInt(component)
+    if owner is None and component is not None and len(component) > 0:
+        logger.error('purifyRawItemImport:  Owner "{0}" is not an integer.'.format(component))
+        return Result.INVALID_ITEM_OWNER, item
+    item[ImportedItemField.OWNER] = owner
+
+    item[ImportedItemField.AUTHOR] = toNonEmptyStr(
+            itemImport.get(ImportedItemField.AUTHOR, None))            
+
+    item[ImportedItemField.TITLE] = toNonEmptyStr(
+            itemImport.get(ImportedItemField.TITLE, None))            
+
+    item[ImportedItemField.MEDIUM] = toNonEmptyStr(
+            itemImport.get(ImportedItemField.MEDIUM, None))            
+
+    item[ImportedItemField.NOTE] = toNonEmptyStr(
+            itemImport.get(ImportedItemField.NOTE, None))            
+
+    component = itemImport.get(ImportedItemField.INITIAL_AMOUNT, None)
+    amount = toDecimal(component)
+    if amount is None and component is not None and len(component) > 0:
+        logger.error('purifyRawItemImport:  Amount "{0}" is not a decimal number.'.format(component))
+        return Result.INVALID_AMOUNT, item
+    item[ImportedItemField.INITIAL_AMOUNT] = str(amount) if amount is not None else None
+
+    component = itemImport.get(ImportedItemField.CHARITY, None)
+    charity = toInt(component)
+    if charity is None and component is not None and len(component) > 0:
+        logger.error('purifyRawItemImport:  Charity "{0}" is not an integer.'.format(component))
+        return Result.INVALID_CHARITY, item
+    item[ImportedItemField.CHARITY] = charity
+
+    return Result.SUCCESS, item
+
+def checkImportedItemConsistency(logger, importedItem):
+    """Check consistency of imported item.
+    Returns:
+        Import result.
+    """
+    if importedItem[ImportedItemField.AUTHOR] is None or len(importedItem[ImportedItemField.AUTHOR]) == 0:
+        logger.error('checkImportedItemConsistency: Author is undefined.')
+        return Result.INVALID_AUTHOR
+    if importedItem[ImportedItemField.TITLE] is None or len(importedItem[ImportedItemField.TITLE]) == 0:
+        logger.error('checkImportedItemConsistency: Title is undefined.')
+        return Result.INVALID_TITLE
+    if importedItem[ImportedItemField.INITIAL_AMOUNT] is None and importedItem[ImportedItemField.CHARITY] is None:
+        return Result.SUCCESS
+    if importedItem[ImportedItemField.INITIAL_AMOUNT] is None or importedItem[ImportedItemField.CHARITY] is None:
+        logger.error('checkImportedItemConsistency: Either charity is undefined while initial amount is defined or vice versa.')
+        return Result.INCOMPLETE_SALE_INFO
+    if toDecimal(importedItem[ImportedItemField.INITIAL_AMOUNT]) < 0:
+        logger.error('checkImportedItemConsistency: Amount is negative.')
+        return Result.INVALID_AMOUNT
+    if importedItem[ImportedItemField.CHARITY] < 0 or importedItem[ImportedItemField.CHARITY] > 100:
+        logger.error('checkImportedItemConsistency: Charity is not in a range [0, 100].')
+        return Result.INVALID_CHARITY
+    return Result.SUCCESS
+
+def processItemImport(logger, rawItemImport):
+    """Normalize and check a raw imported item.
+    Returns:
+        Imported item with the result inside.
+    """
+    result, item = normalizeItemImport(logger, rawItemImport)
+    if result != Result.SUCCESS:
+        logger.error('processItemImport: Reading a raw item "{0}" failed with a result {1}.'.format(
+                json.dumps(rawItemImport, cls=JSONDecimalEncoder), result))
+    else:
+        result = checkImportedItemConsistency(logger, item)
+        if result != Result.SUCCESS:
+            logger.error('processItemImport: Line "{0}" failed consistency check with a result {1}.'.format(
+                    json.dumps(rawItemImport, cls=JSONDecimalEncoder), result))
+
+    item[ImportedItemField.IMPORT_RESULT] = result
+    return item
+
+def processItemImports(rawItemImports):
+    """Process a chunk of raw imported items in a worker process.
+    Returns:
+        List of imported items.
+    """
+    logger = logging.getLogger('import')
+    return [processItemImport(logger, rawItemImport) for rawItemImport in rawItemImports]
+
+class ImportValidator:
+    """Processes raw imported items (see processItemImport).
+    Large imports are split into chunks which are processed by a pool of worker
+    processes. Results are returned in the original order. The pool is started by
+    the first large import and it is shared by all later imports. Workers are spawned,
+    not forked, because forking a process with running threads (e.g. of the server)
+    can leave locks in the workers held forever.
+    """
+    DEFAULT_THRESHOLD = 2000
+    DEFAULT_CHUNK_SIZE = 500
+
+    def __init__(self, logger, workers=0, threshold=DEFAULT_THRESHOLD, chunkSize=DEFAULT_CHUNK_SIZE):
+        """Create a validator.
+        Args:
+            workers -- Number of worker processes or 0 to process all items in the calling thread.
+            threshold -- Minimal number of items of an import which is processed by workers.
+            chunkSize -- Number of items sent to a worker at once.
+        """
+        self.__logger = logger
+        self.__workers = max(0, workers)
+        self.__threshold = max(1, threshold)
+        self.__chunkSize = max(1, chunkSize)
+        self.__executor = None
+        self.__executorLock = threading.Lock()
+
+    def process(self, rawItemImports):
+        """Process raw imported items.
+        Args:
+            rawItemImports -- Iterable of raw imported items. Items are read as they are needed.
+        Returns:
+            Generator of imported items.
+        """
+        rawItemImports = iter(rawItemImports)
+        if self.__workers > 0:
+            head = list(itertools.islice(rawItemImports, self.__threshold))
+            if len(head) >= self.__threshold:
+                yield from self.__processParallel(itertools.chain(head, rawItemImports))
+                return
+            rawItemImports = iter(head)
+
+        for rawItemImport in rawItemImports:
+            yield processItemImport(self.__logger, rawItemImport)
+
+    def __getExecutor(self):
+        with self.__executorLock:
+            if self.__executor is None:
+                self.__executor = ProcessPoolExecutor(
+                        max_workers=self.__workers, mp_context=multiprocessing.get_context('spawn'))
+            return self.__executor
+
+    def close(self):
+        """Stop worker processes (if any)."""
+        with self.__executorLock:
+            if self.__executor is not None:
+                self.__executor.shutdown()
+                self.__executor = None
+
+    def __processParallel(self, rawItemImports):
+        self.__logger.debug('__processParallel: Processing import by {0} worker(s).'.format(self.__workers))
+        executor = self.__getExecutor()
+        # A bounded number of chunks is processed at once to keep memory flat.
+        pending = collections.deque()
+        try:
+            while True:
+                chunk = list(itertools.islice(rawItemImports, self.__chunkSize))
+                if len(chunk) > 0:
+                    pending.append(executor.submit(processItemImports, chunk))
+                if len(pending) > 0 and (len(chunk) == 0 or len(pending) >= 2 * self.__workers):
+                    yield from pending.popleft().result()
+                elif len(chunk) == 0:
+                    break
+        except BrokenProcessPool:
+            # A worker died, the next import starts a new pool
+            with self.__executorLock:
+                if self.__executor is executor:
+                    self.__executor = None
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
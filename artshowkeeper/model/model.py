@@ -23,16 +23,19 @@ import json
 import csv
 from datetime import datetime, timedelta
 from decimal import Decimal
-import math
 import base64
+import time
 from werkzeug.datastructures import FileStorage
 
 from . import session
 from . dataset import Dataset
-from . item import ItemField, ItemState, ImportedItemField, calculateImportedItemChecksum
+from . item import ItemField, ItemState, ImportedItemField, ImportedItemChecksum, calculateSortCode
+from . item_import import ImportValidator
+from . auction_order import calculateAuctionOrder
+from . rwlock import shared, exclusive
 from . currency import Currency, CurrencyField
 
-from . summary import SummaryField, DrawerSummaryField, ActorSummary
+from . summary import SummaryField, DrawerSummaryField, TotalsField, ActorSummary
 from . field_value_error import FieldValueError
 from artshowkeeper.common.authentication import UserGroups, getNonZeroRandom
 from artshowkeeper.common.convert import *
@@ -40,14 +43,43 @@ from artshowkeeper.common.result import Result
 
 class Model:
     SESSION_TIMEOUT_HOURS = 2
+    SUMMARY_CACHE_SECONDS = 60
+    POTENTIALLY_SOLD_STATES = [ItemState.IN_AUCTION, ItemState.SOLD, ItemState.DELIVERED, ItemState.FINISHED]
 
-    def __init__(self, logger, dataset, currency):
+    def __init__(self, logger, dataset, currency, importWorkers=0, importParallelThreshold=ImportValidator.DEFAULT_THRESHOLD):
+        """Create a model.
+        Args:
+            importWorkers -- Number of processes validating large imports or 0 to validate in the request thread.
+            importParallelThreshold -- Minimal number of items of an import validated by the processes.
+        """
         self.__logger = logger
         self.__dataset = dataset
         self.__currency = currency
+        self.__importValidator = ImportValidator(
+                self.__logger, workers=importWorkers, threshold=importParallelThreshold)
+        self.__auctionSortCodes = None
+        self.__badgeSummaries = {}
+        self.__itemTotals = self.__dataset.createItemAggregate(
+                [ItemField.STATE, ItemField.AMOUNT, ItemField.AMOUNT_IN_AUCTION, ItemField.CHARITY],
+                self.__getItemTotalsContribution)
 
     def persist(self):
         self.__dataset.persist()
+
+    def reading(self):
+        """Lock the model for reading (see Dataset.reading)."""
+        return self.__dataset.reading()
+
+    def writing(self):
+        """Lock the model for writing (see Dataset.writing)."""
+        return self.__dataset.writing()
+
+    def getDataVersion(self):
+        """Get a version of data shown to users (see Dataset.version).
+        Returns:
+            Pair (version, time when the version has been noticed first).
+        """
+        return self.__dataset.version()
         
     def startNewSession(self, userGroup, userIP):
         """Start a new session.
@@ -61,9 +93,9 @@ class Model:
                 self.__logger.info('startNewSession: Created a session {0}'.format(sessionID))
                 self.__dataset.updateSessionPairs(sessionID, **{
                         session.Field.CREATED_TIMESTAMP: datetime.now(),
+                        session.Field.VALID_UNTIL_TIMESTAMP: datetime.now() + timedelta(hours=self.SESSION_TIMEOUT_HOURS),
                         session.Field.USER_GROUP: userGroup,
                         session.Field.USER_IP: userIP})
-                self.renewSession(sessionID)
 
                 self.__dataset.persist()
                 return sessionID
@@ -80,25 +112,23 @@ class Model:
         """
         return sessionID is not None \
             and sessionID != Dataset.GLOBAL_SESSION_ID \
-            and self.__dataset.getSessionValue(sessionID, session.Field.CREATED_TIMESTAMP, None) is not None \
-            and self.__dataset.getSessionValue(sessionID, session.Field.VALID_UNTIL_TIMESTAMP, None) is not None 
+            and self.__dataset.findSession(sessionID)
 
 
     def sweepSessions(self):
         """Sweep expired sessions.
         """
-        now = datetime.now()
-        sessionIDs = self.__dataset.getClientSessionIDs()
-        for sessionID in sessionIDs:
-            validUntilTime = toDateTime(self.__dataset.getSessionValue(sessionID, session.Field.VALID_UNTIL_TIMESTAMP, None))
-            if validUntilTime is None:
-                self.__dataset.dropValidSession(sessionID)
-                self.__logger.debug(
-                        'sweepSessions: Session {0} has been dropped because it does not include a valid timestamp.'.format(sessionID))
-            elif datetime.now() >= validUntilTime:
-                self.__dataset.dropValidSession(sessionID)
-                self.__logger.debug(
-                        'sweepSessions: Session {0} has been dropped because it has expired (timestamp: %d).'.format(sessionID, validUntilTime))
+        for sessionID in self.__dataset.sweepSessions():
+            self.__logger.debug(
+                    'sweepSessions: Session {0} has been dropped because it has expired or it does not include a valid timestamp.'.format(sessionID))
+
+
+    def getSessionStatistics(self):
+        """Get counters of session sweeping.
+        Returns:
+            Dictionary (see session.StatisticsField).
+        """
+        return self.__dataset.getSessionStatistics()
 
 
     def dropSession(self, sessionID):
@@ -138,6 +168,39 @@ class Model:
                     session.Field.USER_IP: userIP})
 
 
+    LOCAL_IP = '127.0.0.1'
+
+    def openRequestSession(self, sessionID, userIP):
+        """Find a session of a request or start a new one.
+        Requests from the local computer are granted the group ADMIN. A local session
+        used from other IP is dropped.
+        Args:
+            sessionID: Session ID sent by the client (or None).
+            userIP: User IP.
+        Returns:
+            Tuple (session ID, user group, user IP).
+        """
+        localRequest = userIP == self.LOCAL_IP
+        if localRequest and self.findSession(sessionID):
+            group, ip = self.getSessionUserInfo(sessionID)
+            if ip != self.LOCAL_IP:
+                self.__logger.warning('openRequestSession: Local session has been compromised by IP {0}. Resetting.'.format(ip))
+                self.dropSession(sessionID)
+                sessionID = None
+            else:
+                self.renewSession(sessionID)
+
+        if not self.findSession(sessionID):
+            sessionID = self.startNewSession(
+                    userGroup=UserGroups.ADMIN if localRequest else UserGroups.UNKNOWN,
+                    userIP=userIP)
+        else:
+            self.updateSessionUserInfo(sessionID, userIP=userIP)
+
+        userGroup, userIP = self.getSessionUserInfo(sessionID)
+        return sessionID, userGroup, userIP
+
+
     def approveDeviceCode(self, sessionID, deviceCode, userGroup):
         """Approve device code for connection."""
         if self.__dataset.getSessionValue(sessionID, session.Field.USER_GROUP, UserGroups.OTHERS) == UserGroups.ADMIN:
@@ -251,6 +314,7 @@ class Model:
         """Remove a (key, value) in a session."""
         self.__dataset.updateSessionPairs(sessionID, **{key: None})        
 
+    @exclusive
     def addNewItem(self, sessionID, owner, title, author, medium, amount, charity, note, importNumber=None, requestImportNumberCodeMatch=False):
         """Add a new item.
         Returns:
@@ -334,16 +398,18 @@ class Model:
     def __getImportedItem(self, owner, importNumber):
         item = None
         if owner is not None and importNumber is not None:
-            importedItems = self.__dataset.getItems('Owner == "{0}" and ImportNumber == "{1}"'.format(
-                    owner, importNumber))
+            importedItems = self.__dataset.getItems([
+                    (ItemField.OWNER, '==', str(owner)),
+                    (ItemField.IMPORT_NUMBER, '==', str(importNumber))])
             if len(importedItems) > 0:
                 item = importedItems[0]
         return item
 
     def __getSimilarItem(self, owner, author, title):
-        similarItems = self.__dataset.getItems(
-                'Owner == "{0}" and Author == "{1}" and Title == "{2}"'.format(
-                owner, toQuoteSafeStr(author), toQuoteSafeStr(title)))
+        similarItems = self.__dataset.getItems([
+                (ItemField.OWNER, '==', str(owner)),
+                (ItemField.AUTHOR, '==', str(author)),
+                (ItemField.TITLE, '==', str(title))])
         if len(similarItems) > 0:
             return similarItems[0]
         else:
@@ -354,105 +420,102 @@ class Model:
         Args:
             sessionID: Session ID.
         """
+        importID = self.__dataset.getSessionValue(sessionID, session.Field.IMPORT_ID)
+        if importID is not None:
+            self.__dataset.dropSpooledImport(importID)
         self.__dataset.updateSessionPairs(sessionID, **{
-                session.Field.IMPORTED_ITEMS: None,
+                session.Field.IMPORT_ID: None,
                 session.Field.IMPORTED_CHECKSUM: None})
 
-    def __checkImportedItemConsistency(self, importedItem):
-        """Check consistency of imported item.
+    def getImport(self, sessionID):
+        """Get the pending import of a session.
+        Args:
+            sessionID: Session ID.
         Returns:
-            Import result.
+            (imported items, checksum) or (None, None) if there is no import.
         """
-        if importedItem[ImportedItemField.AUTHOR] is None or len(importedItem[ImportedItemField.AUTHOR]) == 0:
-            self.__logger.error('__checkImportedItemConsistency: Author is undefined.')
-            return Result.INVALID_AUTHOR
-        if importedItem[ImportedItemField.TITLE] is None or len(importedItem[ImportedItemField.TITLE]) == 0:
-            self.__logger.error('__checkImportedItemConsistency: Title is undefined.')
-            return Result.INVALID_TITLE
-        if importedItem[ImportedItemField.INITIAL_AMOUNT] is None and importedItem[ImportedItemField.CHARITY] is None:
-            return Result.SUCCESS
-        if importedItem[ImportedItemField.INITIAL_AMOUNT] is None or importedItem[ImportedItemField.CHARITY] is None:
-            self.__logger.error('__checkImportedItemConsistency: Either charity is undefined while initial amount is defined or vice versa.')
-            return Result.INCOMPLETE_SALE_INFO
-        if toDecimal(importedItem[ImportedItemField.INITIAL_AMOUNT]) < 0:
-            self.__logger.error('__checkImportedItemConsistency: Amount is negative.')
-            return Result.INVALID_AMOUNT
-        if importedItem[ImportedItemField.CHARITY] < 0 or importedItem[ImportedItemField.CHARITY] > 100:
-            self.__logger.error('__checkImportedItemConsistency: Charity is not in a range [0, 100].')
-            return Result.INVALID_CHARITY
-        return Result.SUCCESS
+        importedChecksum = self.__dataset.getSessionValue(sessionID, session.Field.IMPORTED_CHECKSUM, None)
+        importID = self.__dataset.getSessionValue(sessionID, session.Field.IMPORT_ID, None)
+        importedItems = self.__dataset.getSpooledImport(importID) if importID is not None else None
+        if importedChecksum is None or importedItems is None:
+            return None, None
+        return importedItems, toInt(importedChecksum)
 
-    def __calculateImportItemsChecksum(self, importedItems):
-        """Calculate checksum of the import.
+    def __getImportedItemKeys(self, item):
+        """Get keys which identify an imported item (case insensitive).
+        Imported items match if they have the same author and title or the same number.
         Returns:
-            Imported item with the result inside.
+            List of keys.
         """
-        checksum = 0
-        for item in importedItems:
-            checksum = checksum ^ calculateImportedItemChecksum(item)
-        return checksum
-
-    def __matchStrings(self, stringA, stringB):
-        """Match strings, case insensitive.
-        Return:
-            True if string matches.
+        keys = []
+        author = item[ImportedItemField.AUTHOR]
+        title = item[ImportedItemField.TITLE]
+        if author is not None and title is not None:
+            keys.append(('AuthorTitle', str(author).lower(), str(title).lower()))
+        number = item[ImportedItemField.NUMBER]
+        if number is not None:
+            keys.append(('Number', str(number).lower()))
+        return keys
+
+    def __findDuplicatesWithinImport(self, groups):
+        """Find duplicities within the import items.
+        All items of a group with more than one item are duplicate.
+        Args:
+            groups -- Dictionary key -> list of indexes of items with the key (see __getImportedItemKeys).
+        Returns:
+            Dictionary index of a duplicate item -> index of the first item of its group.
         """
-        return stringA is not None and \
-                    stringB is not None and \
-                    str(stringA).lower() == str(stringB).lower()
-
-    def __matchImportedItems(self, itemA, itemB):
-        """Match imported items
+        duplicates = {}
+        for indexes in groups.values():
+            if len(indexes) > 1:
+                for index in indexes[1:]:
+                    duplicates.setdefault(index, indexes[0])
+                duplicates.setdefault(indexes[0], indexes[0])
+
+        for index in sorted(duplicates):
+            if duplicates[index] != index:
+                self.__logger.info('__findDuplicatesWithinImport: Item {0} is duplicate of an item {1}.'.format(
+                        index + 1, duplicates[index] + 1))
+        return duplicates
+
+    def __postProcessImport(self, sessionID, rawItems):
+        """Process raw imported items and spool them.
+        Raw items are processed one by one as they are read, so only keys of
+        the duplicity check are kept in memory.
+        Args:
+            rawItems -- Iterable of raw imported items.
         Returns:
-            True if the items matches.
+            (imported items, checksum).
         """
-        return itemA is not None and \
-                itemB is not None and \
-                itemA[ImportedItemField.IMPORT_RESULT] == Result.SUCCESS and \
-                itemB[ImportedItemField.IMPORT_RESULT] == Result.SUCCESS and \
-                (
-                    (
-                        self.__matchStrings(itemA[ImportedItemField.AUTHOR], itemB[ImportedItemField.AUTHOR]) and \
-                        self.__matchStrings(itemA[ImportedItemField.TITLE], itemB[ImportedItemField.TITLE]) \
-                    ) or ( \
-                        self.__matchStrings(itemA[ImportedItemField.NUMBER], itemB[ImportedItemField.NUMBER]) \
-                    ) \
-                )
-
-    def __checkDuplicityWithinImport(self, importedItems):
-        """Check whether there are duplicities within the import items."""
-        resultUpdate = {}
-        for i in range(0, len(importedItems) - 1):
-            item = importedItems[i]
-            if item[ImportedItemField.IMPORT_RESULT] == Result.SUCCESS:
-                for j in range(i + 1, len(importedItems)):
-                    otherItem = importedItems[j]
-                    if self.__matchImportedItems(item, otherItem):
-                        self.__logger.info('__checkImportedItemsDuplicity: Item {0} is duplicate of an item {1}.'.format(
-                                json.dumps(otherItem, cls=JSONDecimalEncoder), json.dumps(item, cls=JSONDecimalEncoder)))
-                        resultUpdate[i] = Result.DUPLICATE_ITEM
-                        resultUpdate[j] = Result.DUPLICATE_ITEM
-
-        for index, result in resultUpdate.items():
-            importedItems[index][ImportedItemField.IMPORT_RESULT] = result
-
-
-    def __postProcessImport(self, sessionID, importedItems):
         # 1. Remove previous data (if any).
         self.dropImport(sessionID)
 
-        # 2. Calculate checksum
-        importedItemsChecksum = self.__calculateImportItemsChecksum(importedItems)
+        # 2. Process items, calculate checksum and collect keys for the duplicity check.
+        checksum = ImportedItemChecksum()
+        groups = {}
+        def processItems():
+            for index, item in enumerate(self.__importValidator.process(rawItems)):
+                checksum.update(item)
+                if item[ImportedItemField.IMPORT_RESULT] == Result.SUCCESS:
+                    for key in self.__getImportedItemKeys(item):
+                        groups.setdefault(key, []).append(index)
+                yield item
+        importedItems = self.__dataset.spoolImport(processItems())
+        checksum = checksum.value()
 
         # 3. Check for duplicites
-        self.__checkDuplicityWithinImport(importedItems)
+        duplicates = self.__findDuplicatesWithinImport(groups)
+        if len(duplicates) > 0:
+            importedItems = self.__dataset.updateSpooledImport(
+                    importedItems,
+                    {index: {ImportedItemField.IMPORT_RESULT: Result.DUPLICATE_ITEM} for index in duplicates})
 
         # 4. Update session.
         self.__dataset.updateSessionPairs(sessionID, **{
-                session.Field.IMPORTED_ITEMS: json.dumps(importedItems),
-                session.Field.IMPORTED_CHECKSUM: importedItemsChecksum})
+                session.Field.IMPORT_ID: importedItems.importID,
+                session.Field.IMPORTED_CHECKSUM: checksum})
 
-        return importedItemsChecksum
+        return importedItems, checksum
 
     def isOwnerDefinedInImport(self, importedItems):
         """
@@ -475,26 +538,21 @@ class Model:
             headerRow -- True if the first row is the header
             encoding -- Encoding of the file.
         Returns:
-            imported items, checksum
+            imported items (see import_spool.SpooledImport), checksum
         """
 
         # 1. Import stream.
-        importedItems = []
         textReader = io.TextIOWrapper(buffer=stream, encoding=encoding, errors='replace')
         try:
-            lineIndex = 0
-            done = False
-            csvReader = csv.reader(textReader)
-            for row in csvReader:
-                if not headerRow or lineIndex > 0:
-                    importedItems.append(self.__procesItemImport(self.__mapCSVRowToImport(row)))
-                lineIndex = lineIndex + 1
+            rawItems = (self.__mapCSVRowToImport(row) for row in csv.reader(textReader))
+            if headerRow:
+                next(rawItems, None)
+
+            # 2. Postprocess data.
+            importedItems, importedItemsChecksum = self.__postProcessImport(sessionID, rawItems)
         finally:
             textReader.detach()
 
-        # 2. Postprocess data.
-        importedItemsChecksum = self.__postProcessImport(sessionID, importedItems)
-
         self.__logger.info('importFile: Found {0} item(s) with a checksum "{1}".'.format(
                 len(importedItems), importedItemsChecksum))
 
@@ -518,24 +576,6 @@ class Model:
             i = i + 1
         return mappedRow
 
-    def __procesItemImport(self, rawItemImport):
-        """Proces item import.
-        Returns:
-            Imported item with the result inside.
-        """
-        result, item = self.__dataset.normalizeItemImport(rawItemImport)
-        if result != Result.SUCCESS:
-            self.__logger.error('__importRawItem: Reading a raw item "{0}" failed with a result {1}.'.format(
-                    json.dumps(rawItemImport, cls=JSONDecimalEncoder), result))
-        else:
-            result = self.__checkImportedItemConsistency(item)
-            if result != Result.SUCCESS:
-                self.__logger.error('__importRawItem: Line "{0}" failed consistency check with a result {1}.'.format(
-                        json.dumps(rawItemImport, cls=JSONDecimalEncoder), result))
-
-        item[ImportedItemField.IMPORT_RESULT] = result
-        return item
-
     def __extractTaggedValue(self, line, tags):
         """Extracts tagged value.
         Returns:
@@ -563,9 +603,27 @@ class Model:
         return None, None
 
     def importText(self, sessionID, text):
-        """Import from text."""
+        """Import from text.
+        Returns:
+            imported items (see import_spool.SpooledImport), checksum
+        """
 
         # 1. Import stream.
+        rawItems = self.__readTaggedItems(text)
+
+        # 2. Postprocess data.
+        importedItems, importedItemsChecksum = self.__postProcessImport(sessionID, rawItems)
+
+        self.__logger.info('importText: Found {0} item(s) with a checksum "{1}".'.format(
+                len(importedItems), importedItemsChecksum))
+
+        return importedItems, importedItemsChecksum
+
+    def __readTaggedItems(self, text):
+        """Read raw items from tagged text.
+        Returns:
+            Generator of raw items.
+        """
         firstTag = 'A)'
         tags = {
                 'A)': ImportedItemField.NUMBER,
@@ -574,7 +632,6 @@ class Model:
                 'D)': ImportedItemField.INITIAL_AMOUNT,
                 'E)': ImportedItemField.CHARITY }
 
-        importedItems = []
         rawItem = {}
         textStream = io.StringIO(initial_value=text)
         for line in textStream:
@@ -582,21 +639,14 @@ class Model:
             if tagValue is not None:            
                 if tagField == tags[firstTag]:
                     if len(rawItem) != 0:
-                        importedItems.append(self.__procesItemImport(rawItem))
-                        rawItem.clear()
+                        yield rawItem
+                        rawItem = {}
                 rawItem[tagField] = tagValue
 
         if len(rawItem) != 0:
-            importedItems.append(self.__procesItemImport(rawItem))
-
-        # 2. Postprocess data.
-        importedItemsChecksum = self.__postProcessImport(sessionID, importedItems)
-
-        self.__logger.info('importText: Found {0} item(s) with a checksum "{1}".'.format(
-                len(importedItems), importedItemsChecksum))
-
-        return importedItems, importedItemsChecksum
+            yield rawItem
 
+    @exclusive
     def applyImport(self, sessionID, checksum, defaultOwner):
         """Apply items from an item.
         Items which did not import well are skipped.
@@ -608,15 +658,14 @@ class Model:
             (result, skipped items, renumbered items).
         """
         # 1. Check validity of the input
-        importedChecksum = self.__dataset.getSessionValue(sessionID, session.Field.IMPORTED_CHECKSUM, None)
-        importedItemsRaw = self.__dataset.getSessionValue(sessionID, session.Field.IMPORTED_ITEMS)
-        if importedChecksum is None or importedItemsRaw is None:
+        spooledItems, importedChecksum = self.getImport(sessionID)
+        if spooledItems is None:
             self.__logger.debug('applyImport: There is no import to apply.')
             return Result.NO_IMPORT, [], []
 
         checksumRaw = checksum
         checksum = toInt(checksum)
-        if checksum is None or importedChecksum != str(checksum):
+        if checksum is None or importedChecksum != checksum:
             self.__logger.debug('applyImport: Checksum "{0}" does not match stored checksum "{1}".'.format(checksumRaw, importedChecksum))
             return Result.INVALID_CHECKSUM, [], []
 
@@ -628,10 +677,10 @@ class Model:
 
         importedItems = []
         try:
-            importedItems = json.loads(importedItemsRaw)
+            importedItems = list(spooledItems)
         except ValueError as err:
-            self.__logger.error('applyImport: Imported items [{0}] are corrupted. Decoding failed with an error {1}.'.format(
-                    importedItemsRaw, str(err)))
+            self.__logger.error('applyImport: Imported items {0} are corrupted. Decoding failed with an error {1}.'.format(
+                    spooledItems.importID, str(err)))
             return Result.INPUT_ERROR, [], []
 
         # 2. Add items
@@ -650,65 +699,67 @@ class Model:
         # 2b. Order items by import number in order to prevent renumbers if not required.
         importedItems.sort(key=lambda item: item[ImportedItemField.NUMBER] if item is not None and item[ImportedItemField.NUMBER] is not None else -1)
 
-        # 2c. Add new items which might does not need renumbering
-        for i in range(0, len(importedItems)):
-            item = importedItems[i]
-            if item is not None and item[ImportedItemField.NUMBER] is not None:
-                addResult = self.addNewItem(
-                        sessionID,
-                        owner=item[ImportedItemField.OWNER],
-                        title=item[ImportedItemField.TITLE],
-                        author=item[ImportedItemField.AUTHOR],
-                        medium=item[ImportedItemField.MEDIUM],
-                        amount=item[ImportedItemField.INITIAL_AMOUNT],
-                        charity=item[ImportedItemField.CHARITY],
-                        note=item[ImportedItemField.NOTE],
-                        importNumber=item[ImportedItemField.NUMBER],
-                        requestImportNumberCodeMatch=True)
-                if addResult == Result.SUCCESS:
-                    self.__logger.debug('applyImport: Item {0} has been processed.'.format(
-                            json.dumps(item, cls=JSONDecimalEncoder)))
-                    importedItems[i] = None
-
-        # 2d. Add the rest.
-        for item in importedItems:
-            if item is not None:
-                addResult = self.addNewItem(
-                        sessionID,
-                        owner=item[ImportedItemField.OWNER],
-                        title=item[ImportedItemField.TITLE],
-                        author=item[ImportedItemField.AUTHOR],
-                        medium=item[ImportedItemField.MEDIUM],
-                        amount=item[ImportedItemField.INITIAL_AMOUNT],
-                        charity=item[ImportedItemField.CHARITY],
-                        note=item[ImportedItemField.NOTE],
-                        importNumber=item[ImportedItemField.NUMBER])
-
-                if addResult == Result.DUPLICATE_IMPORT_NUMBER:
-                    addResult = self.__updateImportedItem(
-                        sessionID,
-                        owner=item[ImportedItemField.OWNER],
-                        importNumber=item[ImportedItemField.NUMBER],
-                        title=item[ImportedItemField.TITLE],
-                        author=item[ImportedItemField.AUTHOR],
-                        medium=item[ImportedItemField.MEDIUM],
-                        amount=item[ImportedItemField.INITIAL_AMOUNT],
-                        charity=item[ImportedItemField.CHARITY],
-                        note=item[ImportedItemField.NOTE])
-
-                item[ImportedItemField.IMPORT_RESULT] = addResult
-
-                if item[ImportedItemField.IMPORT_RESULT] in [Result.SUCCESS, Result.NOTHING_TO_UPDATE]:
-                    self.__logger.debug('applyImport: Item {0} has been processed.'.format(
-                            json.dumps(item, cls=JSONDecimalEncoder)))
-                elif item[ImportedItemField.IMPORT_RESULT] == Result.SUCCESS_BUT_IMPORT_RENUMBERED:
-                    self.__logger.debug('applyImport: Item {0} has been processed with renumbering.'.format(
-                            json.dumps(item, cls=JSONDecimalEncoder)))
-                    renumberedItems.append(item)
-                else:
-                    self.__logger.error('applyImport: Importing item {0} failed with an error {1}.'.format(
-                            json.dumps(item, cls=JSONDecimalEncoder), addResult))
-                    skippedItems.append(item)
+        # Items are added as a single batch (rolled back if anything fails unexpectedly).
+        with self.__dataset.batch():
+            # 2c. Add new items which might does not need renumbering
+            for i in range(0, len(importedItems)):
+                item = importedItems[i]
+                if item is not None and item[ImportedItemField.NUMBER] is not None:
+                    addResult = self.addNewItem(
+                            sessionID,
+                            owner=item[ImportedItemField.OWNER],
+                            title=item[ImportedItemField.TITLE],
+                            author=item[ImportedItemField.AUTHOR],
+                            medium=item[ImportedItemField.MEDIUM],
+                            amount=item[ImportedItemField.INITIAL_AMOUNT],
+                            charity=item[ImportedItemField.CHARITY],
+                            note=item[ImportedItemField.NOTE],
+                            importNumber=item[ImportedItemField.NUMBER],
+                            requestImportNumberCodeMatch=True)
+                    if addResult == Result.SUCCESS:
+                        self.__logger.debug('applyImport: Item {0} has been processed.'.format(
+                                json.dumps(item, cls=JSONDecimalEncoder)))
+                        importedItems[i] = None
+
+            # 2d. Add the rest.
+            for item in importedItems:
+                if item is not None:
+                    addResult = self.addNewItem(
+                            sessionID,
+                            owner=item[ImportedItemField.OWNER],
+                            title=item[ImportedItemField.TITLE],
+                            author=item[ImportedItemField.AUTHOR],
+                            medium=item[ImportedItemField.MEDIUM],
+                            amount=item[ImportedItemField.INITIAL_AMOUNT],
+                            charity=item[ImportedItemField.CHARITY],
+                            note=item[ImportedItemField.NOTE],
+                            importNumber=item[ImportedItemField.NUMBER])
+
+                    if addResult == Result.DUPLICATE_IMPORT_NUMBER:
+                        addResult = self.__updateImportedItem(
+                            sessionID,
+                            owner=item[ImportedItemField.OWNER],
+                            importNumber=item[ImportedItemField.NUMBER],
+                            title=item[ImportedItemField.TITLE],
+                            author=item[ImportedItemField.AUTHOR],
+                            medium=item[ImportedItemField.MEDIUM],
+                            amount=item[ImportedItemField.INITIAL_AMOUNT],
+                            charity=item[ImportedItemField.CHARITY],
+                            note=item[ImportedItemField.NOTE])
+
+                    item[ImportedItemField.IMPORT_RESULT] = addResult
+
+                    if item[ImportedItemField.IMPORT_RESULT] in [Result.SUCCESS, Result.NOTHING_TO_UPDATE]:
+                        self.__logger.debug('applyImport: Item {0} has been processed.'.format(
+                                json.dumps(item, cls=JSONDecimalEncoder)))
+                    elif item[ImportedItemField.IMPORT_RESULT] == Result.SUCCESS_BUT_IMPORT_RENUMBERED:
+                        self.__logger.debug('applyImport: Item {0} has been processed with renumbering.'.format(
+                                json.dumps(item, cls=JSONDecimalEncoder)))
+                        renumberedItems.append(item)
+                    else:
+                        self.__logger.error('applyImport: Importing item {0} failed with an error {1}.'.format(
+                                json.dumps(item, cls=JSONDecimalEncoder), addResult))
+                        skippedItems.append(item)
 
         self.__logger.info('applyImport: Added {0} item(s). Skipped {1} item(s).'.format(
                 len(self.getAdded(sessionID)), len(skippedItems)))
@@ -824,6 +875,7 @@ class Model:
 
         return updateResult
 
+    @exclusive
     def updateItem(self, itemCode, owner, title, author, medium, state, initialAmount, charity, amount, buyer, note):
         # 1. Get the original item.
         item = self.getItem(itemCode)
@@ -881,11 +933,13 @@ class Model:
             return Result.NOTHING_TO_UPDATE
         elif self.__dataset.updateItem(itemCode, **itemDiff):
             self.__logger.info('updateItem: Item "{0}" has been updated.'.format(itemCode))
+            self.__invalidateAuctionOrder()
             return Result.SUCCESS
         else:
             self.__logger.error('updateItem: Updating an item "{0}" has failed.'.format(itemCode))
             return Result.ERROR;
 
+    @exclusive
     def updateItemImage(self, itemCode, imageBase64):
         item = self.getItem(itemCode)
         if item is None:
@@ -919,90 +973,53 @@ class Model:
             return self.__dataset.getItemJpgImage(itemCode)
 
     def __updateSortCode(self, items):
-        """Calculate integer (SORT_CODE) which can be used to sort by code of an item."""
+        """Calculate integer (SORT_CODE) which can be used to sort by code of an item.
+        Items of the dataset include the sort code already.
+        """
         if items is not None and len(items) > 0:
             for item in items:
-                sortCode = 0
-                code = item.get(ItemField.CODE, '0')
-                if len(code) > 0:
-                    if code[0].isalpha():
-                        sortCode = (ord(code[0]) * 10000) + int(code[1:])
-                    else:
-                        sortCode = int(code)
-                item[ItemField.SORT_CODE] = sortCode
+                if ItemField.SORT_CODE not in item:
+                    item[ItemField.SORT_CODE] = calculateSortCode(item.get(ItemField.CODE, '0'))
         return items
 
-    def __calculateAuctionItemIndex(self, items, idealIndex, suppressedAuthor):
-        """Calculate index of item suitable for auction around supplied index.
-        Args:
-            items: Items ordered by AMOUNT ascending.
-        Returns:
-            Index to the items or None.
-        """
-        if len(items) < 1:
-            return None
-
-        axisLenLeft = idealIndex + 1
-        axisLenRight = len(items) - idealIndex + 1
-
-        bestScoreIndex = None
-        bestScore = 0
-        for index in range(len(items)):
-            item = items[index]
-            if index > idealIndex:
-                x = (index - idealIndex) / axisLenRight
-            else:
-                x = (idealIndex - index) / axisLenLeft
-        
-            score = 0.5 * math.cos(x)
-            if suppressedAuthor is not None and item[ItemField.AUTHOR] == suppressedAuthor:
-                score = score * score
-
-            if score > bestScore:
-                bestScore = score
-                bestScoreIndex = index
-
-        return bestScoreIndex    
-
     def __updateAuctionSortCode(self, items):
-        """Calculate integer (AUCTION_SORT_CODE) which can be used to sort by code of an item."""
+        """Calculate integer (AUCTION_SORT_CODE) which can be used to sort by code of an item.
+        The order is cached and calculated again only if an item has entered the auction
+        or an item in the auction has been changed. Items leaving the auction do not change
+        the order of the remaining items.
+        """
         if items is not None and len(items) > 0:
-            index = 0
-            for item in items:
-                item[ItemField.INDEX] = index
-                item[ItemField.AUCTION_SORT_CODE] = 0
-                index = index + 1
-
-            itemsToProcess = sorted(items, key=lambda item: item.get(ItemField.AMOUNT, 0))
-
-            # Sequence of indicies at which an item is to be picked.
-            indexCoefs = (0, 0.3, 0.6)
-            indexCoefsIndex = 0
-            lastAuthor = None
-            auctionSortCode = 1
-            while len(itemsToProcess) > 0:
-                idealIndex = int(indexCoefs[indexCoefsIndex] * len(itemsToProcess))
-                indexCoefsIndex = (indexCoefsIndex + 1) % len(indexCoefs)
-
-                auctionItemIndex = self.__calculateAuctionItemIndex(itemsToProcess, idealIndex, lastAuthor)
-                if auctionItemIndex is None:
-                    auctionItemIndex = 0
-
-                item = itemsToProcess[auctionItemIndex]
-                items[item[ItemField.INDEX]][ItemField.AUCTION_SORT_CODE] = auctionSortCode
-                auctionSortCode = auctionSortCode + 1
-                lastAuthor = item[ItemField.AUTHOR]
-                del itemsToProcess[auctionItemIndex]
+            auctionSortCodes = self.__auctionSortCodes
+            if auctionSortCodes is None or any(item[ItemField.CODE] not in auctionSortCodes for item in items):
+                itemIndexes = sorted(range(len(items)), key=lambda index: items[index].get(ItemField.AMOUNT, 0))
+                auctionOrder = calculateAuctionOrder([items[index][ItemField.AUTHOR] for index in itemIndexes])
+                auctionSortCodes = {}
+                for auctionSortCode, position in enumerate(auctionOrder, start=1):
+                    auctionSortCodes[items[itemIndexes[position]][ItemField.CODE]] = auctionSortCode
+                self.__auctionSortCodes = auctionSortCodes
 
             for item in items:
-                del item[ItemField.INDEX]
+                item[ItemField.AUCTION_SORT_CODE] = auctionSortCodes[item[ItemField.CODE]]
 
         return items
 
+    def __invalidateAuctionOrder(self):
+        """Calculate order of the auction again on the next request."""
+        self.__auctionSortCodes = None
+
+    def __removeFromAuctionOrder(self, itemCodes):
+        """Remove items which have left the auction from the cached order."""
+        auctionSortCodes = self.__auctionSortCodes
+        if auctionSortCodes is not None:
+            for itemCode in itemCodes:
+                auctionSortCodes.pop(itemCode, None)
+
     def __updatePermissions(self, items):
-        """Updare permissions for each item."""
+        """Updare permissions for each item (items of the dataset include permissions already)."""
         if items is not None and len(items) > 0:
             for item in items: 
+                if ItemField.PRINT_ALLOWED in item:
+                    continue
                 printDeleteAllowed = item[ItemField.STATE] in [
                         ItemState.OPEN, ItemState.ON_SHOW, ItemState.ON_SALE]
                 item[ItemField.PRINT_ALLOWED] = printDeleteAllowed
@@ -1152,11 +1169,13 @@ class Model:
                 self.__logger.info('getItem: Item "{0}" not found.'.format(itemCode))
                 return None
 
+    @exclusive
     def deleteItems(self, itemCodes):
         """Delete item codes.
         Returns:
             Number of deleted items.
         """
+        self.__removeFromAuctionOrder(itemCodes)
         return self.__dataset.items().delete('Code in [{0}]'.format(toQuotedStr(itemCodes)))
 
     def __validateSaleInput(self, itemCode, item, amount, buyer):
@@ -1186,6 +1205,7 @@ class Model:
         else:
             return Result.SUCCESS
         
+    @exclusive
     def closeItemAsNotSold(self, itemCode):
         """Close item as sold.
         Returns:
@@ -1212,6 +1232,7 @@ class Model:
                 self.__logger.info('closeItemAsNotSold: Item "{0}" set as not sold.'.format(itemCode))
                 return Result.SUCCESS
                 
+    @exclusive
     def closeItemAsSold(self, itemCode, amount, buyer):
         item = self.getItem(itemCode)
 
@@ -1235,8 +1256,10 @@ class Model:
                 self.__logger.info(
                         'closeItemAsSold: Item "{0}" set as sold to {1} for {2}.'.format(
                             itemCode, buyer, amount))
+                self.__dataset.persist()
                 return Result.SUCCESS
         
+    @exclusive
     def closeItemIntoAuction(self, itemCode, amount, buyer, imageFile):
         item = self.getItem(itemCode)
 
@@ -1270,6 +1293,7 @@ class Model:
         else:
             self.__logger.info('closeItemIntoAuction: Item ''%(code)s'' moved to auction with amount %(amount)s (the last buyer %(buyer)s).'
                 % { 'code': itemCode, 'buyer': buyer, 'amount': amount })
+            self.__invalidateAuctionOrder()
             return Result.SUCCESS
 
     def __convertAmountToCurrencies(self, amount, currencyInfoList):
@@ -1307,14 +1331,50 @@ class Model:
         """
         return self.__currency
      
-    def getPotentialCharityAmount(self):
-        soldItems = self.getAllPontentiallySoldItems()
-        totalCharityAmount = Decimal(0)
-        for item in soldItems:
+    def __getItemTotalsContribution(self, item):
+        """Get contribution of an item to the running totals (see getItemTotals)."""
+        totals = {item[ItemField.STATE]: 1}
+        if item[ItemField.STATE] in self.POTENTIALLY_SOLD_STATES \
+                and (item[ItemField.AMOUNT] or 0) > 0 and (item[ItemField.CHARITY] or 0) >= 0:
             netAmount, netCharityAmount = self.getItemPotentialNetAmount(item)
-            totalCharityAmount = totalCharityAmount + netCharityAmount
-        return totalCharityAmount
+            totals[TotalsField.POTENTIAL_CHARITY_AMOUNT] = netCharityAmount
+            totals[TotalsField.POTENTIAL_GROSS_AMOUNT] = netAmount + netCharityAmount
+        return totals
+
+    def getItemTotals(self, rebuild=False):
+        """Get running totals of items. Totals are updated whenever an item changes.
+        Args:
+            rebuild: True to calculate the totals from scratch.
+        Returns:
+            Dictionary with potential charity amount, potential gross amount (see
+            getAllPontentiallySoldItems) and a dictionary state -> number of items.
+        """
+        aggregate = self.__dataset.getItemAggregate(self.__itemTotals, rebuild)
+        return {
+                TotalsField.POTENTIAL_CHARITY_AMOUNT: Decimal(aggregate.get(TotalsField.POTENTIAL_CHARITY_AMOUNT, 0)),
+                TotalsField.POTENTIAL_GROSS_AMOUNT: Decimal(aggregate.get(TotalsField.POTENTIAL_GROSS_AMOUNT, 0)),
+                TotalsField.STATE_COUNTS: {
+                        state: aggregate[state] for state in ItemState.ALL if aggregate.get(state, 0) > 0}}
+
+    @exclusive
+    def verifyItemTotals(self):
+        """Check running totals of items against totals calculated from scratch.
+        The running totals are replaced by the calculated ones.
+        Returns:
+            True if the running totals were correct.
+        """
+        itemTotals = self.getItemTotals()
+        rebuiltTotals = self.getItemTotals(rebuild=True)
+        if itemTotals != rebuiltTotals:
+            self.__logger.error('verifyItemTotals: Running totals {0} differ from calculated totals {1}.'.format(
+                    itemTotals, rebuiltTotals))
+            return False
+        return True
+
+    def getPotentialCharityAmount(self):
+        return self.getItemTotals()[TotalsField.POTENTIAL_CHARITY_AMOUNT]
         
+    @shared
     def getItemInAuction(self):
         itemInAuction = self.__dataset.getItem(self.__dataset.getGlobalValue('ItemCodeInAuction'))
         if itemInAuction is not None and itemInAuction[ItemField.STATE] != ItemState.IN_AUCTION:
@@ -1325,6 +1385,7 @@ class Model:
         else:
             return self.__updateItemAmountCurrency([itemInAuction])[0]
 
+    @exclusive
     def sendItemToAuction(self, itemCode):
         item = self.__dataset.getItem(itemCode)
         if item is None:
@@ -1348,6 +1409,7 @@ class Model:
 
         return itemToAuction
 
+    @exclusive
     def updateItemInAuction(self, newAmount):
         item = self.getItemInAuction()
         if item is None:
@@ -1361,6 +1423,7 @@ class Model:
             else:
                 return True
     
+    @exclusive
     def sellItemInAuction(self, newBuyer):
         newBuyerInt = toInt(newBuyer)
         if newBuyerInt is None:
@@ -1381,9 +1444,12 @@ class Model:
                     return False
                 else:
                     self.__logger.info('sellItemInAuction: Item "{0}" had been sold to buyer {1} for {2}'.format(item[ItemField.CODE], item[ItemField.BUYER], item[ItemField.AMOUNT]))
+                    self.__removeFromAuctionOrder([item[ItemField.CODE]])
                     self.__dataset.updateGlobalPairs(ItemCodeInAuction=None)
+                    self.__dataset.persist()
                     return True
         
+    @exclusive
     def sellItemInAuctionNoChange(self):
         item = self.getItemInAuction()
         if item is None:
@@ -1397,9 +1463,11 @@ class Model:
                 return False
             else:
                 self.__logger.info('sellItemInAuctionNoChange: Item "{0}" had been sold to buyer {1} for {2}'.format(item[ItemField.CODE], item[ItemField.BUYER], item[ItemField.AMOUNT]))
+                self.__removeFromAuctionOrder([item[ItemField.CODE]])
                 self.__dataset.updateGlobalPairs(ItemCodeInAuction=None)
                 return True
 
+    @exclusive
     def clearAuction(self):
         item = self.getItemInAuction()
         if item is not None:
@@ -1409,71 +1477,116 @@ class Model:
 
         self.__dataset.updateGlobalPairs(ItemCodeInAuction=None)
 
+    def waitForAuctionChange(self, version, timeout):
+        """Wait until the status of the auction changes: the item in auction, its amount
+        or totals of items (e.g. after a sale at the desk). Any change of data shown to
+        users is reported (see Dataset.waitForChange).
+        Args:
+            version: Version of the auction known by the caller (None to return immediately).
+            timeout: Maximal time of waiting in seconds.
+        Returns:
+            Current version of the auction.
+        """
+        return self.__dataset.waitForChange(version, timeout)
+
+    @shared
     def getBadgeReconciliationSummary(self, badge):
+        """Get items and amounts to be reconciled for a badge.
+        The summary is cached for SUMMARY_CACHE_SECONDS as long as no item changes, so that
+        steps of a reconciliation can check the summary cheaply.
+        Returns:
+            Summary (see SummaryField) or None if the badge is invalid.
+        """
         badgeNum = toInt(badge)
         if badgeNum is None:
             self.__logger.error('getBadgeReconciliationSummary: Badge "{0}" is invalid'.format(badge))
             return None
+
+        version = self.__dataset.itemMutations()
+        now = time.monotonic()
+        cached = self.__badgeSummaries.get(badgeNum)
+        if cached is not None and cached[0] == version and now - cached[1] < self.SUMMARY_CACHE_SECONDS:
+            summary = cached[2]
         else:
-            availableUnsoldItems = self.__updateSortCode(self.__dataset.getItems(
-                    'Owner == "{0}" and State in [{1}]'.format(
-                        badgeNum, toQuotedStr([ItemState.ON_SHOW, ItemState.NOT_SOLD]))))
-
-            availableBoughtItems = self.__updateSortCode(self.__dataset.getItems(
-                    'Buyer == "{0}" and State == "{1}"'.format(
-                        badge, ItemState.SOLD)))
-            boughtItemsAmount = Decimal(0)
-            for item in availableBoughtItems:
-                boughtItemsAmount = boughtItemsAmount + item[ItemField.AMOUNT]
+            summary = self.__calculateBadgeReconciliationSummary(badgeNum)
+            self.__badgeSummaries = {
+                    cachedBadge: cachedValue for cachedBadge, cachedValue in self.__badgeSummaries.items()
+                    if cachedValue[0] == version and now - cachedValue[1] < self.SUMMARY_CACHE_SECONDS}
+            self.__badgeSummaries[badgeNum] = (version, now, summary)
 
-            deliveredSoldItems = self.__updateNetAmount(self.__updateSortCode(self.__dataset.getItems(
-                    'Owner == "{0}" and State == "{1}"'.format(
-                        badge, ItemState.DELIVERED))))
-            charityDeduction = Decimal(0)
-            netSaleAmount = Decimal(0)
-            for item in deliveredSoldItems:
-                itemNetSaleAmount, itemCharityAmount = self.getItemNetAmount(item)
-                netSaleAmount = netSaleAmount + itemNetSaleAmount
-                charityDeduction = charityDeduction + itemCharityAmount
-
-            pendingSoldItems = self.__updateNetAmount(self.__updateSortCode(self.__dataset.getItems(
-                    'Owner == "{0}" and State == "{1}"'.format(
-                        badge, ItemState.SOLD))))
-
-            return {
-                    SummaryField.AVAILABLE_UNSOLD_ITEMS: availableUnsoldItems,
-                    SummaryField.AVAILABLE_BOUGHT_ITEMS: availableBoughtItems,
-                    SummaryField.DELIVERED_SOLD_ITEMS: deliveredSoldItems,
-                    SummaryField.PENDING_SOLD_ITEMS: pendingSoldItems,
-                    SummaryField.GROSS_SALE_AMOUNT: netSaleAmount + charityDeduction,
-                    SummaryField.CHARITY_DEDUCTION: charityDeduction,
-                    SummaryField.BOUGHT_ITEMS_AMOUNT: boughtItemsAmount,
-                    SummaryField.TOTAL_DUE_AMOUNT: boughtItemsAmount - netSaleAmount}
+        # callers may modify the summary
+        return {
+                field: [item.copy() for item in value] if isinstance(value, list) else value
+                for field, value in summary.items()}
+
+    def __calculateBadgeReconciliationSummary(self, badgeNum):
+        """Calculate a summary out of items owned or bought by the badge in a single pass."""
+        items = self.__dataset.getItems((ItemField.OWNER, '==', str(badgeNum)))
+        items.extend(item for item in self.__dataset.getItems((ItemField.BUYER, '==', str(badgeNum)))
+                if item[ItemField.OWNER] != badgeNum)
+        self.__updateSortCode(items)
+
+        availableUnsoldItems = []
+        availableBoughtItems = []
+        deliveredSoldItems = []
+        pendingSoldItems = []
+        boughtItemsAmount = Decimal(0)
+        charityDeduction = Decimal(0)
+        netSaleAmount = Decimal(0)
+        for item in items:
+            state = item[ItemField.STATE]
+            if item[ItemField.BUYER] == badgeNum and state == ItemState.SOLD:
+                availableBoughtItems.append(item)
+                boughtItemsAmount = boughtItemsAmount + item[ItemField.AMOUNT]
+            if item[ItemField.OWNER] == badgeNum:
+                if state in [ItemState.ON_SHOW, ItemState.NOT_SOLD]:
+                    availableUnsoldItems.append(item)
+                elif state == ItemState.DELIVERED:
+                    deliveredSoldItems.append(item)
+                    itemNetSaleAmount, itemCharityAmount = self.getItemNetAmount(item)
+                    netSaleAmount = netSaleAmount + itemNetSaleAmount
+                    charityDeduction = charityDeduction + itemCharityAmount
+                elif state == ItemState.SOLD:
+                    pendingSoldItems.append(item)
+        self.__updateNetAmount(deliveredSoldItems)
+        self.__updateNetAmount(pendingSoldItems)
 
+        return {
+                SummaryField.AVAILABLE_UNSOLD_ITEMS: availableUnsoldItems,
+                SummaryField.AVAILABLE_BOUGHT_ITEMS: availableBoughtItems,
+                SummaryField.DELIVERED_SOLD_ITEMS: deliveredSoldItems,
+                SummaryField.PENDING_SOLD_ITEMS: pendingSoldItems,
+                SummaryField.GROSS_SALE_AMOUNT: netSaleAmount + charityDeduction,
+                SummaryField.CHARITY_DEDUCTION: charityDeduction,
+                SummaryField.BOUGHT_ITEMS_AMOUNT: boughtItemsAmount,
+                SummaryField.TOTAL_DUE_AMOUNT: boughtItemsAmount - netSaleAmount}
+
+    @exclusive
     def reconciliateBadge(self, badge):
         badgeNum = toInt(badge)
         if badgeNum is None:
             self.__logger.error('reconciliateBadge: Badge "{0}" is invalid'.format(badge))
             return False
         else:
-            # delivered items first
-            self.__dataset.updateMultipleItems(
-                    'Owner == "{0}" and State == "{1}"'.format(
-                        badge, ItemState.DELIVERED),
-                    **{ItemField.STATE: ItemState.FINISHED})
-
-            # bought items second
-            self.__dataset.updateMultipleItems(
-                    'Buyer == "{0}" and State == "{1}"'.format(
-                        badge, ItemState.SOLD),
-                    **{ItemField.STATE: ItemState.DELIVERED})
-
-            # unsold items third
-            self.__dataset.updateMultipleItems(
-                    'Owner == "{0}" and State in [{1}]'.format(
-                        badgeNum, toQuotedStr([ItemState.ON_SHOW, ItemState.NOT_SOLD])),
-                    **{ItemField.STATE: ItemState.FINISHED})
-
+            # the batch is persisted as a whole
+            with self.__dataset.batch():
+                # delivered items first
+                self.__dataset.updateMultipleItems(
+                        'Owner == "{0}" and State == "{1}"'.format(
+                            badge, ItemState.DELIVERED),
+                        **{ItemField.STATE: ItemState.FINISHED})
+
+                # bought items second
+                self.__dataset.updateMultipleItems(
+                        'Buyer == "{0}" and State == "{1}"'.format(
+                            badge, ItemState.SOLD),
+                        **{ItemField.STATE: ItemState.DELIVERED})
+
+                # unsold items third
+                self.__dataset.updateMultipleItems(
+                        'Owner == "{0}" and State in [{1}]'.format(
+                            badgeNum, toQuotedStr([ItemState.ON_SHOW, ItemState.NOT_SOLD])),
+                        **{ItemField.STATE: ItemState.FINISHED})
             return True
 
     def __getAddActorSummary(self, badge, dict):
@@ -1535,6 +1648,7 @@ class Model:
         else:
             return Result.SUCCESS
 
+    @exclusive
     def updateItemImage(self, itemCode, imageFile):
         item = self.getItem(itemCode)
         if item is None:
@@ -1552,6 +1666,7 @@ class Model:
 
         return Result.SUCCESS
 
+    @exclusive
     def importAttendeeCSVFile(self, sessionID, stream, headerRow=True, encoding='utf-8'):
         """Import attendee from a CSV file.
         Args:
@@ -0,0 +1,48 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import threading
+import time
+
+class ChangeNotifier:
+    """Version of a state which is increased by each change of the state.
+    Threads can wait until the state changes (e.g. to answer a long poll).
+    """
+    def __init__(self):
+        self.__condition = threading.Condition()
+        # Versions are unique across restarts of the application
+        self.__version = int(time.time() * 1000)
+
+    def version(self):
+        return self.__version
+
+    def notify(self):
+        """Increase the version and wake up waiting threads."""
+        with self.__condition:
+            self.__version = self.__version + 1
+            self.__condition.notify_all()
+
+    def wait(self, version, timeout):
+        """Wait until the version differs from a given one.
+        Args:
+            version: Version known by the caller (None to return immediately).
+            timeout: Maximal time of waiting in seconds.
+        Returns:
+            Current version.
+        """
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__version != version, timeout)
+            return self.__version
@@ -0,0 +1,132 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import threading
+import time
+
+class PersistencePolicy:
+    IMMEDIATE = 'immediate'
+    """Persist after each request."""
+    INTERVAL = 'interval'
+    """Persist changes every interval."""
+    MUTATIONS = 'mutations'
+    """Persist when a given number of changes has been made."""
+    IDLE = 'idle'
+    """Persist when there has been no request for an interval."""
+
+    ALL = [IMMEDIATE, INTERVAL, MUTATIONS, IDLE]
+
+class PersistenceScheduler:
+    """Decide when a dataset is persisted.
+    Except of the policy IMMEDIATE, changed tables are saved by a background
+    thread. Operations which must be durable right away should call flush.
+    """
+    def __init__(self, logger, dataset, policy=PersistencePolicy.IMMEDIATE, interval=1000, mutations=50):
+        """Create a scheduler.
+        Args:
+            dataset: Dataset (or any object with methods persist, changed and mutations).
+            policy: Persistence policy (see PersistencePolicy).
+            interval: Interval in ms of the policy INTERVAL and quiet period of the policy IDLE.
+            mutations: Number of changes after which the policy MUTATIONS persists.
+        """
+        if policy not in PersistencePolicy.ALL:
+            raise ValueError('Unknown persistence policy "{0}"'.format(policy))
+        self.__logger = logger
+        self.__dataset = dataset
+        self.__policy = policy
+        self.__interval = max(interval, 1) / 1000.0
+        self.__mutations = max(mutations, 1)
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__stopping = False
+        self.__lastActivity = time.monotonic()
+        self.__lastFlush = time.monotonic()
+        self.__flushedMutations = dataset.mutations()
+
+    def policy(self):
+        return self.__policy
+
+    def start(self):
+        """Start the background thread (not used by the policy IMMEDIATE)."""
+        if self.__policy != PersistencePolicy.IMMEDIATE and self.__thread is None:
+            self.__stopping = False
+            self.__thread = threading.Thread(target=self.__run, name='PersistenceScheduler', daemon=True)
+            self.__thread.start()
+            self.__logger.info('start: Persisting with policy "{0}".'.format(self.__policy))
+
+    def stop(self):
+        """Stop the background thread and persist pending changes."""
+        thread = self.__thread
+        if thread is not None:
+            with self.__condition:
+                self.__stopping = True
+                self.__condition.notify_all()
+            thread.join()
+            self.__thread = None
+        self.flush()
+
+    def notify(self):
+        """Notify the scheduler that a request has been processed."""
+        if self.__policy == PersistencePolicy.IMMEDIATE or self.__thread is None:
+            if self.__policy == PersistencePolicy.IMMEDIATE:
+                self.flush()
+            return
+        with self.__condition:
+            self.__lastActivity = time.monotonic()
+            if self.__policy == PersistencePolicy.MUTATIONS:
+                self.__condition.notify_all()
+
+    def flush(self):
+        """Persist all changed tables now."""
+        self.__markFlushed()
+        self.__dataset.persist()
+
+    def __markFlushed(self):
+        with self.__condition:
+            self.__lastFlush = time.monotonic()
+            self.__flushedMutations = self.__dataset.mutations()
+
+    def __due(self):
+        """Check whether the dataset should be persisted.
+        Returns:
+            Pair (True if due, seconds to wait before the next check).
+        """
+        now = time.monotonic()
+        if self.__policy == PersistencePolicy.INTERVAL:
+            wait = self.__lastFlush + self.__interval - now
+            return wait <= 0, max(wait, 0) or self.__interval
+        elif self.__policy == PersistencePolicy.IDLE:
+            wait = self.__lastActivity + self.__interval - now
+            return wait <= 0 and self.__lastActivity > self.__lastFlush, max(wait, 0) or self.__interval
+        else:
+            return self.__dataset.mutations() - self.__flushedMutations >= self.__mutations, None
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                if self.__stopping:
+                    return
+                due, wait = self.__due()
+                if not due:
+                    self.__condition.wait(wait)
+                    continue
+            try:
+                if self.__dataset.changed():
+                    self.flush()
+                else:
+                    self.__markFlushed()
+            except Exception:
+                self.__logger.exception('run: Persisting failed.')
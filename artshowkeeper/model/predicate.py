@@ -0,0 +1,171 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import ast
+import operator
+from functools import lru_cache
+
+OPERATORS = {
+        '==': operator.eq,
+        '!=': operator.ne,
+        '<': operator.lt,
+        '<=': operator.le,
+        '>': operator.gt,
+        '>=': operator.ge,
+        'in': lambda value, values: value in values,
+        'not in': lambda value, values: value not in values,
+        'is': operator.is_,
+        'is not': operator.is_not }
+
+__AST_OPERATORS = {
+        ast.Eq: '==',
+        ast.NotEq: '!=',
+        ast.Lt: '<',
+        ast.LtE: '<=',
+        ast.Gt: '>',
+        ast.GtE: '>=',
+        ast.In: 'in',
+        ast.NotIn: 'not in',
+        ast.Is: 'is',
+        ast.IsNot: 'is not' }
+
+CACHE_SIZE = 4096
+
+class Predicate:
+    """Row predicate which is compiled once and evaluated as a callable.
+    Attributes:
+        expression -- Source of the predicate (string or terms).
+        terms -- Tuple of terms (column, operator, value) which are all required
+            to be true or None if the predicate cannot be expressed by terms.
+    """
+    def __init__(self, expression, terms, evaluate):
+        self.expression = expression
+        self.terms = terms
+        self.__evaluate = evaluate
+
+    def __call__(self, row):
+        return self.__evaluate(row)
+
+    def __repr__(self):
+        return str(self.expression)
+
+def __getColumn(row, column):
+    try:
+        return row[column]
+    except KeyError:
+        raise NameError('name \'{0}\' is not defined'.format(column))
+
+def __normalizeValue(operatorName, value):
+    """Make value of a term hashable (lists are converted to frozen sets if possible)."""
+    if operatorName in ['in', 'not in'] and isinstance(value, (list, tuple, set, frozenset)):
+        try:
+            return frozenset(value)
+        except TypeError:
+            return tuple(value)
+    else:
+        return value
+
+def __normalizeTerms(terms):
+    """Normalize structured predicate to a tuple of terms.
+    Returns:
+        Tuple of terms or None if the input is not a structured predicate.
+    """
+    if isinstance(terms, tuple) and len(terms) == 3 and isinstance(terms[0], str) and terms[1] in OPERATORS:
+        terms = [terms]
+    if not isinstance(terms, (list, tuple)) or len(terms) == 0:
+        return None
+
+    normalizedTerms = []
+    for term in terms:
+        if not isinstance(term, (list, tuple)) or len(term) != 3 or term[1] not in OPERATORS:
+            return None
+        column, operatorName, value = term
+        normalizedTerms.append((str(column), operatorName, __normalizeValue(operatorName, value)))
+    return tuple(normalizedTerms)
+
+def __buildEvaluator(terms):
+    """Build a callable which evaluates all terms against a row."""
+    tests = [(column, OPERATORS[operatorName], value) for column, operatorName, value in terms]
+    if len(tests) == 1:
+        column, test, value = tests[0]
+        return lambda row: test(__getColumn(row, column), value)
+    else:
+        def evaluate(row):
+            for column, test, value in tests:
+                if not test(__getColumn(row, column), value):
+                    return False
+            return True
+        return evaluate
+
+def __extractTerms(node, terms):
+    """Extract terms out of an expression tree.
+    Returns:
+        True if the whole tree has been expressed by terms.
+    """
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+        return all(__extractTerms(value, terms) for value in node.values)
+    elif isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.left, ast.Name):
+        operatorName = __AST_OPERATORS.get(type(node.ops[0]), None)
+        if operatorName is None:
+            return False
+        try:
+            value = ast.literal_eval(node.comparators[0])
+        except ValueError:
+            return False
+        terms.append((node.left.id, operatorName, __normalizeValue(operatorName, value)))
+        return True
+    else:
+        return False
+
+@lru_cache(maxsize=CACHE_SIZE)
+def __compileExpression(expression):
+    tree = ast.parse(expression.strip(), mode='eval')
+    terms = []
+    if __extractTerms(tree.body, terms):
+        return Predicate(expression, tuple(terms), __buildEvaluator(terms))
+    else:
+        code = compile(tree, '<expression>', 'eval')
+        return Predicate(expression, None, lambda row: eval(code, {}, row))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def __compileTerms(terms):
+    return Predicate(terms, terms, __buildEvaluator(terms))
+
+def compilePredicate(expression):
+    """Compile an expression to a predicate.
+    Args:
+        expression -- Python expression (e.g. 'Code == "A2" and Title is None'),
+            term (column, operator, value) (e.g. ('Code', '==', 'A2')),
+            list of terms which all have to be true,
+            Predicate or None.
+    Returns:
+        Predicate or None if any row qualifies.
+    Raises:
+        ValueError if expression is not supported.
+    """
+    if expression is None or isinstance(expression, Predicate):
+        return expression
+    elif isinstance(expression, str):
+        return __compileExpression(expression)
+    else:
+        terms = __normalizeTerms(expression)
+        if terms is None:
+            raise ValueError('Unsupported predicate "{0}"'.format(expression))
+        try:
+            return __compileTerms(terms)
+        except TypeError:
+            # Values are not hashable and the predicate cannot be cached.
+            return Predicate(terms, terms, __buildEvaluator(terms))
@@ -0,0 +1,114 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import io
+import threading
+from multiprocessing import reduction
+from multiprocessing.managers import BaseManager
+from werkzeug.datastructures import FileStorage
+
+def reduceFileStorage(fileStorage):
+    """Pass an uploaded file to another process together with its content."""
+    position = fileStorage.stream.tell()
+    content = fileStorage.stream.read()
+    fileStorage.stream.seek(position)
+    return FileStorage, (
+            io.BytesIO(content), fileStorage.filename, fileStorage.name,
+            fileStorage.content_type, None, fileStorage.headers)
+
+reduction.register(FileStorage, reduceFileStorage)
+
+class ModelServer:
+    """Server of a model for web workers running in other processes.
+    The process owning the server owns the dataset. Each call of a model method
+    runs all its dataset operations in the owning process within one round trip.
+    """
+    def __init__(self, model, scheduler, host='127.0.0.1', port=0, authkey=None):
+        """Create a server.
+        Args:
+            model: Model.
+            scheduler: Persistence scheduler of the dataset of the model.
+            host: Host to listen on.
+            port: Port (0 to pick a free one).
+            authkey: Key which clients have to know (by default the key of the current process
+                which is inherited by processes started by the multiprocessing module).
+        """
+        # A manager class per server keeps registrations of servers apart
+        class ModelServerManager(BaseManager):
+            pass
+        ModelServerManager.register('model', callable=lambda: model, method_to_typeid={'getCurrency': 'currency'})
+        ModelServerManager.register('currency')
+        ModelServerManager.register('scheduler', callable=lambda: scheduler)
+        self.__server = ModelServerManager(address=(host, port), authkey=authkey).get_server()
+        self.__thread = None
+
+    def address(self):
+        """Get address of the server in a form accepted by connectModel."""
+        return '{0}:{1}'.format(*self.__server.address)
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is not None:
+            self.__server.stop_event.set()
+            self.__thread.join()
+            self.__thread = None
+
+class ModelClientManager(BaseManager):
+    pass
+
+ModelClientManager.register('model')
+ModelClientManager.register('currency', create_method=False)
+ModelClientManager.register('scheduler')
+
+class RemoteModel:
+    """Model served by a ModelServer in another process.
+    Arguments which cannot be passed to the other process as they are (streams of
+    uploaded files) are read first.
+    """
+    def __init__(self, proxy):
+        self.__proxy = proxy
+        self.__currency = None
+
+    def __getattr__(self, name):
+        return getattr(self.__proxy, name)
+
+    def getCurrency(self):
+        # Creating a proxy costs extra connections to the server
+        if self.__currency is None:
+            self.__currency = self.__proxy.getCurrency()
+        return self.__currency
+
+    def importCSVFile(self, sessionID, stream, *args, **kwargs):
+        return self.__proxy.importCSVFile(sessionID, io.BytesIO(stream.read()), *args, **kwargs)
+
+    def importAttendeeCSVFile(self, sessionID, stream, *args, **kwargs):
+        return self.__proxy.importAttendeeCSVFile(sessionID, io.BytesIO(stream.read()), *args, **kwargs)
+
+def connectModel(address, authkey=None):
+    """Connect to a model served by a ModelServer.
+    Args:
+        address: Address of the server (see ModelServer.address).
+        authkey: Key of the server (by default the key of the current process).
+    Returns:
+        Pair (model, scheduler).
+    """
+    host, port = address.rsplit(':', 1)
+    manager = ModelClientManager(address=(host, int(port)), authkey=authkey)
+    manager.connect()
+    return RemoteModel(manager.model()), manager.scheduler()
@@ -0,0 +1,108 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import functools
+import threading
+from contextlib import contextmanager
+
+class ReadWriteLock:
+    """Lock which lets many threads read at once while writes are exclusive.
+    Writers are preferred: new readers wait while a writer is waiting. Both locks
+    are reentrant and the writer may read. A reader cannot become a writer.
+    """
+    def __init__(self):
+        self.__condition = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__writer = None
+        self.__writerDepth = 0
+        self.__waitingWriters = 0
+        self.__local = threading.local()
+
+    def __readDepth(self):
+        return getattr(self.__local, 'readDepth', 0)
+
+    def acquireRead(self):
+        with self.__condition:
+            readDepth = self.__readDepth()
+            if readDepth == 0 and self.__writer != threading.get_ident():
+                self.__condition.wait_for(lambda: self.__writer is None and self.__waitingWriters == 0)
+            self.__readers = self.__readers + 1
+            self.__local.readDepth = readDepth + 1
+
+    def releaseRead(self):
+        with self.__condition:
+            self.__readers = self.__readers - 1
+            self.__local.readDepth = self.__readDepth() - 1
+            if self.__readers == 0:
+                self.__condition.notify_all()
+
+    def acquireWrite(self):
+        """Acquire the lock for writing.
+        Raises:
+            RuntimeError if the thread holds the lock for reading only.
+        """
+        with self.__condition:
+            if self.__writer == threading.get_ident():
+                self.__writerDepth = self.__writerDepth + 1
+                return
+            if self.__readDepth() > 0:
+                raise RuntimeError('Lock held for reading cannot be acquired for writing.')
+            self.__waitingWriters = self.__waitingWriters + 1
+            try:
+                self.__condition.wait_for(lambda: self.__writer is None and self.__readers == 0)
+            finally:
+                self.__waitingWriters = self.__waitingWriters - 1
+            self.__writer = threading.get_ident()
+            self.__writerDepth = 1
+
+    def releaseWrite(self):
+        with self.__condition:
+            self.__writerDepth = self.__writerDepth - 1
+            if self.__writerDepth == 0:
+                self.__writer = None
+                self.__condition.notify_all()
+
+    @contextmanager
+    def reading(self):
+        self.acquireRead()
+        try:
+            yield
+        finally:
+            self.releaseRead()
+
+    @contextmanager
+    def writing(self):
+        self.acquireWrite()
+        try:
+            yield
+        finally:
+            self.releaseWrite()
+
+def shared(method):
+    """Run a method of an object with a method reading() (see ReadWriteLock) under the read lock."""
+    @functools.wraps(method)
+    def decorated_method(self, *args, **kwargs):
+        with self.reading():
+            return method(self, *args, **kwargs)
+    return decorated_method
+
+def exclusive(method):
+    """Run a method of an object with a method writing() (see ReadWriteLock) under the write lock."""
+    @functools.wraps(method)
+    def decorated_method(self, *args, **kwargs):
+        with self.writing():
+            return method(self, *args, **kwargs)
+    return decorated_method
@@ -14,6 +14,12 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+import heapq
+import threading
+import time
+from datetime import datetime
+from artshowkeeper.common.convert import *
+
 class Field:
     ADDED_ITEM_CODES = 'AddedItemCodes'
     CREATED_TIMESTAMP = 'CreatedTimestamp'
@@ -26,4 +32,274 @@ class Field:
     DEVICE_CODES = 'DeviceCodes'
 
     IMPORTED_CHECKSUM = 'ImportedChecksum'
-    IMPORTED_ITEMS = 'ImportedItems'
+    IMPORT_ID = 'ImportID'
+    """ID of a spooled import (see Dataset.spoolImport)."""
+
+class StatisticsField:
+    SESSIONS = 'Sessions'
+    SWEEPS = 'Sweeps'
+    SWEPT_SESSIONS = 'SweptSessions'
+    SWEEP_TIME = 'SweepTime'
+    """Total time (in seconds) spent by sweeping."""
+
+class Session:
+    """Values of a single session.
+    Attributes:
+        sessionID -- Session ID (int).
+        values -- Dictionary key -> value.
+        validUntil -- Expiration time (datetime) or None if the session has no valid timestamp.
+    """
+    __slots__ = ('sessionID', 'values', 'validUntil')
+
+    def __init__(self, sessionID):
+        self.sessionID = sessionID
+        self.values = {}
+        self.validUntil = None
+
+class SessionStore:
+    """In-memory store of sessions.
+    Sessions are kept in a dictionary and their expiration times in a heap, so
+    a lookup is O(1) and a sweep costs O(log n) per expired session. The store
+    can be saved to a table as a snapshot (rows SessionID, Key, Value).
+    """
+    GLOBAL_SESSION_ID = 0
+
+    def __init__(self, logger, table=None):
+        """Create a store.
+        Args:
+            table -- Table with columns SessionID, Key, Value used for snapshots or None
+                if sessions should not be persisted.
+        """
+        self.__logger = logger
+        self.__table = table
+        self.__sessions = {}
+        self.__expirations = []
+        self.__untimed = set()
+        self.__changed = False
+        self.__mutations = 0
+        self.__numSweeps = 0
+        self.__numSwept = 0
+        self.__sweepTime = 0.0
+        self.__lock = threading.RLock()
+
+    def changed(self):
+        return self.__changed
+
+    def mutations(self):
+        return self.__mutations
+
+    def __markChanged(self):
+        self.__changed = True
+        self.__mutations = self.__mutations + 1
+
+    def __setValidUntil(self, session, validUntil):
+        """Update expiration of a session and schedule a sweep if it expires sooner."""
+        if session.sessionID == self.GLOBAL_SESSION_ID:
+            return
+        previous = session.validUntil
+        session.validUntil = validUntil
+        if validUntil is None:
+            self.__untimed.add(session.sessionID)
+        else:
+            self.__untimed.discard(session.sessionID)
+            if previous is None or validUntil < previous:
+                heapq.heappush(self.__expirations, (validUntil, session.sessionID))
+
+    def __toValidUntil(self, value):
+        if value is None or isinstance(value, datetime):
+            return value
+        else:
+            return toDateTime(value)
+
+    def find(self, sessionID):
+        """Find a session.
+        Returns:
+            Session or None.
+        """
+        return self.__sessions.get(toInt(sessionID), None)
+
+    def findValid(self, sessionID, now=None):
+        """Find a session which has not expired yet (even if it has not been swept yet).
+        Returns:
+            Session or None.
+        """
+        session = self.find(sessionID)
+        if session is None or session.validUntil is None or session.validUntil <= (now or datetime.now()):
+            return None
+        else:
+            return session
+
+    def getSessionIDs(self):
+        """Get IDs of all sessions except of the global one."""
+        with self.__lock:
+            return [sessionID for sessionID in self.__sessions.keys() if sessionID != self.GLOBAL_SESSION_ID]
+
+    def getPairs(self, sessionID):
+        session = self.find(sessionID)
+        return dict(session.values) if session is not None else {}
+
+    def getValue(self, sessionID, key, defaultValue=None):
+        session = self.find(sessionID)
+        if session is None:
+            return defaultValue
+        return session.values.get(str(key), defaultValue)
+
+    def update(self, sessionID, **pairs):
+        """Update session pairs. A pair with a value None is removed.
+        Returns:
+            True if the last pair has been updated.
+        """
+        sessionID = toInt(sessionID)
+        updated = False
+        with self.__lock:
+            session = self.__sessions.get(sessionID, None)
+            for key, value in pairs.items():
+                key = str(key)
+                if value is not None:
+                    if session is None:
+                        session = Session(sessionID)
+                        self.__sessions[sessionID] = session
+                        self.__setValidUntil(session, None)
+                    session.values[key] = value
+                    updated = True
+                else:
+                    updated = session is not None and session.values.pop(key, None) is not None
+                    if session is not None and len(session.values) == 0:
+                        self.__drop(sessionID)
+                        session = None
+
+                if key == Field.VALID_UNTIL_TIMESTAMP and session is not None:
+                    self.__setValidUntil(session, self.__toValidUntil(value))
+                    # Renewing a session alone is not worth a snapshot.
+                    continue
+                if updated:
+                    self.__markChanged()
+        return updated
+
+    def __drop(self, sessionID):
+        if self.__sessions.pop(sessionID, None) is not None:
+            self.__untimed.discard(sessionID)
+            self.__markChanged()
+
+    def drop(self, sessionID):
+        """Remove a session (the global session is not removed)."""
+        sessionID = toInt(sessionID)
+        if sessionID != self.GLOBAL_SESSION_ID:
+            with self.__lock:
+                self.__drop(sessionID)
+
+    def sweep(self, now=None):
+        """Drop sessions which have expired or which have no valid timestamp.
+        Returns:
+            List of IDs of dropped sessions.
+        """
+        startTime = time.perf_counter()
+        now = now or datetime.now()
+        dropped = []
+        with self.__lock:
+            for sessionID in self.__untimed:
+                if sessionID in self.__sessions:
+                    dropped.append(sessionID)
+            while len(self.__expirations) > 0 and self.__expirations[0][0] <= now:
+                validUntil, sessionID = heapq.heappop(self.__expirations)
+                session = self.__sessions.get(sessionID, None)
+                if session is None or session.validUntil is None:
+                    continue
+                elif session.validUntil <= now:
+                    dropped.append(sessionID)
+                else:
+                    # The session has been renewed meanwhile
+                    heapq.heappush(self.__expirations, (session.validUntil, sessionID))
+            for sessionID in dropped:
+                self.__drop(sessionID)
+            self.__untimed.clear()
+            self.__numSweeps = self.__numSweeps + 1
+            self.__numSwept = self.__numSwept + len(dropped)
+            self.__sweepTime = self.__sweepTime + time.perf_counter() - startTime
+        return dropped
+
+    def getStatistics(self):
+        """Get counters of sweeping.
+        Returns:
+            Dictionary (see StatisticsField).
+        """
+        with self.__lock:
+            return {
+                    StatisticsField.SESSIONS: len(self.__sessions),
+                    StatisticsField.SWEEPS: self.__numSweeps,
+                    StatisticsField.SWEPT_SESSIONS: self.__numSwept,
+                    StatisticsField.SWEEP_TIME: self.__sweepTime}
+
+    def load(self):
+        """Load a snapshot of sessions."""
+        if self.__table is None:
+            return True
+        with self.__lock:
+            if not self.__table.load():
+                return False
+            self.__sessions = {}
+            self.__expirations = []
+            self.__untimed = set()
+            for row in self.__table.select(['SessionID', 'Key', 'Value']):
+                sessionID = toInt(row['SessionID'])
+                if sessionID is None or row['Key'] is None or row['Value'] is None:
+                    self.__logger.warning('load: Skipping an invalid session pair {0}.'.format(row))
+                    continue
+                session = self.__sessions.get(sessionID, None)
+                if session is None:
+                    session = Session(sessionID)
+                    self.__sessions[sessionID] = session
+                    self.__setValidUntil(session, None)
+                session.values[row['Key']] = row['Value']
+                if row['Key'] == Field.VALID_UNTIL_TIMESTAMP:
+                    self.__setValidUntil(session, toDateTime(row['Value']))
+            self.__changed = False
+            self.__logger.info('load: Loaded {0} sessions.'.format(len(self.__sessions)))
+            return True
+
+    def save(self, forceSave=False):
+        """Save a snapshot of sessions if they have been changed."""
+        if self.__table is None:
+            return
+        with self.__lock:
+            if forceSave or self.__changed or self.__table.changed():
+                self.__table.delete(None)
+                for session in self.__sessions.values():
+                    for key, value in session.values.items():
+                        self.__table.insert({'SessionID': str(session.sessionID), 'Key': key, 'Value': value}, None)
+                self.__table.save(True)
+                self.__changed = False
+
+class SessionSweeper:
+    """Background thread which periodically sweeps expired sessions."""
+    def __init__(self, logger, model, interval=60):
+        """Create a sweeper.
+        Args:
+            model -- Model (or any object with a method sweepSessions).
+            interval -- Interval of sweeping in seconds.
+        """
+        self.__logger = logger
+        self.__model = model
+        self.__interval = max(interval, 0.01)
+        self.__stopping = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        if self.__thread is None:
+            self.__stopping.clear()
+            self.__thread = threading.Thread(target=self.__run, name='SessionSweeper', daemon=True)
+            self.__thread.start()
+            self.__logger.info('start: Sweeping sessions every {0} s.'.format(self.__interval))
+
+    def stop(self):
+        if self.__thread is not None:
+            self.__stopping.set()
+            self.__thread.join()
+            self.__thread = None
+
+    def __run(self):
+        while not self.__stopping.wait(self.__interval):
+            try:
+                self.__model.sweepSessions()
+            except Exception:
+                self.__logger.exception('run: Sweeping sessions failed.')
@@ -0,0 +1,471 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import sqlite3
+import threading
+from . predicate import compilePredicate
+from . table import TableAggregate
+
+class SqliteDatabase:
+    """SQLite database shared by tables (see SqliteTable).
+    The database is opened in WAL mode. Changes of all tables are made in a single
+    transaction which is committed when any of the tables is saved.
+    """
+    def __init__(self, logger, filename):
+        self.__logger = logger
+        self.__filename = filename
+        self.__connection = sqlite3.connect(filename, isolation_level=None, check_same_thread=False)
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute('PRAGMA synchronous=NORMAL')
+        self.lock = threading.RLock()
+        """Lock which has to be held while the database is used."""
+        self.__batchDepth = 0
+        self.__batchFailed = False
+
+    def filename(self):
+        return self.__filename
+
+    def query(self, sql, parameters=()):
+        """Execute a query.
+        Returns:
+            A list of rows (tuples).
+        """
+        with self.lock:
+            return self.__connection.execute(sql, parameters).fetchall()
+
+    def execute(self, sql, parameters=()):
+        """Execute a statement in the current transaction (the transaction is started if needed).
+        Returns:
+            A number of affected rows.
+        Raises:
+            sqlite3.IntegrityError if a constraint has been violated.
+        """
+        with self.lock:
+            if not self.__connection.in_transaction:
+                self.__connection.execute('BEGIN')
+            return self.__connection.execute(sql, parameters).rowcount
+
+    def executemany(self, sql, parameters):
+        with self.lock:
+            if not self.__connection.in_transaction:
+                self.__connection.execute('BEGIN')
+            return self.__connection.executemany(sql, parameters).rowcount
+
+    def commit(self):
+        with self.lock:
+            if self.__connection.in_transaction:
+                self.__connection.execute('COMMIT')
+                self.__logger.info('Committed "{0}"'.format(self.__filename))
+
+    def rollback(self):
+        with self.lock:
+            if self.__connection.in_transaction:
+                self.__connection.execute('ROLLBACK')
+                self.__logger.info('Rolled back "{0}"'.format(self.__filename))
+
+    def begin(self):
+        """Start a batch (a savepoint of the current transaction).
+        Batches of tables sharing the database are merged to a single batch which is
+        rolled back if any of them is rolled back. The database is locked until the batch ends.
+        """
+        self.lock.acquire()
+        if self.__batchDepth == 0:
+            if not self.__connection.in_transaction:
+                self.__connection.execute('BEGIN')
+            self.__connection.execute('SAVEPOINT batch')
+        self.__batchDepth = self.__batchDepth + 1
+
+    def end(self, commit):
+        """End a batch (see begin).
+        Args:
+            commit: True to keep changes of the batch, False to roll them back.
+        """
+        try:
+            self.__batchFailed = self.__batchFailed or not commit
+            self.__batchDepth = self.__batchDepth - 1
+            if self.__batchDepth == 0:
+                if self.__batchFailed:
+                    self.__connection.execute('ROLLBACK TO batch')
+                self.__connection.execute('RELEASE batch')
+                self.__batchFailed = False
+        finally:
+            self.lock.release()
+
+    def checkpoint(self):
+        """Commit and move the content of the write-ahead log to the database file."""
+        with self.lock:
+            self.commit()
+            self.__connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        with self.lock:
+            self.commit()
+            self.__connection.close()
+
+class SqliteTable:
+    """Table stored in a SQLite database with the same interface as Table.
+    Values are stored as text (the same way as they are stored in XML). Predicates
+    are translated to SQL. Terms which cannot be expressed in SQL (and expressions
+    which cannot be expressed by terms) are evaluated on selected rows.
+    Changes are visible immediately and they become durable when the table is saved.
+    """
+    def __init__(self, logger, database, tableName, rowName, columnNames, converter=None):
+        """Create a table (the table is created in the database if it does not exist).
+        Args:
+            database: SqliteDatabase.
+            converter: Function converting a row to a typed record (see Table).
+        """
+        self.__logger = logger
+        self.__database = database
+        self.__tableName = tableName
+        self.__columnNames = columnNames
+        self.__columnSet = set(columnNames)
+        self.__converter = converter
+        self.__converted = {}
+        self.__changed = False
+        self.__mutations = 0
+        self.__batchMutations = None
+        self.__version = 0
+        self.__aggregates = {}
+
+        self.__table = self.__quote(tableName)
+        self.__columns = ', '.join(self.__quote(colName) for colName in columnNames)
+        with self.__database.lock:
+            self.__database.execute('CREATE TABLE IF NOT EXISTS {0} ({1})'.format(
+                    self.__table, ', '.join(self.__quote(colName) + ' TEXT' for colName in columnNames)))
+            existingColumns = set(row[1] for row in self.__database.query('PRAGMA table_info({0})'.format(self.__table)))
+            for colName in columnNames:
+                if colName not in existingColumns:
+                    self.__database.execute('ALTER TABLE {0} ADD COLUMN {1} TEXT'.format(self.__table, self.__quote(colName)))
+            self.__database.commit()
+
+    @staticmethod
+    def __quote(name):
+        return '"' + name.replace('"', '""') + '"'
+
+    @staticmethod
+    def __toValue(value):
+        """Convert a value the same way as it would be stored in XML."""
+        return str(value) if value is not None else None
+
+    def len(self):
+        return self.__database.query('SELECT COUNT(*) FROM {0}'.format(self.__table))[0][0]
+
+    def changed(self):
+        return self.__changed
+
+    def mutations(self):
+        """Get a number of changes made to the table since it has been created."""
+        return self.__mutations
+
+    def createIndex(self, columnNames, unique=False):
+        """Similar to SQL:
+        CREATE [UNIQUE] INDEX ON self (columnNames)
+        Args:
+            columnNames: List of column names.
+            unique: True if insert should refuse a row whose key is already present.
+        """
+        indexName = self.__quote('{0}_{1}'.format(self.__tableName, '_'.join(columnNames)))
+        with self.__database.lock:
+            try:
+                self.__database.execute('CREATE {0}INDEX IF NOT EXISTS {1} ON {2} ({3})'.format(
+                        'UNIQUE ' if unique else '', indexName, self.__table,
+                        ', '.join(self.__quote(colName) for colName in columnNames)))
+            except sqlite3.IntegrityError as e:
+                self.__logger.error('Unique index {0} cannot be created ({1}), creating non-unique index.'.format(indexName, str(e)))
+                self.__database.execute('CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})'.format(
+                        indexName, self.__table, ', '.join(self.__quote(colName) for colName in columnNames)))
+            self.__database.commit()
+
+    def createAggregate(self, columnNames, function):
+        """Create running totals over rows (see Table). Totals are recalculated
+        when they are retrieved after the table has changed.
+        Returns:
+            Aggregate whose totals are retrieved by aggregate.
+        """
+        with self.__database.lock:
+            aggregate = TableAggregate(columnNames, function)
+            self.__aggregates[aggregate] = None
+            return aggregate
+
+    def aggregate(self, aggregate, rebuild=False):
+        """Get totals of an aggregate (see Table)."""
+        with self.__database.lock:
+            if rebuild or self.__aggregates[aggregate] != self.__version:
+                aggregate.clear()
+                for seq, row in self.__matchingRows(None):
+                    aggregate.add(seq, row)
+                self.__aggregates[aggregate] = self.__version
+            return aggregate.totals()
+
+    def load(self):
+        """Drop cached rows (the database is always up to date)."""
+        with self.__database.lock:
+            self.__converted = {}
+            self.__version = self.__version + 1
+            self.__logger.info('Loaded {0} rows'.format(self.len()))
+            return True
+
+    def save(self, forceSave = False):
+        """Commit changes of the table (and all other tables of the database) if changed.
+        Args:
+            forceSave: True to commit regardless the table has been changed.
+        """
+        with self.__database.lock:
+            if not forceSave and not self.__changed:
+                self.__logger.info('Not saving "{0}" because there has been no change.'.format(self.__tableName))
+            else:
+                self.__database.commit()
+                self.__changed = False
+
+    def compact(self):
+        """Commit changes and checkpoint the write-ahead log."""
+        with self.__database.lock:
+            self.__database.checkpoint()
+            self.__changed = False
+
+    def __toCondition(self, colName, operatorName, value):
+        """Translate a term to SQL.
+        Returns:
+            Pair (SQL condition, parameters) or None if the term cannot be translated.
+        """
+        if colName not in self.__columnSet:
+            return None
+        column = self.__quote(colName)
+        if value is None:
+            if operatorName in ['==', 'is']:
+                return column + ' IS NULL', []
+            elif operatorName in ['!=', 'is not']:
+                return column + ' IS NOT NULL', []
+            else:
+                return None
+        elif operatorName == '==':
+            return column + ' = ?', [self.__toValue(value)]
+        elif operatorName == '!=':
+            return column + ' IS NOT ?', [self.__toValue(value)]
+        elif operatorName in ['<', '<=', '>', '>=']:
+            return '{0} {1} ?'.format(column, operatorName), [self.__toValue(value)]
+        elif operatorName in ['in', 'not in'] and isinstance(value, (frozenset, set, list, tuple)):
+            values = [self.__toValue(member) for member in value if member is not None]
+            hasNone = len(values) < len(value)
+            condition = '{0} IN ({1})'.format(column, ', '.join('?' * len(values))) if len(values) > 0 else '0'
+            if operatorName == 'in':
+                return ('({0} OR {1} IS NULL)' if hasNone else '{0}').format(condition, column), values
+            else:
+                return ('({1} IS NOT NULL AND NOT {0})' if hasNone else '({1} IS NULL OR NOT {0})').format(condition, column), values
+        else:
+            return None
+
+    def __toWhere(self, expression):
+        """Translate an expression to SQL.
+        Returns:
+            Triplet (WHERE clause, parameters, predicate or None) where the predicate
+            has to be evaluated on rows selected by the WHERE clause.
+        """
+        predicate = compilePredicate(expression)
+        if predicate is None:
+            return '', [], None
+        elif predicate.terms is None:
+            return '', [], predicate
+
+        conditions = []
+        parameters = []
+        remaining = False
+        for colName, operatorName, value in predicate.terms:
+            condition = self.__toCondition(colName, operatorName, value)
+            if condition is None:
+                remaining = True
+            else:
+                conditions.append(condition[0])
+                parameters.extend(condition[1])
+        where = ' WHERE ' + ' AND '.join(conditions) if len(conditions) > 0 else ''
+        return where, parameters, predicate if remaining else None
+
+    def __matchingRows(self, expression, skipFailing=False):
+        """Find rows matching the expression.
+        Args:
+            skipFailing: True to skip rows on which the expression fails.
+        Returns:
+            A list of pairs (rowid, row) in the table order.
+        """
+        where, parameters, predicate = self.__toWhere(expression)
+        rows = [(values[0], dict(zip(self.__columnNames, values[1:])))
+                for values in self.__database.query(
+                        'SELECT rowid, {0} FROM {1}{2} ORDER BY rowid'.format(self.__columns, self.__table, where),
+                        parameters)]
+        if predicate is None:
+            return rows
+        elif not skipFailing:
+            return [(seq, row) for seq, row in rows if predicate(row)]
+        else:
+            result = []
+            for seq, row in rows:
+                try:
+                    if predicate(row):
+                        result.append((seq, row))
+                except NameError as e:
+                    self.__logger.warning('Evaluating expression "{0}" failed with "{1}" on a row "{2}. Skipping'.format(expression, str(e), row))
+            return result
+
+    def count(self, expression):
+        """Similar to SQL:
+        SELECT COUNT(*) FROM self WHERE expression
+        Returns:
+            A number of rows which qualifies to the expression.
+        """
+        with self.__database.lock:
+            where, parameters, predicate = self.__toWhere(expression)
+            if predicate is None:
+                resultCount = self.__database.query('SELECT COUNT(*) FROM {0}{1}'.format(self.__table, where), parameters)[0][0]
+            else:
+                resultCount = len(self.__matchingRows(expression))
+            self.__logger.info('Counted {0} rows'.format(resultCount))
+            return resultCount
+
+    def select(self, colNames, expression = None):
+        """Similar to SQL:
+        SELECT colName FROM self WHERE expression
+        Returns:
+            A list of selected items or an empty list if no item was selected.
+        """
+        with self.__database.lock:
+            result = [{colName: row.get(colName, None) for colName in colNames}
+                    for seq, row in self.__matchingRows(expression)]
+            self.__logger.info('Selected {0} rows (expression: "{1}")'.format(len(result), expression))
+            return result
+
+    def selectConverted(self, expression = None):
+        """Similar to select but rows are converted by the converter of the table (see Table).
+        Returns:
+            A list of converted rows (rows converted to None are skipped). Converted
+            rows are shared by all callers and they must not be modified.
+        """
+        with self.__database.lock:
+            result = []
+            for seq, row in self.__matchingRows(expression):
+                try:
+                    record = self.__converted[seq]
+                except KeyError:
+                    record = self.__converted[seq] = self.__converter(row)
+                if record is not None:
+                    result.append(record)
+            self.__logger.info('Selected {0} converted rows (expression: "{1}")'.format(len(result), expression))
+            return result
+
+    def __changedBy(self, count):
+        if count > 0:
+            self.__version = self.__version + 1
+        if count > 0 and self.__batchMutations is not None:
+            self.__batchMutations = self.__batchMutations + 1
+        elif count > 0:
+            self.__changed = True
+            self.__mutations = self.__mutations + 1
+
+    def begin(self):
+        """Start a batch of changes which is committed or rolled back as a whole (see Table)."""
+        self.__database.begin()
+        self.__batchMutations = 0
+
+    def commit(self):
+        """Commit the batch (changes become durable when the table is saved)."""
+        if self.__batchMutations > 0:
+            self.__changed = True
+            self.__mutations = self.__mutations + 1
+        self.__batchMutations = None
+        self.__database.end(True)
+
+    def rollback(self):
+        """Revert all changes of the batch."""
+        self.__converted = {}
+        self.__batchMutations = None
+        self.__version = self.__version + 1
+        self.__database.end(False)
+
+    def update(self, values, expression):
+        """Similar to SQL:
+        UPDATE self SET values WHERE expression
+        Returns:
+            A number of affected rows.
+        """
+        with self.__database.lock:
+            columns = [colName for colName in values if colName in self.__columnSet]
+            assignments = ', '.join(self.__quote(colName) + ' = ?' for colName in columns)
+            newValues = [self.__toValue(values[colName]) for colName in columns]
+            where, parameters, predicate = self.__toWhere(expression)
+            if predicate is None and self.__converter is None and len(columns) > 0:
+                updateCount = self.__database.execute(
+                        'UPDATE {0} SET {1}{2}'.format(self.__table, assignments, where), newValues + parameters)
+            else:
+                seqs = [seq for seq, row in self.__matchingRows(expression, skipFailing=True)]
+                for seq in seqs:
+                    self.__converted.pop(seq, None)
+                if len(columns) > 0:
+                    self.__database.executemany(
+                            'UPDATE {0} SET {1} WHERE rowid = ?'.format(self.__table, assignments),
+                            [newValues + [seq] for seq in seqs])
+                updateCount = len(seqs)
+
+            self.__changedBy(updateCount)
+            self.__logger.info('Updated {0} rows'.format(updateCount))
+            return updateCount
+
+    def insert(self, values, primaryKey):
+        """Similar to SQL:
+        INSERT INTO self VALUE values
+        Args:
+            values: Dictionary. Missing columns are stored as None.
+            primaryKey: Column name which should not contain any duplicate.
+                Unique indexes are checked as well.
+        Returns:
+            True if a new row was inserted.
+        """
+        with self.__database.lock:
+            if primaryKey is None or self.count((primaryKey, '==', str(values[primaryKey]))) == 0:
+                try:
+                    self.__database.execute(
+                            'INSERT INTO {0} ({1}) VALUES ({2})'.format(self.__table, self.__columns, ', '.join('?' * len(self.__columnNames))),
+                            [self.__toValue(values.get(colName, None)) for colName in self.__columnNames])
+                    self.__changedBy(1)
+                    self.__logger.info('Inserted one record')
+                    return True
+                except sqlite3.IntegrityError:
+                    pass
+            self.__logger.info('No record inserted due to a conflict')
+            return False
+
+    def delete(self, expression):
+        """Similar to SQL:
+        DELETE FROM self WHERE expression
+        Returns:
+            A number of affected rows.
+        """
+        with self.__database.lock:
+            where, parameters, predicate = self.__toWhere(expression)
+            if predicate is None:
+                if len(self.__converted) > 0:
+                    for values in self.__database.query('SELECT rowid FROM {0}{1}'.format(self.__table, where), parameters):
+                        self.__converted.pop(values[0], None)
+                deleteCount = self.__database.execute('DELETE FROM {0}{1}'.format(self.__table, where), parameters)
+            else:
+                seqs = [seq for seq, row in self.__matchingRows(expression)]
+                for seq in seqs:
+                    self.__converted.pop(seq, None)
+                self.__database.executemany('DELETE FROM {0} WHERE rowid = ?'.format(self.__table), [[seq] for seq in seqs])
+                deleteCount = len(seqs)
+
+            self.__changedBy(deleteCount)
+            self.__logger.info('Deleted {0} rows'.format(deleteCount))
+            return deleteCount
@@ -25,6 +25,11 @@ class SummaryField:
     BOUGHT_ITEMS_AMOUNT = 'BoughtItemsAmount'
     TOTAL_DUE_AMOUNT = 'TotalDueAmount'
 
+class TotalsField:
+    POTENTIAL_CHARITY_AMOUNT = 'PotentialCharityAmount'
+    POTENTIAL_GROSS_AMOUNT = 'PotentialGrossAmount'
+    STATE_COUNTS = 'StateCounts'
+
 class DrawerSummaryField:
     TOTAL_GROSS_CASH_DRAWER_AMOUNT = 'TotalGrossCashDrawerAmount'
     TOTAL_NET_CHARITY_AMOUNT = 'TotalNetCharityAmount'
@@ -16,65 +16,414 @@
 #
 import logging
 import os
-import codecs
 import json
-import xml.dom
-from xml.dom import minidom
+from xml.etree import ElementTree
 from artshowkeeper.common.convert import *
+from . predicate import compilePredicate
+from . rwlock import ReadWriteLock
+
+class TableIndex:
+    """Hash index of rows of a table.
+    Index maps a key (tuple of column values) to sequence numbers of rows.
+    """
+    def __init__(self, columnNames, unique):
+        self.columnNames = tuple(columnNames)
+        self.unique = unique
+        self.__buckets = {}
+        self.__unhashable = set()
+
+    def key(self, row):
+        return tuple(row.get(colName, None) for colName in self.columnNames)
+
+    def clear(self):
+        self.__buckets = {}
+        self.__unhashable = set()
+
+    def add(self, seq, row):
+        key = self.key(row)
+        try:
+            bucket = self.__buckets.get(key, None)
+            if bucket is None:
+                self.__buckets[key] = bucket = set()
+            bucket.add(seq)
+        except TypeError:
+            self.__unhashable.add(seq)
+
+    def remove(self, seq, row):
+        key = self.key(row)
+        try:
+            bucket = self.__buckets.get(key, None)
+        except TypeError:
+            bucket = None
+        if bucket is not None and seq in bucket:
+            bucket.discard(seq)
+            if len(bucket) == 0:
+                del self.__buckets[key]
+        else:
+            self.__unhashable.discard(seq)
+
+    def lookup(self, key):
+        """Find sequence numbers of rows with a given key.
+        Returns:
+            Set of sequence numbers (rows with unhashable values are always included).
+        """
+        try:
+            bucket = self.__buckets.get(key, None)
+        except TypeError:
+            return set(self.__unhashable).union(*self.__buckets.values())
+        if bucket is None:
+            return set(self.__unhashable)
+        elif len(self.__unhashable) == 0:
+            return set(bucket)
+        else:
+            return bucket | self.__unhashable
+
+class TableAggregate:
+    """Running totals over rows of a table.
+    A function maps a row to a dictionary name -> number (or None to skip the row).
+    Totals are updated whenever a row is added, changed or removed.
+    """
+    def __init__(self, columnNames, function):
+        """Create an aggregate.
+        Args:
+            columnNames: Columns the function depends on.
+            function: Function mapping a row to a dictionary name -> number or None.
+        """
+        self.columnNames = tuple(columnNames)
+        self.__function = function
+        self.__totals = {}
+
+    def clear(self):
+        self.__totals = {}
+
+    def add(self, seq, row):
+        values = self.__function(row)
+        if values is not None:
+            for name, value in values.items():
+                self.__totals[name] = self.__totals.get(name, 0) + value
+
+    def remove(self, seq, row):
+        values = self.__function(row)
+        if values is not None:
+            for name, value in values.items():
+                self.__totals[name] = self.__totals.get(name, 0) - value
+
+    def totals(self):
+        return dict(self.__totals)
 
 class Table:
-    def __init__(self, logger, filename, tableName, rowName, columnNames):
+    JOURNAL_COMPACT_RECORDS = 1000
+    """Number of journal records after which save rewrites the whole file."""
+    JOURNAL_SEQUENCE_ATTRIBUTE = 'JournalSequence'
+
+    def __init__(self, logger, filename, tableName, rowName, columnNames, journal=False, converter=None, rowFactory=None):
+        """Create a table.
+        Args:
+            journal: True to append each change to a journal file (filename.journal)
+                which is replayed on load. The whole file is then rewritten only
+                when the journal is compacted (see save).
+            converter: Function converting a row to a typed record (or None to skip
+                the row) used by selectConverted. Converted rows are cached until
+                they are updated.
+            rowFactory: Function creating a row record (a mutable mapping) out of
+                a dictionary or None to keep rows as dictionaries.
+        """
         self.__logger = logger
         self.__filename = filename
         self.__filenameBak = self.__filename + '.bak'
         self.__filenameNew = self.__filename + '.new'
+        self.__filenameJournal = self.__filename + '.journal'
         self.__tableName = tableName
         self.__rowName = rowName
         self.__columnNames = columnNames
-        self.__rows = []
+        self.__rows = {}
+        self.__nextSeq = 0
+        self.__indexes = []
+        self.__aggregates = []
+        self.__converter = converter
+        self.__rowFactory = rowFactory
+        self.__converted = {}
         self.__changed = False
+        self.__journal = journal
+        self.__journalFile = None
+        self.__journalSequence = 0
+        self.__journalRecords = 0
+        self.__replaying = False
+        self.__mutations = 0
+        self.__undo = None
+        self.__batchJournal = None
+        self.__batchMutations = 0
+        self.__lock = ReadWriteLock()
         
     def len(self):
         return len(self.__rows)
     
     def changed(self):
         return self.__changed
+
+    def mutations(self):
+        """Get a number of changes made to the table since it has been created."""
+        return self.__mutations
+
+    def createIndex(self, columnNames, unique=False):
+        """Similar to SQL:
+        CREATE [UNIQUE] INDEX ON self (columnNames)
+        Queries constraining all columns of an index by '==', 'is None'
+        or 'in [...]' are answered without scanning the table.
+        Args:
+            columnNames: List of column names.
+            unique: True if insert should refuse a row whose key is already present.
+        """
+        with self.__lock.writing():
+            index = TableIndex(columnNames, unique)
+            for seq, row in self.__rows.items():
+                index.add(seq, row)
+            self.__indexes.append(index)
+            return index
+
+    def createAggregate(self, columnNames, function):
+        """Create running totals over rows (see TableAggregate).
+        Args:
+            columnNames: Columns the function depends on.
+            function: Function mapping a row to a dictionary name -> number or None.
+        Returns:
+            Aggregate whose totals are retrieved by aggregate.
+        """
+        with self.__lock.writing():
+            aggregate = TableAggregate(columnNames, function)
+            for seq, row in self.__rows.items():
+                aggregate.add(seq, row)
+            self.__aggregates.append(aggregate)
+            return aggregate
+
+    def aggregate(self, aggregate, rebuild=False):
+        """Get totals of an aggregate.
+        Args:
+            aggregate: Aggregate created by createAggregate.
+            rebuild: True to calculate the totals from scratch.
+        Returns:
+            Dictionary name -> total.
+        """
+        with (self.__lock.writing() if rebuild else self.__lock.reading()):
+            if rebuild:
+                aggregate.clear()
+                for seq, row in self.__rows.items():
+                    aggregate.add(seq, row)
+            return aggregate.totals()
     
+    def __clearRows(self):
+        self.__rows = {}
+        self.__converted = {}
+        self.__nextSeq = 0
+        for index in self.__indexes + self.__aggregates:
+            index.clear()
+
+    def __addRow(self, row):
+        if self.__rowFactory is not None:
+            row = self.__rowFactory(row)
+        seq = self.__nextSeq
+        self.__nextSeq = self.__nextSeq + 1
+        self.__rows[seq] = row
+        for index in self.__indexes + self.__aggregates:
+            index.add(seq, row)
+        if self.__undo is not None:
+            self.__undo.append(('insert', seq))
+
     def load(self):
-        try:
-            xmldoc = minidom.parse(self.__filename)
-        except FileNotFoundError:
-            self.__logger.warning(
-                    'File "{0}" not found, keeping {1} rows.'.format(
-                        self.__filename, len(self.__rows)))
-            return True
-        else:            
-            if self.__tableName != xmldoc.documentElement.localName:
-                self.__logger.error(
-                        'Document root "{0}" does not match expected root "{1}"'.format(
-                            xmldoc.documentElement.localName, self.__tableName))
-                return False
-            else:
-                self.__rows = []
-                for rowElement in xmldoc.documentElement.childNodes:
-                    if rowElement.nodeType == xml.dom.Node.ELEMENT_NODE:
-                        if self.__rowName != rowElement.localName:
+        """Load the table from the file.
+        The file is parsed incrementally and rows are built as their elements are
+        closed, so the whole document is never held in memory. Rows are replaced
+        only if the whole file has been parsed.
+        """
+        with self.__lock.writing():
+            try:
+                events = ElementTree.iterparse(self.__filename, events=('start', 'end'))
+            except FileNotFoundError:
+                self.__logger.warning(
+                        'File "{0}" not found, keeping {1} rows.'.format(
+                            self.__filename, len(self.__rows)))
+                if self.__journal and os.path.isfile(self.__filenameJournal):
+                    self.__clearRows()
+                    self.__replayJournal(0)
+                return True
+
+            debug = self.__logger.isEnabledFor(logging.DEBUG)
+            rows = []
+            rootElement = None
+            snapshotSequence = 0
+            depth = 0
+            for event, element in events:
+                if event == 'start':
+                    depth = depth + 1
+                    if depth == 1:
+                        rootElement = element
+                        if self.__tableName != element.tag:
                             self.__logger.error(
-                                    'Skipping row "{0}" (value {1}) because it does not match expected row "{2}"'.format(
-                                        rowElement.localName, rowElement.nodeValue, self.__rowName))
+                                    'Document root "{0}" does not match expected root "{1}"'.format(
+                                        element.tag, self.__tableName))
+                            return False
+                        # Clearing finished rows clears attributes of the root as well
+                        snapshotSequence = toInt(element.get(self.JOURNAL_SEQUENCE_ATTRIBUTE, None)) or 0
+                else:
+                    depth = depth - 1
+                    if depth == 1:
+                        if self.__rowName != element.tag:
+                            self.__logger.error(
+                                    'Skipping row "{0}" because it does not match expected row "{1}"'.format(
+                                        element.tag, self.__rowName))
                         else:
                             row = {}
-                            for colElement in rowElement.childNodes:
-                                if colElement.nodeType == xml.dom.Node.ELEMENT_NODE:
-                                    for value in colElement.childNodes:
-                                        if value.nodeType == xml.dom.Node.TEXT_NODE:
-                                            row[colElement.localName] = value.nodeValue
+                            for colElement in element:
+                                value = self.__elementText(colElement)
+                                if value is not None:
+                                    row[colElement.tag] = value
                             self.__normalizeRow(row)
-                            self.__rows.append(row)
-                            self.__logger.debug('Added row {0}'.format(json.dumps(row, cls=JSONDecimalEncoder)))
-                self.__logger.info('Loaded {0} rows'.format(len(self.__rows)))
-                self.__changed = False
-                return True
+                            rows.append(row)
+                            if debug:
+                                self.__logger.debug('Added row {0}'.format(json.dumps(row, cls=JSONDecimalEncoder)))
+                        rootElement.clear()
+
+            self.__clearRows()
+            for row in rows:
+                self.__addRow(row)
+            self.__logger.info('Loaded {0} rows'.format(len(self.__rows)))
+            self.__changed = False
+            if self.__journal:
+                self.__replayJournal(snapshotSequence)
+            return True
+
+    @staticmethod
+    def __elementText(element):
+        """Get the last text of an element (text nodes are separated by child elements)."""
+        value = element.text
+        for child in element:
+            if child.tail is not None:
+                value = child.tail
+        return value
+
+    def __replayJournal(self, snapshotSequence):
+        """Apply journal records which are newer than the loaded file.
+        An incomplete record at the end of the journal (e.g. after a crash) is truncated.
+        """
+        self.__closeJournal()
+        self.__journalSequence = snapshotSequence
+        self.__journalRecords = 0
+        try:
+            journalFile = open(self.__filenameJournal, mode='r+b')
+        except FileNotFoundError:
+            return
+
+        numReplayed = 0
+        self.__replaying = True
+        try:
+            with journalFile:
+                offset = 0
+                for line in journalFile:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError('Incomplete record')
+                        record = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        self.__logger.warning(
+                                'Journal "{0}" contains an incomplete record at {1}. Truncating.'.format(
+                                    self.__filenameJournal, offset))
+                        journalFile.truncate(offset)
+                        break
+                    offset = offset + len(line)
+                    self.__journalRecords = self.__journalRecords + 1
+                    sequence = record.get('seq', 0)
+                    if sequence > snapshotSequence:
+                        self.__applyJournalRecord(record)
+                        numReplayed = numReplayed + 1
+                    self.__journalSequence = max(self.__journalSequence, sequence)
+        finally:
+            self.__replaying = False
+
+        if numReplayed > 0:
+            self.__changed = True
+        self.__logger.info('Replayed {0} journal records of "{1}"'.format(numReplayed, self.__filenameJournal))
+
+    def __applyJournalRecord(self, record):
+        operation = record.get('op', None)
+        expression = record.get('where', None)
+        if isinstance(expression, list):
+            expression = [tuple(term) for term in expression]
+        if operation == 'batch':
+            for batchRecord in record['records']:
+                self.__applyJournalRecord(batchRecord)
+        elif operation == 'insert':
+            self.insert(record['values'], None)
+        elif operation == 'update':
+            if 'rows' in record:
+                self.__updateRows(record['values'], self.__fromJournalPositions(record['rows']), None, None)
+            else:
+                self.update(record['values'], expression)
+        elif operation == 'delete':
+            if 'rows' in record:
+                self.__deleteRows(self.__fromJournalPositions(record['rows']))
+            else:
+                self.delete(expression)
+        else:
+            self.__logger.error('Unknown journal record {0}. Skipping.'.format(record))
+
+    def __toJournalValue(self, value):
+        """Convert a value the same way as it would be stored in the file."""
+        if value is None or isinstance(value, bool):
+            return value
+        elif isinstance(value, (frozenset, set, list, tuple)):
+            return [self.__toJournalValue(member) for member in value]
+        else:
+            return str(value)
+
+    def __toJournalPositions(self, seqs):
+        """Get positions of rows in the table order.
+        Journal records refer to rows by positions rather than by expressions, because
+        expressions match values of other types once the table is loaded from the file.
+        Unlike sequence numbers, positions do not change when the table is loaded again.
+        Args:
+            seqs: Sequence numbers of rows in the table order.
+        """
+        positions = []
+        position = 0
+        seqs = iter(seqs)
+        nextSeq = next(seqs, None)
+        for seq in self.__rows:
+            if nextSeq is None:
+                break
+            if seq == nextSeq:
+                positions.append(position)
+                nextSeq = next(seqs, None)
+            position = position + 1
+        return positions
+
+    def __fromJournalPositions(self, positions):
+        """Get pairs (sequence number, row) of rows at positions (see __toJournalPositions)."""
+        seqs = list(self.__rows)
+        return [(seqs[position], self.__rows[seqs[position]]) for position in positions]
+
+    def __isJournaling(self):
+        return self.__journal and not self.__replaying
+
+    def __appendJournal(self, record):
+        """Append a record to the journal and make it durable."""
+        if not self.__journal or self.__replaying:
+            return
+        elif self.__batchJournal is not None:
+            self.__batchJournal.append(record)
+            return
+        self.__journalSequence = self.__journalSequence + 1
+        record['seq'] = self.__journalSequence
+        if self.__journalFile is None:
+            self.__journalFile = open(self.__filenameJournal, mode='a', encoding='utf-8')
+        self.__journalFile.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.__journalFile.flush()
+        os.fsync(self.__journalFile.fileno())
+        self.__journalRecords = self.__journalRecords + 1
+
+    def __closeJournal(self):
+        if self.__journalFile is not None:
+            self.__journalFile.close()
+            self.__journalFile = None
 
     def __normalizeRow(self, row):
         """Normalize row by adding missing columns."""
@@ -82,74 +431,180 @@ class Table:
             if colName not in row:
                 row[colName] = None
     
+    SAVE_BUFFER_SIZE = 1024 * 1024
+    """Size of the write buffer used by save."""
+
+    @staticmethod
+    def __escape(value):
+        """Escape text the same way as minidom does."""
+        return value.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;').replace('>', '&gt;')
+
+    def __writeRows(self, writer):
+        """Write the table as XML document.
+        Rows are serialized straight to the writer in the format produced
+        by minidom (no indentation), rows without any value are omitted.
+        """
+        writer.write('<?xml version="1.0" encoding="utf-8"?>')
+        writer.write('<' + self.__tableName)
+        if self.__journal:
+            writer.write(' {0}="{1}"'.format(self.JOURNAL_SEQUENCE_ATTRIBUTE, self.__journalSequence))
+
+        escape = self.__escape
+        columnNames = set(self.__columnNames)
+        rowStart = '<' + self.__rowName + '>'
+        rowEnd = '</' + self.__rowName + '>'
+        hasRows = False
+        for row in self.__rows.values():
+            columns = ['<{0}>{1}</{0}>'.format(colName, escape(str(colValue)))
+                    for colName, colValue in row.items()
+                    if colValue is not None and colName in columnNames]
+            if len(columns) > 0:
+                if not hasRows:
+                    writer.write('>')
+                    hasRows = True
+                writer.write(rowStart + ''.join(columns) + rowEnd)
+
+        if hasRows:
+            writer.write('</' + self.__tableName + '>')
+        else:
+            writer.write('/>')
+
+    def compact(self):
+        """Save the whole table and drop the journal (if there is anything in it)."""
+        self.save(self.__journal and self.__journalRecords > 0)
+
     def save(self, forceSave = False):
         """Save the table if changed
+        If the journal is enabled, changes are durable in the journal already and
+        the table is saved only if forced or if the journal has grown over
+        JOURNAL_COMPACT_RECORDS records.
         Args:
             forceSave: True to save regardless the table has been changed.
         """
+        # Most calls find nothing to save, so they check it without blocking readers
+        with self.__lock.reading():
+            if not self.__isSaveNeeded(forceSave):
+                return
+        with self.__lock.writing():
+            if self.__isSaveNeeded(forceSave):
+                # Save to a new file
+                with open(self.__filenameNew, mode='w', encoding='utf-8', newline='',
+                        buffering=self.SAVE_BUFFER_SIZE) as newFile:
+                    self.__writeRows(newFile)
+
+                # Replace the original file
+                try:
+                    os.remove(self.__filenameBak)
+                except IOError:
+                    self.__logger.debug('No backup file "{0}" found.'.format(self.__filenameBak))
+                try:
+                    os.renames(self.__filename, self.__filenameBak)
+                except FileNotFoundError:
+                    self.__logger.debug('No current file "{0}" found.'.format(self.__filename))
+                os.renames(self.__filenameNew, self.__filename)
+
+                # Drop the journal because the file contains all changes
+                self.__closeJournal()
+                try:
+                    os.remove(self.__filenameJournal)
+                except FileNotFoundError:
+                    pass
+                self.__journalRecords = 0
+
+                self.__changed = False
+                self.__logger.info('Saved {0} rows'.format(len(self.__rows)))
+
+    def __isSaveNeeded(self, forceSave):
         if not forceSave and not self.__changed:
-            self.__logger.info('Not saving "{0}" because there has been no change.'.format(self.__filename))        
+            self.__logger.info('Not saving "{0}" because there has been no change.'.format(self.__filename))
+            return False
+        elif not forceSave and self.__journal and self.__journalRecords < self.JOURNAL_COMPACT_RECORDS:
+            self.__logger.info('Not saving "{0}" because changes are in the journal ({1} records).'.format(
+                    self.__filename, self.__journalRecords))
+            return False
         else:
-            # Save to DOM structure
-            xmldoc = minidom.Document()
-            docElement = xmldoc.createElement(self.__tableName)
-            for row in self.__rows:
-                rowElement = xmldoc.createElement(self.__rowName)
-                numValidColums = 0
-                for colName, colValue in row.items():
-                    if colValue is not None and colName in self.__columnNames:
-                        colElement = xmldoc.createElement(colName)
-                        colElement.appendChild(xmldoc.createTextNode(str(colValue)))
-                        rowElement.appendChild(colElement)
-                        numValidColums = numValidColums + 1
-                if numValidColums > 0:
-                    docElement.appendChild(rowElement)
-            xmldoc.appendChild(docElement)
-
-            # Save to a new file
-            encoding = 'utf-8'
-            newFile = codecs.open(self.__filenameNew, encoding = encoding, mode = 'w')
-            xmldoc.writexml(newFile, encoding = encoding)
-            newFile.close()
-            
-            # Replace the original file
-            try:
-                os.remove(self.__filenameBak)
-            except IOError:
-                self.__logger.debug('No backup file "{0}" found.'.format(self.__filenameBak))
-            try:
-                os.renames(self.__filename, self.__filenameBak)
-            except FileNotFoundError:
-                self.__logger.debug('No current file "{0}" found.'.format(self.__filename))
-            os.renames(self.__filenameNew, self.__filename)
+            return True
 
-            self.__changed = False
-            self.__logger.info('Saved {0} rows'.format(len(self.__rows)))
+    MAX_INDEX_KEYS = 64
+    """Maximal number of keys looked up in an index for a single query."""
+
+    def __findCandidates(self, predicate):
+        """Find rows which might match the predicate using an index.
+        An index is used if each of its columns is constrained by a term
+        '==', 'is None' or 'in [...]'. The index yielding the least rows is used.
+        Returns:
+            Ordered list of sequence numbers or None if the whole table has to be scanned.
+        """
+        if predicate is None or predicate.terms is None or len(self.__indexes) == 0:
+            return None
+
+        allowedValues = {}
+        for colName, operatorName, value in predicate.terms:
+            if operatorName == '==' or (operatorName == 'is' and value is None):
+                values = [value]
+            elif operatorName == 'in':
+                values = list(value)
+            else:
+                continue
+            if colName not in allowedValues or len(values) < len(allowedValues[colName]):
+                allowedValues[colName] = values
+
+        candidates = None
+        for index in self.__indexes:
+            if all(colName in allowedValues for colName in index.columnNames):
+                keys = [()]
+                for colName in index.columnNames:
+                    keys = [key + (value,) for key in keys for value in allowedValues[colName]]
+                    if len(keys) > self.MAX_INDEX_KEYS:
+                        break
+                if len(keys) <= self.MAX_INDEX_KEYS:
+                    seqs = set().union(*[index.lookup(key) for key in keys])
+                    if candidates is None or len(seqs) < len(candidates):
+                        candidates = seqs
+
+        return sorted(candidates) if candidates is not None else None
+
+    def __matchingRows(self, expression):
+        """Find rows matching the expression.
+        Returns:
+            A list of pairs (sequence number, row) in the table order.
+        """
+        predicate = compilePredicate(expression)
+        candidates = self.__findCandidates(predicate)
+        if candidates is not None:
+            rows = [(seq, self.__rows[seq]) for seq in candidates]
+        else:
+            rows = self.__rows.items()
+        if predicate is None:
+            return list(rows)
+        else:
+            return [(seq, row) for seq, row in rows if predicate(row)]
 
     def count(self, expression):
         """Similar to SQL:
         SELECT COUNT(*) FROM self WHERE expression
+        Args:
+            expression: Expression or structured predicate (see compilePredicate).
         Returns:
             A number of rows which qualifies to the expression.
         """
-        resultCount = 0
-        for row in self.__rows:
-            if expression is None or eval(expression, {}, row):
-                resultCount = resultCount + 1
-        self.__logger.info('Counted {0} rows'.format(resultCount))
-        return resultCount
+        with self.__lock.reading():
+            resultCount = len(self.__matchingRows(expression))
+            self.__logger.info('Counted {0} rows'.format(resultCount))
+            return resultCount
         
     def select(self, colNames, expression = None):
         """Similar to SQL:
         SELECT colName FROM self WHERE expression
         Args:
-            expression: Expression (e.g. 'Value is None') or None if any row qualifies.
+            expression: Expression (e.g. 'Value is None'), structured predicate
+                (e.g. ('Value', 'is', None)) or None if any row qualifies.
         Returns:
             A list of selected items or an empty list if no item was selected.
         """
-        result = []
-        for row in self.__rows:
-            if expression is None or eval(expression, {}, row):
+        with self.__lock.reading():
+            result = []
+            for seq, row in self.__matchingRows(expression):
                 rowResult = {}
                 for colName in colNames:
                     if colName in row:
@@ -157,8 +612,29 @@ class Table:
                     else:
                         rowResult[colName] = None
                 result.append(rowResult)
-        self.__logger.info('Selected {0} rows (expression: "{1}")'.format(len(result), expression))
-        return result
+            self.__logger.info('Selected {0} rows (expression: "{1}")'.format(len(result), expression))
+            return result
+
+    def selectConverted(self, expression = None):
+        """Similar to select but rows are converted by the converter of the table.
+        Each row is converted once and the result is cached until the row is updated.
+        Args:
+            expression: Expression or structured predicate (see compilePredicate).
+        Returns:
+            A list of converted rows (rows converted to None are skipped). Converted
+            rows are shared by all callers and they must not be modified.
+        """
+        with self.__lock.reading():
+            result = []
+            for seq, row in self.__matchingRows(expression):
+                try:
+                    record = self.__converted[seq]
+                except KeyError:
+                    record = self.__converted[seq] = self.__converter(row)
+                if record is not None:
+                    result.append(record)
+            self.__logger.info('Selected {0} converted rows (expression: "{1}")'.format(len(result), expression))
+            return result
 
     def update(self, values, expression):
         """Similar to SQL:
@@ -166,23 +642,137 @@ class Table:
         Returns:
             A number of affected rows.
         """
-        updateCount = 0
-        for row in self.__rows:
+        with self.__lock.writing():
+            predicate = compilePredicate(expression)
+            candidates = self.__findCandidates(predicate)
+            if candidates is not None:
+                rows = [(seq, self.__rows[seq]) for seq in candidates]
+            else:
+                rows = self.__rows.items()
+            return self.__updateRows(values, rows, predicate, expression)
+
+    def __updateRows(self, values, rows, predicate, expression):
+        """Update rows which match the predicate (see update).
+        Args:
+            rows: Iterable of pairs (sequence number, row) in the table order.
+            predicate: Compiled predicate or None to update all rows.
+        """
+        affectedIndexes = [index for index in self.__indexes + self.__aggregates
+                if any(colName in values for colName in index.columnNames)]
+
+        updatedSeqs = []
+        for seq, row in rows:
             try:
-                if expression is None or eval(expression, {}, row):
+                if predicate is None or predicate(row):
+                    self.__converted.pop(seq, None)
+                    if self.__undo is not None:
+                        self.__undo.append(('update', seq,
+                                {colName: row[colName] for colName in values if colName in row},
+                                [colName for colName in values if colName not in row]))
+                    for index in affectedIndexes:
+                        index.remove(seq, row)
                     for colName, colValue in values.items():
                         row[colName] = colValue
-                    updateCount = updateCount + 1
+                    for index in affectedIndexes:
+                        index.add(seq, row)
+                    updatedSeqs.append(seq)
 
             except NameError as e:
                 self.__logger.warning('Evaluating expression "{0}" failed with "{1}" on a row "{2}. Skipping'.format(expression, str(e), row))
 
+        updateCount = len(updatedSeqs)
         if updateCount > 0:
-            self.__changed = True
+            self.__markChanged()
+            if self.__isJournaling():
+                self.__appendJournal({
+                        'op': 'update',
+                        'values': {colName: self.__toJournalValue(colValue) for colName, colValue in values.items()},
+                        'rows': self.__toJournalPositions(updatedSeqs)})
 
         self.__logger.info('Updated {0} rows'.format(updateCount))
         return updateCount
 
+    def __markChanged(self):
+        if self.__undo is not None:
+            self.__batchMutations = self.__batchMutations + 1
+        else:
+            self.__changed = True
+            self.__mutations = self.__mutations + 1
+
+    def begin(self):
+        """Start a batch of changes which is committed or rolled back as a whole.
+        The table is locked for other threads until the batch ends. Changes are visible
+        inside the batch immediately, the table is marked as changed and the journal
+        is written (as a single record) on commit.
+        Raises:
+            RuntimeError if a batch has been started already.
+        """
+        self.__lock.acquireWrite()
+        if self.__undo is not None:
+            self.__lock.releaseWrite()
+            raise RuntimeError('Batch of "{0}" has been started already.'.format(self.__filename))
+        self.__undo = []
+        self.__batchJournal = []
+        self.__batchMutations = 0
+
+    def commit(self):
+        """Commit the batch (see begin)."""
+        try:
+            records = self.__batchJournal
+            self.__undo = None
+            self.__batchJournal = None
+            if self.__batchMutations > 0:
+                self.__changed = True
+                self.__mutations = self.__mutations + 1
+            if len(records) > 0:
+                self.__appendJournal({'op': 'batch', 'records': records})
+            self.__logger.info('Committed a batch of {0} changes'.format(self.__batchMutations))
+        finally:
+            self.__lock.releaseWrite()
+
+    def rollback(self):
+        """Revert all changes of the batch (see begin)."""
+        try:
+            reorder = False
+            for record in reversed(self.__undo):
+                operation, seq = record[0], record[1]
+                self.__converted.pop(seq, None)
+                if operation == 'insert':
+                    row = self.__rows.pop(seq)
+                    for index in self.__indexes + self.__aggregates:
+                        index.remove(seq, row)
+                elif operation == 'update':
+                    row = self.__rows[seq]
+                    for index in self.__indexes + self.__aggregates:
+                        index.remove(seq, row)
+                    row.update(record[2])
+                    for colName in record[3]:
+                        del row[colName]
+                    for index in self.__indexes + self.__aggregates:
+                        index.add(seq, row)
+                else:
+                    row = record[2]
+                    self.__rows[seq] = row
+                    for index in self.__indexes + self.__aggregates:
+                        index.add(seq, row)
+                    reorder = True
+            if reorder:
+                self.__rows = dict(sorted(self.__rows.items()))
+            self.__logger.info('Rolled back a batch of {0} changes'.format(self.__batchMutations))
+        finally:
+            self.__undo = None
+            self.__batchJournal = None
+            self.__lock.releaseWrite()
+
+    def __conflicts(self, values):
+        """Check whether values conflict with a unique index."""
+        for index in self.__indexes:
+            if index.unique:
+                key = index.key(values)
+                if None not in key and len(index.lookup(key)) > 0:
+                    return True
+        return False
+
     def insert(self, values, primaryKey):
         """Similar to SQL:
         INSERT INTO self VALUE values
@@ -190,18 +780,24 @@ class Table:
             values: Dictionary. If column names are specified,
                 missing columns are added with a value None.
             primaryKey: Column name which should not contain any duplicate.
+                Unique indexes are checked as well.
         Returns:
             True if a new row was inserted.
         """
-        if primaryKey is None or self.count('{0}=="{1}"'.format(primaryKey, toQuoteSafeStr(values[primaryKey]))) == 0:
-            self.__normalizeRow(values)
-            self.__rows.append(values)
-            self.__changed = True
-            self.__logger.info('Inserted one record')
-            return True
-        else:
-            self.__logger.info('No record inserted due to a conflict')
-            return False
+        with self.__lock.writing():
+            if (primaryKey is None or self.count((primaryKey, '==', str(values[primaryKey]))) == 0) \
+                    and not self.__conflicts(values):
+                self.__normalizeRow(values)
+                self.__addRow(values)
+                self.__markChanged()
+                self.__appendJournal({
+                        'op': 'insert',
+                        'values': {colName: self.__toJournalValue(colValue) for colName, colValue in values.items()}})
+                self.__logger.info('Inserted one record')
+                return True
+            else:
+                self.__logger.info('No record inserted due to a conflict')
+                return False
 
     def delete(self, expression):
         """Similar to SQL:
@@ -209,16 +805,31 @@ class Table:
         Returns:
             A number of affected rows.
         """
-        deleteCount = 0
-        newRows = []
-        for row in self.__rows:
-            if expression is None or eval(expression, {}, row):
-                deleteCount = deleteCount + 1
-            else:
-                newRows.append(row)
-        self.__rows = newRows
+        with self.__lock.writing():
+            return self.__deleteRows(self.__matchingRows(expression))
+
+    def __deleteRows(self, deletedRows):
+        """Delete rows (see delete).
+        Args:
+            deletedRows: List of pairs (sequence number, row) in the table order.
+        """
+        if len(deletedRows) > 0 and self.__isJournaling():
+            # Positions are taken before the rows are gone
+            positions = self.__toJournalPositions([seq for seq, row in deletedRows])
+        for seq, row in deletedRows:
+            for index in self.__indexes + self.__aggregates:
+                index.remove(seq, row)
+            del self.__rows[seq]
+            self.__converted.pop(seq, None)
+            if self.__undo is not None:
+                self.__undo.append(('delete', seq, row))
+        deleteCount = len(deletedRows)
 
         if deleteCount > 0:
-            self.__changed = True
+            self.__markChanged()
+            if self.__isJournaling():
+                self.__appendJournal({
+                        'op': 'delete',
+                        'rows': positions})
         self.__logger.info('Deleted {0} rows'.format(deleteCount))
         return deleteCount
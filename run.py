@@ -1,3 +1,4 @@
 from artshowkeeper import main
-main.run()
 
+if __name__ == "__main__":
+    main.run()
@@ -0,0 +1,90 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+import random
+import math
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from artshowkeeper.model.auction_order import AuthorSegmentTree, calculateAuctionOrder, INDEX_COEFS
+
+def calculateAuctionOrderByScan(authors):
+    """Reference implementation which scans all remaining items for each pick."""
+    itemsToProcess = list(range(len(authors)))
+    order = []
+    indexCoefsIndex = 0
+    lastAuthor = None
+    while len(itemsToProcess) > 0:
+        idealIndex = int(INDEX_COEFS[indexCoefsIndex] * len(itemsToProcess))
+        indexCoefsIndex = (indexCoefsIndex + 1) % len(INDEX_COEFS)
+
+        axisLenLeft = idealIndex + 1
+        axisLenRight = len(itemsToProcess) - idealIndex + 1
+        bestScoreIndex = 0
+        bestScore = 0
+        for index in range(len(itemsToProcess)):
+            if index > idealIndex:
+                x = (index - idealIndex) / axisLenRight
+            else:
+                x = (idealIndex - index) / axisLenLeft
+            score = 0.5 * math.cos(x)
+            if lastAuthor is not None and authors[itemsToProcess[index]] == lastAuthor:
+                score = score * score
+            if score > bestScore:
+                bestScore = score
+                bestScoreIndex = index
+
+        position = itemsToProcess[bestScoreIndex]
+        order.append(position)
+        lastAuthor = authors[position]
+        del itemsToProcess[bestScoreIndex]
+    return order
+
+class TestAuctionOrder(unittest.TestCase):
+    def test_tree(self):
+        tree = AuthorSegmentTree(['A', 'A', 'B', None, 'A'])
+        self.assertEqual(5, len(tree))
+        tree.remove(1)
+        self.assertEqual(4, len(tree))
+        self.assertEqual(2, tree.select(1))
+        self.assertEqual(2, tree.rank(3))
+        self.assertEqual(3, tree.findLast(4, 'A'))
+        self.assertEqual(None, tree.findLast(1, 'A'))
+        self.assertEqual(2, tree.findFirst(0, 'A'))
+        self.assertEqual(None, tree.findFirst(4, 'A'))
+        self.assertEqual(2, tree.findLast(2, None))
+
+    def test_sameOrderAsScan(self):
+        generator = random.Random(12)
+        for iteration in range(300):
+            numAuthors = generator.randint(1, 8)
+            authors = [
+                    generator.choice([None, 'Author {0}'.format(generator.randint(1, numAuthors))])
+                    if generator.random() < 0.1 else 'Author {0}'.format(generator.randint(1, numAuthors))
+                    for i in range(generator.randint(0, 150))]
+            if generator.random() < 0.3:
+                # Long runs of items of the same author.
+                authors.sort(key=lambda author: author or '')
+            self.assertListEqual(
+                    calculateAuctionOrderByScan(authors),
+                    calculateAuctionOrder(authors),
+                    'Authors: {0}'.format(authors))
+
+if __name__ == '__main__':
+    unittest.main()
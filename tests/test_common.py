@@ -178,6 +178,64 @@ class TestCommon(unittest.TestCase):
         print(translatedXml)
         self.assertEqual(expectedXml, translatedXml)
 
+    def test_translateXhtmlTemplate(self):
+        # Setup and register dictionary.
+        LANGUAGE = 'en'
+        phrases = PhraseDictionary(self.logger)
+        phrases.add('String 1', 'Translated String 1')
+        phrases.add('String 2', 'Translated "String 2"')
+        registerDictionary(LANGUAGE, phrases)
+
+        # Static text
+        template = '''<?xml version="1.0" ?>
+        <html>
+            <body>
+                <!-- __String 1 -->
+                <h1>Not translated</h1>
+                <p>__String not found</p>
+                <p>__String 1</p>
+                <form action="__String 1">
+                    <input value="__String 2" title="__String not found"/>
+                </form>
+            </body>
+        </html>'''
+        expectedTemplate = '''<?xml version="1.0" ?>
+        <html>
+            <body>
+                <!-- __String 1 -->
+                <h1>Not translated</h1>
+                <p>String not found</p>
+                <p>Translated String 1</p>
+                <form action="__String 1">
+                    <input value="Translated &quot;String 2&quot;" title="String not found"/>
+                </form>
+            </body>
+        </html>'''
+        self.assertEqual(expectedTemplate, translateXhtmlTemplate(LANGUAGE, template))
+
+        # Expressions
+        self.assertEqual(
+                '<p>{{ ( message )|translate(\'en\') }}</p><a href="{{ target }}" title="{{ ( title )|translate(\'en\') }}"/>',
+                translateXhtmlTemplate(LANGUAGE, '<p>{{ message }}</p><a href="{{ target }}" title="{{ title }}"/>'))
+        self.assertEqual(
+                '<p>Translated String 1 {% if item %}{{ ( item )|translate(\'en\') }}{% endif %}</p>',
+                translateXhtmlTemplate(LANGUAGE, '<p>__String 1__ {% if item %}{{ item }}{% endif %}</p>'))
+
+        # Errors
+        with self.assertRaises(ValueError):
+            translateXhtmlTemplate(LANGUAGE, '<p>__String 1 {{ item }}</p>')
+
+    def test_translateValue(self):
+        LANGUAGE = 'en'
+        phrases = PhraseDictionary(self.logger)
+        phrases.add('String 1', 'Translated String 1')
+        registerDictionary(LANGUAGE, phrases)
+
+        self.assertEqual('Translated String 1', translateValue('__String 1', LANGUAGE))
+        self.assertEqual('Not translated', translateValue('Not translated', LANGUAGE))
+        self.assertEqual(Markup('__String 1'), translateValue(Markup('__String 1'), LANGUAGE))
+        self.assertEqual(10, translateValue(10, LANGUAGE))
+
     def test_getRandom(self):
         # This test is not valid because it test justs a few cases
         pile = {}
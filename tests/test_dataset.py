@@ -18,6 +18,7 @@ import unittest
 import logging
 import sys
 import os
+import tempfile
 from decimal import Decimal
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -334,5 +335,63 @@ class TestDataset(unittest.TestCase):
                                 CurrencyField.AMOUNT_IN_PRIMARY: 4.56 }]))
 
 
+    def test_batch(self):
+        self.dataset.restore()
+
+        # Failed batch is rolled back
+        with self.assertRaises(ValueError):
+            with self.dataset.batch():
+                self.assertTrue(self.dataset.updateItem('A2', **{ItemField.STATE: 'FINISHED'}))
+                with self.dataset.batch():
+                    self.assertTrue(self.dataset.addItem('A999', 1, 'Title', 'Author', None, 'SHOW', None, None, None, None))
+                raise ValueError('Failed')
+        self.assertNotEqual('FINISHED', self.dataset.getItem('A2')[ItemField.STATE])
+        self.assertIsNone(self.dataset.getItem('A999'))
+
+        # Successful batch is persisted
+        with self.dataset.batch():
+            self.assertTrue(self.dataset.updateItem('A2', **{ItemField.STATE: 'FINISHED'}))
+        self.assertFalse(self.dataset.changed())
+        self.dataset.restore()
+        self.assertEqual('FINISHED', self.dataset.getItem('A2')[ItemField.STATE])
+
+    def test_exportXml(self):
+        self.dataset.restore()
+        self.assertTrue(self.dataset.updateItem('A2', **{ItemField.STATE: 'FINISHED'}))
+
+        # Tables are saved to another folder
+        with tempfile.TemporaryDirectory() as dataPath:
+            self.dataset.exportXml(dataPath)
+            exportedDataset = Dataset(
+                    self.logger, dataPath,
+                    os.path.basename(self.sessionFile.getFilename()),
+                    os.path.basename(self.itemFile.getFilename()),
+                    os.path.basename(self.currencyFile.getFilename()))
+            exportedDataset.restore()
+            self.assertListEqual(self.dataset.getItems(None), exportedDataset.getItems(None))
+
+        # Tables are saved to the data folder
+        self.dataset.exportXml()
+        self.assertFalse(self.dataset.changed())
+        self.dataset.restore()
+        self.assertEqual('FINISHED', self.dataset.getItem('A2')[ItemField.STATE])
+
+    def test_version(self):
+        self.dataset.restore()
+        version, modified = self.dataset.version()
+        self.assertEqual((version, modified), self.dataset.version())
+
+        # Sessions of users do not change the version
+        self.assertTrue(self.dataset.updateSessionPairs(1051183055, UserIP='10.0.0.1'))
+        self.assertEqual(version, self.dataset.version()[0])
+
+        # Items and global values do
+        self.assertTrue(self.dataset.updateItem('A2', **{ItemField.STATE: 'FINISHED'}))
+        itemVersion, itemModified = self.dataset.version()
+        self.assertNotEqual(version, itemVersion)
+        self.assertLessEqual(modified, itemModified)
+        self.assertTrue(self.dataset.updateGlobalPairs(ItemCodeInAuction='A2'))
+        self.assertNotEqual(itemVersion, self.dataset.version()[0])
+
 if __name__ == '__main__':
     unittest.main()
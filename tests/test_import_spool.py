@@ -0,0 +1,95 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+import logging
+import shutil
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from artshowkeeper.model.item import ImportedItemField
+from artshowkeeper.model.import_spool import ImportSpool
+
+class TestImportSpool(unittest.TestCase):
+    def setUpClass(cls):
+        logging.basicConfig(level=logging.DEBUG)
+
+    def setUp(self):
+        self.logger = logging.getLogger()
+        self.spoolPath = os.path.join(os.path.dirname(__file__), 'data', 'import{0}'.format(self.id()))
+        self.spool = ImportSpool(self.logger, self.spoolPath)
+
+    def tearDown(self):
+        shutil.rmtree(self.spoolPath, ignore_errors=True)
+
+    def createItems(self, count):
+        for i in range(count):
+            yield {
+                    ImportedItemField.NUMBER: i,
+                    ImportedItemField.TITLE: 'Žluťoučký kůň {0}'.format(i),
+                    ImportedItemField.IMPORT_RESULT: 'SUCCESS'}
+
+    def test_create(self):
+        importedItems = self.spool.create(self.createItems(25))
+        self.assertEqual(25, len(importedItems))
+        self.assertEqual('Žluťoučký kůň 3', importedItems[3][ImportedItemField.TITLE])
+        self.assertEqual(24, importedItems[-1][ImportedItemField.NUMBER])
+        with self.assertRaises(IndexError):
+            importedItems[25]
+        self.assertListEqual(list(self.createItems(25)), list(importedItems))
+        self.assertListEqual([20, 21, 22, 23, 24], [item[ImportedItemField.NUMBER] for item in importedItems.page(20, 10)])
+        self.assertListEqual([], importedItems.page(30, 10))
+
+        # Reopen
+        reopenedItems = self.spool.open(importedItems.importID)
+        self.assertEqual(25, len(reopenedItems))
+        self.assertEqual(importedItems[10], reopenedItems[10])
+        self.assertIsNone(self.spool.open('0123'))
+        self.assertIsNone(self.spool.open('../../etc/passwd'))
+
+    def test_page(self):
+        # Any item can be read directly, whatever characters precede it
+        items = [{ImportedItemField.TITLE: title} for title in ['Kůň\r\nKůň', '\u2028', '🐎', 'Horse', '\r', '']]
+        importedItems = self.spool.create(items)
+        for index in range(len(items)):
+            self.assertListEqual(items[index:], importedItems.page(index, len(items)))
+            self.assertDictEqual(items[index], self.spool.open(importedItems.importID)[index])
+
+    def test_update(self):
+        importedItems = self.spool.create(self.createItems(5))
+        importedItems = self.spool.update(importedItems, {
+                1: {ImportedItemField.IMPORT_RESULT: 'DUPLICATE_ITEM'},
+                3: {ImportedItemField.IMPORT_RESULT: 'DUPLICATE_ITEM'}})
+        self.assertListEqual(
+                ['SUCCESS', 'DUPLICATE_ITEM', 'SUCCESS', 'DUPLICATE_ITEM', 'SUCCESS'],
+                [item[ImportedItemField.IMPORT_RESULT] for item in importedItems])
+        self.assertEqual(4, importedItems[4][ImportedItemField.NUMBER])
+
+    def test_dropSweep(self):
+        importedItems1 = self.spool.create(self.createItems(2))
+        importedItems2 = self.spool.create(self.createItems(2))
+        importedItems3 = self.spool.create(self.createItems(2))
+        self.spool.drop(importedItems1.importID)
+        self.assertIsNone(self.spool.open(importedItems1.importID))
+
+        self.assertEqual(1, self.spool.sweep({importedItems2.importID}))
+        self.assertIsNotNone(self.spool.open(importedItems2.importID))
+        self.assertIsNone(self.spool.open(importedItems3.importID))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from artshowkeeper.common.convert import JSONDecimalEncoder
+from artshowkeeper.model.item import Item, ItemField, ItemState, ImportedItemField, ImportedItemChecksum, calculateSortCode
+
+class TestItem(unittest.TestCase):
+    def test_mapping(self):
+        item = Item({ItemField.CODE: 'A2', ItemField.STATE: ItemState.ON_SHOW, ItemField.INDEX: 3})
+
+        # Missing persistent fields are None, other fields are kept
+        self.assertIsNone(item[ItemField.OWNER])
+        self.assertEqual(3, item[ItemField.INDEX])
+        self.assertEqual(len(ItemField.ALL_PERSISTENT) + 1, len(item))
+        self.assertDictEqual(
+                dict({colName: None for colName in ItemField.ALL_PERSISTENT}, **{
+                        ItemField.CODE: 'A2', ItemField.STATE: ItemState.ON_SHOW, ItemField.INDEX: 3}),
+                dict(item))
+        with self.assertRaises(KeyError):
+            item[ItemField.NET_AMOUNT]
+        self.assertIsNone(item.get(ItemField.NET_AMOUNT))
+
+        # Persistent fields are kept when deleted
+        del item[ItemField.INDEX]
+        del item[ItemField.CODE]
+        self.assertNotIn(ItemField.INDEX, item)
+        self.assertIn(ItemField.CODE, item)
+        self.assertIsNone(item[ItemField.CODE])
+
+        # Copy is independent
+        item[ItemField.CODE] = 'A2'
+        itemCopy = item.copy()
+        itemCopy[ItemField.CODE] = 'A3'
+        itemCopy[ItemField.NET_AMOUNT] = 10
+        self.assertEqual('A2', item[ItemField.CODE])
+        self.assertNotIn(ItemField.NET_AMOUNT, item)
+        self.assertEqual('A3', json.loads(json.dumps(itemCopy, cls=JSONDecimalEncoder))[ItemField.CODE])
+
+        # Only persistent fields can be taken over
+        self.assertNotIn(ItemField.NET_AMOUNT, Item(itemCopy, persistentOnly=True))
+
+    def test_derivedFields(self):
+        item = Item({ItemField.CODE: 'A12', ItemField.STATE: ItemState.ON_SHOW})
+        self.assertEqual(calculateSortCode('A12'), item[ItemField.SORT_CODE])
+        self.assertEqual(12, calculateSortCode('12'))
+        self.assertTrue(item[ItemField.PRINT_ALLOWED])
+        self.assertNotIn(ItemField.SORT_CODE, list(item.keys()))
+
+        # Derived fields follow persistent fields unless they are set
+        item[ItemField.STATE] = ItemState.SOLD
+        self.assertFalse(item[ItemField.DELETE_ALLOWED])
+        item[ItemField.SORT_CODE] = 1
+        self.assertEqual(1, item[ItemField.SORT_CODE])
+
+        # Dictionary includes derived fields on request
+        del item[ItemField.SORT_CODE]
+        self.assertNotIn(ItemField.SORT_CODE, item.toDict())
+        self.assertEqual(calculateSortCode('A12'), item.toDict(derived=True)[ItemField.SORT_CODE])
+
+    def test_importedItemChecksum(self):
+        def calculateChecksum(importedItems):
+            checksum = ImportedItemChecksum()
+            for importedItem in importedItems:
+                checksum.update(importedItem)
+            return checksum.value()
+
+        item1 = {ImportedItemField.AUTHOR: 'Greentiger', ImportedItemField.TITLE: 'Draft Horse', ImportedItemField.NUMBER: 1}
+        item2 = {ImportedItemField.AUTHOR: 'Greentiger', ImportedItemField.TITLE: 'Draft Horse', ImportedItemField.NUMBER: 2}
+        checksum = calculateChecksum([item1, item2])
+        self.assertEqual(checksum, calculateChecksum([dict(item1), dict(item2)]))
+        self.assertLess(checksum, 2 ** 64)
+
+        # Order, values and missing values change the checksum
+        self.assertNotEqual(checksum, calculateChecksum([item2, item1]))
+        self.assertNotEqual(checksum, calculateChecksum([item1, item1]))
+        self.assertNotEqual(checksum, calculateChecksum([item1]))
+        self.assertNotEqual(
+                calculateChecksum([{ImportedItemField.MEDIUM: ''}]),
+                calculateChecksum([{ImportedItemField.MEDIUM: None}]))
+
+if __name__ == '__main__':
+    unittest.main()
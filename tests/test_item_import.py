@@ -0,0 +1,89 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+import logging
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from artshowkeeper.common.result import Result
+from artshowkeeper.model.item import ImportedItemField
+from artshowkeeper.model.item_import import ImportValidator, processItemImport
+
+class TestItemImport(unittest.TestCase):
+    def setUpClass(cls):
+        logging.basicConfig(level=logging.DEBUG)
+
+    def setUp(self):
+        self.logger = logging.getLogger()
+
+    def createRawItems(self, count):
+        for i in range(count):
+            yield {
+                    ImportedItemField.NUMBER: str(i),
+                    ImportedItemField.AUTHOR: 'Greentiger',
+                    ImportedItemField.TITLE: 'Draft Horse {0}'.format(i) if i % 7 != 0 else '',
+                    ImportedItemField.INITIAL_AMOUNT: str(i * 10),
+                    ImportedItemField.CHARITY: str(i % 120)}
+
+    def test_processItemImport(self):
+        item = processItemImport(self.logger, {
+                ImportedItemField.NUMBER: '12',
+                ImportedItemField.AUTHOR: 'Greentiger',
+                ImportedItemField.TITLE: 'Draft Horse',
+                ImportedItemField.INITIAL_AMOUNT: '120',
+                ImportedItemField.CHARITY: '47'})
+        self.assertEqual(Result.SUCCESS, item[ImportedItemField.IMPORT_RESULT])
+        self.assertEqual(12, item[ImportedItemField.NUMBER])
+        self.assertEqual('120', item[ImportedItemField.INITIAL_AMOUNT])
+
+        item = processItemImport(self.logger, {
+                ImportedItemField.AUTHOR: 'Greentiger',
+                ImportedItemField.TITLE: 'Draft Horse',
+                ImportedItemField.INITIAL_AMOUNT: '120'})
+        self.assertEqual(Result.INCOMPLETE_SALE_INFO, item[ImportedItemField.IMPORT_RESULT])
+
+        item = processItemImport(self.logger, {ImportedItemField.NUMBER: 'A1'})
+        self.assertEqual(Result.INVALID_ITEM_NUMBER, item[ImportedItemField.IMPORT_RESULT])
+
+    def test_process(self):
+        expectedItems = list(ImportValidator(self.logger).process(self.createRawItems(230)))
+        self.assertEqual(230, len(expectedItems))
+        self.assertEqual(Result.INVALID_TITLE, expectedItems[7][ImportedItemField.IMPORT_RESULT])
+        self.assertEqual(Result.INVALID_CHARITY, expectedItems[101][ImportedItemField.IMPORT_RESULT])
+
+        # Parallel validation keeps the order of items
+        validator = ImportValidator(self.logger, workers=2, threshold=100, chunkSize=16)
+        try:
+            self.assertListEqual(expectedItems, list(validator.process(self.createRawItems(230))))
+
+            # Workers are kept for next imports
+            self.assertListEqual(expectedItems[:120], list(validator.process(self.createRawItems(120))))
+
+            # Small imports are validated serially
+            self.assertListEqual(expectedItems[:50], list(validator.process(self.createRawItems(50))))
+            self.assertListEqual([], list(validator.process([])))
+
+            # Workers are started again after they are stopped
+            validator.close()
+            self.assertListEqual(expectedItems, list(validator.process(self.createRawItems(230))))
+        finally:
+            validator.close()
+
+if __name__ == '__main__':
+    unittest.main()
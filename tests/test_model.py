@@ -15,6 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import unittest
+import shutil
 import logging
 import sys
 import os
@@ -31,7 +32,7 @@ from artshowkeeper.model.model import Model
 from artshowkeeper.model.dataset import Dataset
 from artshowkeeper.model.item import ItemState, ItemField, ImportedItemField
 from artshowkeeper.model.currency import Currency, CurrencyField
-from artshowkeeper.model.summary import SummaryField, Summary, DrawerSummaryField, ActorSummary
+from artshowkeeper.model.summary import SummaryField, Summary, DrawerSummaryField, TotalsField, ActorSummary
 
 class TestModel(unittest.TestCase):
     def setUpClass(cls):
@@ -73,6 +74,7 @@ class TestModel(unittest.TestCase):
         self.importFileTxt.clear()
         for file in self.testFiles:
             file.clear()
+        shutil.rmtree('import', ignore_errors=True)
 
         del self.model
         del self.currency
@@ -242,6 +244,29 @@ class TestModel(unittest.TestCase):
         charityAmount = self.model.getPotentialCharityAmount()
         self.assertEqual(charityAmount, Decimal('299'))
 
+    def test_getItemTotals(self):
+        def countStates():
+            stateCounts = {}
+            for item in self.model.getAllItems():
+                stateCounts[item[ItemField.STATE]] = stateCounts.get(item[ItemField.STATE], 0) + 1
+            return stateCounts
+        def sumPotentialCharity():
+            return sum(self.model.getItemPotentialNetAmount(item)[1] for item in self.model.getAllPontentiallySoldItems())
+
+        totals = self.model.getItemTotals()
+        self.assertEqual(Decimal('299'), totals[TotalsField.POTENTIAL_CHARITY_AMOUNT])
+        self.assertLess(totals[TotalsField.POTENTIAL_CHARITY_AMOUNT], totals[TotalsField.POTENTIAL_GROSS_AMOUNT])
+        self.assertDictEqual(countStates(), totals[TotalsField.STATE_COUNTS])
+
+        # Totals follow changes of items
+        self.assertTrue(self.model.reconciliateBadge(1))
+        self.assertEqual(Result.SUCCESS, self.model.closeItemAsSold('55', Decimal(100), 3))
+        self.assertTrue(self.model.deleteItems(['A11']))
+        totals = self.model.getItemTotals()
+        self.assertEqual(sumPotentialCharity(), totals[TotalsField.POTENTIAL_CHARITY_AMOUNT])
+        self.assertDictEqual(countStates(), totals[TotalsField.STATE_COUNTS])
+        self.assertTrue(self.model.verifyItemTotals())
+
     def test_getBadgeReconciliationSummary(self):
         # Owner that has no delivered item
         self.logger.info('Badge 1')
@@ -315,6 +340,23 @@ class TestModel(unittest.TestCase):
         self.assertEqual(len(summary[SummaryField.PENDING_SOLD_ITEMS]), 0)
         self.assertEqual(len(summary[SummaryField.DELIVERED_SOLD_ITEMS]), 0)
 
+    def test_getBadgeReconciliationSummary_Cache(self):
+        # Summary can be modified by a caller
+        summary = self.model.getBadgeReconciliationSummary(1)
+        checksum = Summary.calculateChecksum(summary)
+        summary[SummaryField.AVAILABLE_BOUGHT_ITEMS][0][ItemField.AMOUNT] = Decimal(1000)
+        summary[SummaryField.AVAILABLE_UNSOLD_ITEMS].clear()
+        summary = self.model.getBadgeReconciliationSummary('1')
+        self.assertEqual(checksum, Summary.calculateChecksum(summary))
+        self.assertEqual(2, len(summary[SummaryField.AVAILABLE_UNSOLD_ITEMS]))
+        self.assertNotEqual(Decimal(1000), summary[SummaryField.AVAILABLE_BOUGHT_ITEMS][0][ItemField.AMOUNT])
+
+        # Summary is calculated again when an item changes
+        unsoldItem = summary[SummaryField.AVAILABLE_UNSOLD_ITEMS][0]
+        self.assertTrue(self.model.deleteItems([unsoldItem[ItemField.CODE]]))
+        summary = self.model.getBadgeReconciliationSummary(1)
+        self.assertEqual(1, len(summary[SummaryField.AVAILABLE_UNSOLD_ITEMS]))
+
     def test_reconciliateBadge(self):
         # Badge 1 contains:
         # * sold item which has not been paid for (code: A2)
@@ -433,6 +475,76 @@ class TestModel(unittest.TestCase):
         result, skippedItems, renumberedItems = self.model.applyImport(sessionID, importedChecksum + 50, defaultOwner)
         self.assertEqual(result, Result.INVALID_CHECKSUM)
 
+    def importCsvRows(self, rows):
+        """Import CSV rows (without a header).
+        Returns:
+            (import results, titles, indexes of duplicate items) in the order of the import.
+        """
+        binaryStream = io.BytesIO('\n'.join(rows).encode('utf-8'))
+        importedItems, importedChecksum = self.model.importCSVFile(11111, binaryStream, headerRow=False)
+        results = [item[ImportedItemField.IMPORT_RESULT] for item in importedItems]
+        titles = [item[ImportedItemField.TITLE] for item in importedItems]
+        duplicates = [index for index, result in enumerate(results) if result == Result.DUPLICATE_ITEM]
+        return results, titles, duplicates
+
+    def test_importItemsFromCsv_DuplicateAuthorTitle(self):
+        results, titles, duplicates = self.importCsvRows([
+                ',,Greentiger,Smooth Frog,,,120,47',
+                ',,Greenfox,Fox Forever,,,100,10',
+                ',,GREENFOX,fox forever,,Charity error,50,500',
+                ',,GREENTIGER,smooth frog,,,300,10',
+                ',,Redwolf,Eastern Dragon,,,,',
+                ',,Greenfox,,,Missing title,400,0',
+                ',,greentiger,Smooth FROG,,,,'])
+
+        # Items which are not imported successfully are not duplicates
+        self.assertListEqual([
+                        Result.DUPLICATE_ITEM,
+                        Result.SUCCESS,
+                        Result.INVALID_CHARITY,
+                        Result.DUPLICATE_ITEM,
+                        Result.SUCCESS,
+                        Result.INVALID_TITLE,
+                        Result.DUPLICATE_ITEM],
+                results)
+        self.assertListEqual([0, 3, 6], duplicates)
+        self.assertListEqual(
+                ['Smooth Frog', 'Fox Forever', 'fox forever', 'smooth frog', 'Eastern Dragon', None, 'Smooth FROG'],
+                titles)
+
+    def test_importItemsFromCsv_DuplicateImportNumber(self):
+        rows = [
+                '5,7,Redpanda,Moon,,,,',
+                '6,7,Redpanda,Sun,,,,',
+                '5,7,Redpanda,Star,,,,',
+                '5,7,Redpanda,,,Missing title,,',
+                '6,7,Redpanda,Sky,,Amount error,-10,10',
+                '8,7,Redpanda,MOON,,,,',
+                '9,7,Redpanda,Day,,,,',
+                '10,7,Redpanda,Night,,,,',
+                '9,7,Redpanda,Noon,,,,']
+        results, titles, duplicates = self.importCsvRows(rows)
+
+        # Items match by import number or by author and title
+        self.assertListEqual([
+                        Result.DUPLICATE_ITEM,
+                        Result.SUCCESS,
+                        Result.DUPLICATE_ITEM,
+                        Result.INVALID_TITLE,
+                        Result.INVALID_AMOUNT,
+                        Result.DUPLICATE_ITEM,
+                        Result.DUPLICATE_ITEM,
+                        Result.SUCCESS,
+                        Result.DUPLICATE_ITEM],
+                results)
+        self.assertListEqual([0, 2, 5, 6, 8], duplicates)
+        self.assertListEqual(
+                ['Moon', 'Sun', 'Star', None, 'Sky', 'MOON', 'Day', 'Night', 'Noon'],
+                titles)
+
+        # Repeated import gives the same result
+        self.assertTupleEqual((results, titles, duplicates), self.importCsvRows(rows))
+
     def test_importItemsFromCsv_ImportNumberReuse(self):
         # Verify next code. This is crucial for the last test.
         NEXT_AVAILABLE_CODE = 57
@@ -581,6 +693,26 @@ class TestModel(unittest.TestCase):
         self.assertIsNone(self.model.sendItemToAuction('A13'))
         self.assertIsNone(self.model.getItemInAuction())
 
+    def test_waitForAuctionChange(self):
+        version = self.model.waitForAuctionChange(None, 0)
+        self.assertEqual(version, self.model.waitForAuctionChange(version, 0))
+
+        # Each change of the auction is notified
+        for change in [
+                lambda: self.assertIsNotNone(self.model.sendItemToAuction('A10')),
+                lambda: self.assertTrue(self.model.updateItemInAuction(Decimal(200))),
+                lambda: self.assertTrue(self.model.sellItemInAuction(13)),
+                lambda: self.model.clearAuction(),
+                lambda: self.assertEqual(Result.SUCCESS, self.model.closeItemAsSold('55', Decimal(100), 3))]:
+            change()
+            newVersion = self.model.waitForAuctionChange(version, 0)
+            self.assertNotEqual(version, newVersion)
+            version = newVersion
+
+        # Sessions of users are not shown in the status
+        self.model.startNewSession(UserGroups.ADMIN, '127.0.0.1')
+        self.assertEqual(version, self.model.waitForAuctionChange(version, 0))
+
     def test_closeItemAsNotSold(self):
         # Close item
         self.assertEqual(Result.SUCCESS, self.model.closeItemAsNotSold('55'))
@@ -629,6 +761,29 @@ class TestModel(unittest.TestCase):
                 ['A9', 'A10'],
                 [item[ItemField.CODE] for item in auctionItems]);
 
+    def test_getAllItemsInAuction_Cache(self):
+        def getAuctionSortCodes():
+            return {item[ItemField.CODE]: item[ItemField.AUCTION_SORT_CODE] for item in self.model.getAllItemsInAuction()}
+
+        self.assertListEqual(['A10', 'A9'], sorted(getAuctionSortCodes()))
+
+        # Item entering the auction is ordered
+        self.assertEqual(Result.SUCCESS, self.model.closeItemIntoAuction('55', Decimal(1000), 9999, None))
+        auctionSortCodes = getAuctionSortCodes()
+        self.assertListEqual([1, 2, 3], sorted(auctionSortCodes.values()))
+
+        # Items leaving the auction do not change order of the remaining items
+        self.assertIsNotNone(self.model.sendItemToAuction('A10'))
+        self.assertTrue(self.model.sellItemInAuction(9999))
+        del auctionSortCodes['A10']
+        self.assertDictEqual(auctionSortCodes, getAuctionSortCodes())
+
+        # Changed item is ordered again
+        self.assertEqual(Result.SUCCESS, self.model.updateItem(
+                '55', owner=1, title='Changed', author='Changed', medium=None, state=ItemState.IN_AUCTION,
+                initialAmount='1', charity='10', amount='1', buyer='9999', note=None))
+        self.assertListEqual([1, 2], sorted(getAuctionSortCodes().values()))
+
     def test_getAllItemsInAuction_Ordering(self):
         datasetAuction = Dataset(
                 self.logger, './',
@@ -698,6 +853,35 @@ class TestModel(unittest.TestCase):
         self.assertEqual(UserGroups.UNKNOWN, self.model.getSessionUserGroup(sessionID))
 
 
+    def test_openRequestSession(self):
+        # Local request gets a new admin session which is renewed later
+        localSessionID, userGroup, userIP = self.model.openRequestSession(None, '127.0.0.1')
+        self.assertTrue(self.model.findSession(localSessionID))
+        self.assertEqual((UserGroups.ADMIN, '127.0.0.1'), (userGroup, userIP))
+        self.assertEqual(
+                (localSessionID, UserGroups.ADMIN, '127.0.0.1'),
+                self.model.openRequestSession(localSessionID, '127.0.0.1'))
+
+        # Remote request gets a new session of the group UNKNOWN
+        sessionID, userGroup, userIP = self.model.openRequestSession(None, '192.168.0.1')
+        self.assertNotEqual(localSessionID, sessionID)
+        self.assertEqual((UserGroups.UNKNOWN, '192.168.0.1'), (userGroup, userIP))
+
+        # Session remembers last IP
+        self.assertEqual(
+                (sessionID, UserGroups.UNKNOWN, '192.168.0.2'),
+                self.model.openRequestSession(sessionID, '192.168.0.2'))
+
+        # Local session used remotely is kept but it is dropped when used locally again
+        self.assertEqual(
+                (localSessionID, UserGroups.ADMIN, '192.168.0.3'),
+                self.model.openRequestSession(localSessionID, '192.168.0.3'))
+        newSessionID, userGroup, userIP = self.model.openRequestSession(localSessionID, '127.0.0.1')
+        self.assertNotEqual(localSessionID, newSessionID)
+        self.assertFalse(self.model.findSession(localSessionID))
+        self.assertEqual((UserGroups.ADMIN, '127.0.0.1'), (userGroup, userIP))
+
+
 
 if __name__ == '__main__':
     unittest.main()
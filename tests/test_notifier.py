@@ -0,0 +1,50 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+import sys
+import os
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from artshowkeeper.model.notifier import ChangeNotifier
+
+class TestChangeNotifier(unittest.TestCase):
+    def test_wait(self):
+        notifier = ChangeNotifier()
+        version = notifier.version()
+
+        # Unknown version returns immediately, known version times out
+        self.assertEqual(version, notifier.wait(None, 10))
+        started = time.monotonic()
+        self.assertEqual(version, notifier.wait(version, 0.05))
+        self.assertLessEqual(0.05, time.monotonic() - started)
+
+        # Waiting thread is woken up by a change
+        result = []
+        thread = threading.Thread(target=lambda: result.append(notifier.wait(version, 10)))
+        thread.start()
+        time.sleep(0.05)
+        notifier.notify()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertListEqual([version + 1], result)
+        self.assertEqual(version + 1, notifier.wait(version, 10))
+
+if __name__ == '__main__':
+    unittest.main()
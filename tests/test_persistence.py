@@ -0,0 +1,112 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+import logging
+import sys
+import os
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from artshowkeeper.model.persistence import PersistenceScheduler, PersistencePolicy
+
+class DatasetMock:
+    def __init__(self):
+        self.numMutations = 0
+        self.numPersisted = 0
+        self.persisted = threading.Event()
+
+    def mutate(self):
+        self.numMutations = self.numMutations + 1
+
+    def changed(self):
+        return True
+
+    def mutations(self):
+        return self.numMutations
+
+    def persist(self):
+        self.numPersisted = self.numPersisted + 1
+        self.persisted.set()
+
+class TestPersistence(unittest.TestCase):
+    def setUpClass(cls):
+        logging.basicConfig(level=logging.DEBUG)
+
+    def setUp(self):
+        self.logger = logging.getLogger()
+        self.dataset = DatasetMock()
+
+    def test_immediate(self):
+        scheduler = PersistenceScheduler(self.logger, self.dataset)
+        scheduler.start()
+        scheduler.notify()
+        scheduler.notify()
+        self.assertEqual(2, self.dataset.numPersisted)
+        scheduler.stop()
+        self.assertEqual(3, self.dataset.numPersisted)
+
+    def test_unknownPolicy(self):
+        with self.assertRaises(ValueError):
+            PersistenceScheduler(self.logger, self.dataset, policy='never')
+
+    def test_mutations(self):
+        scheduler = PersistenceScheduler(self.logger, self.dataset, policy=PersistencePolicy.MUTATIONS, mutations=3)
+        scheduler.start()
+        try:
+            self.dataset.mutate()
+            self.dataset.mutate()
+            scheduler.notify()
+            self.assertFalse(self.dataset.persisted.wait(0.1))
+
+            self.dataset.mutate()
+            scheduler.notify()
+            self.assertTrue(self.dataset.persisted.wait(5))
+        finally:
+            scheduler.stop()
+
+    def test_interval(self):
+        scheduler = PersistenceScheduler(self.logger, self.dataset, policy=PersistencePolicy.INTERVAL, interval=20)
+        scheduler.start()
+        try:
+            scheduler.notify()
+            self.assertEqual(0, self.dataset.numPersisted)
+            self.assertTrue(self.dataset.persisted.wait(5))
+        finally:
+            scheduler.stop()
+
+    def test_idle(self):
+        scheduler = PersistenceScheduler(self.logger, self.dataset, policy=PersistencePolicy.IDLE, interval=200)
+        scheduler.start()
+        try:
+            # Nothing is persisted while requests keep coming
+            for i in range(5):
+                scheduler.notify()
+                time.sleep(0.02)
+            self.assertEqual(0, self.dataset.numPersisted)
+            self.assertTrue(self.dataset.persisted.wait(5))
+
+            # Nothing more is persisted if there is no request
+            numPersisted = self.dataset.numPersisted
+            time.sleep(0.5)
+            self.assertEqual(numPersisted, self.dataset.numPersisted)
+        finally:
+            scheduler.stop()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+import logging
+import sys
+import os
+import io
+from multiprocessing.reduction import ForkingPickler
+from werkzeug.datastructures import FileStorage
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tests.datafile import Datafile
+from artshowkeeper.common.authentication import UserGroups
+from artshowkeeper.model.model import Model
+from artshowkeeper.model.dataset import Dataset
+from artshowkeeper.model.currency import Currency
+from artshowkeeper.model.item import ItemField
+from artshowkeeper.model.persistence import PersistenceScheduler
+from artshowkeeper.model.remote import ModelServer, connectModel
+
+class TestRemote(unittest.TestCase):
+    def setUpClass(cls):
+        logging.basicConfig(level=logging.DEBUG)
+
+    def setUp(self):
+        self.logger = logging.getLogger()
+
+        self.itemFile = Datafile('test.model.items.xml', self.id())
+        self.sessionFile = Datafile('test.model.session.xml', self.id())
+        self.currencyFile = Datafile('test.model.currency.xml', self.id())
+        self.importFileCsv = Datafile('test.model.import.csv', self.id())
+
+        self.dataset = Dataset(
+                self.logger, './',
+                self.sessionFile.getFilename(),
+                self.itemFile.getFilename(),
+                self.currencyFile.getFilename())
+        self.dataset.restore()
+        self.model = Model(
+                self.logger,
+                self.dataset,
+                Currency(self.logger, self.dataset, currencyCodes=['czk', 'eur']))
+
+        self.server = ModelServer(self.model, PersistenceScheduler(self.logger, self.dataset))
+        self.server.start()
+        self.remoteModel, self.remoteScheduler = connectModel(self.server.address())
+
+    def tearDown(self):
+        self.server.stop()
+        self.itemFile.clear()
+        self.sessionFile.clear()
+        self.currencyFile.clear()
+        self.importFileCsv.clear()
+
+    def test_calls(self):
+        # Reads
+        self.assertDictEqual(self.model.getItem('A10'), self.remoteModel.getItem('A10'))
+        self.assertListEqual(self.model.getCurrency().getInfo(), self.remoteModel.getCurrency().getInfo())
+        self.remoteScheduler.notify()
+
+        # Changes are made in the process of the server
+        sessionID, userGroup, userIP = self.remoteModel.openRequestSession(None, '127.0.0.1')
+        self.assertEqual(UserGroups.ADMIN, userGroup)
+        self.assertTrue(self.model.findSession(sessionID))
+
+        version = self.remoteModel.waitForAuctionChange(None, 0)
+        self.assertIsNotNone(self.remoteModel.sendItemToAuction('A10'))
+        self.assertEqual('A10', self.model.getItemInAuction()[ItemField.CODE])
+        self.assertNotEqual(version, self.remoteModel.waitForAuctionChange(version, 1))
+
+    def test_importCSVFile(self):
+        with io.open(self.importFileCsv.getFilename(), mode='rb') as stream:
+            importedItems, importedChecksum = self.remoteModel.importCSVFile(11111, stream)
+        self.assertEqual(13, len(importedItems))
+
+    def test_reduceFileStorage(self):
+        stream = io.BytesIO(b'JPEG')
+        fileStorage = FileStorage(stream, 'image.jpg', 'ImageFile', 'image/jpeg')
+        copy = ForkingPickler.loads(ForkingPickler.dumps(fileStorage))
+        self.assertEqual('image.jpg', copy.filename)
+        self.assertEqual('image/jpeg', copy.content_type)
+        self.assertEqual(b'JPEG', copy.read())
+        self.assertEqual(0, stream.tell())
+
+if __name__ == '__main__':
+    unittest.main()
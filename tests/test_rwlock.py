@@ -0,0 +1,93 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+import sys
+import os
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from artshowkeeper.model.rwlock import ReadWriteLock
+
+class TestReadWriteLock(unittest.TestCase):
+    def test_concurrentReaders(self):
+        lock = ReadWriteLock()
+        barrier = threading.Barrier(3, timeout=1)
+        def read():
+            with lock.reading():
+                barrier.wait()
+
+        # All readers hold the lock at once, otherwise the barrier breaks
+        threads = [threading.Thread(target=read) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        for thread in threads:
+            thread.join(1)
+
+    def test_exclusiveWriter(self):
+        lock = ReadWriteLock()
+        events = []
+        def write(name):
+            with lock.writing():
+                events.append(name + ' start')
+                time.sleep(0.02)
+                events.append(name + ' end')
+        def read():
+            with lock.reading():
+                events.append('read')
+
+        lock.acquireRead()
+        threads = [threading.Thread(target=write, args=('write1', )), threading.Thread(target=write, args=('write2', ))]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+
+        # Writers wait for the reader and new readers wait for the writers
+        reader = threading.Thread(target=read)
+        reader.start()
+        time.sleep(0.05)
+        self.assertListEqual([], events)
+        lock.releaseRead()
+        for thread in threads + [reader]:
+            thread.join(1)
+        self.assertEqual(5, len(events))
+        self.assertEqual('read', events[4])
+        self.assertEqual(events[0].split()[0], events[1].split()[0])
+        self.assertEqual(events[2].split()[0], events[3].split()[0])
+
+    def test_reentrancy(self):
+        lock = ReadWriteLock()
+        with lock.writing():
+            with lock.writing():
+                with lock.reading():
+                    pass
+        with lock.reading():
+            with lock.reading():
+                with self.assertRaises(RuntimeError):
+                    lock.acquireWrite()
+
+        # Lock is free again
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(lock.acquireWrite()))
+        thread.start()
+        thread.join(1)
+        self.assertEqual(1, len(acquired))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+import sys
+import os
+import time
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from artshowkeeper.common.server import createServer, createListener
+from artshowkeeper.model.rwlock import ReadWriteLock
+
+REQUEST_SECONDS = 0.02
+REQUESTS = 24
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.lock = ReadWriteLock()
+        self.writes = 0
+
+    def app(self, environ, start_response):
+        # Reads take a while (e.g. rendering a page) and run concurrently
+        if environ['PATH_INFO'] == '/write':
+            with self.lock.writing():
+                self.writes = self.writes + 1
+        else:
+            with self.lock.reading():
+                time.sleep(REQUEST_SECONDS)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'OK']
+
+    def measureThroughput(self, threads, paths):
+        """Get number of requests per second served by a server with a given number of threads."""
+        server = createServer(self.app, '127.0.0.1', 0, threads, useWaitress=False)
+        serverThread = threading.Thread(target=server.run)
+        serverThread.start()
+        try:
+            def get(path):
+                with urllib.request.urlopen('http://127.0.0.1:{0}{1}'.format(server.port, path), timeout=10) as response:
+                    return response.read()
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(get, paths))
+            elapsed = time.monotonic() - started
+        finally:
+            server.close()
+            serverThread.join(1)
+        self.assertListEqual([b'OK'] * len(paths), results)
+        return len(paths) / elapsed
+
+    def test_throughputScaling(self):
+        paths = ['/read'] * REQUESTS
+        singleThroughput = self.measureThroughput(1, paths)
+        multiThroughput = self.measureThroughput(4, paths)
+        self.assertLess(2 * singleThroughput, multiThroughput)
+
+    def test_serializedWrites(self):
+        paths = ['/read', '/write'] * REQUESTS
+        self.measureThroughput(4, paths)
+        self.assertEqual(REQUESTS, self.writes)
+
+    def test_sharedListener(self):
+        # Servers (e.g. in worker processes) serve the same socket
+        listener = createListener('127.0.0.1', 0)
+        servers = [createServer(self.app, None, None, 1, useWaitress=False, listener=listener) for i in range(2)]
+        serverThreads = [threading.Thread(target=server.run) for server in servers]
+        for serverThread in serverThreads:
+            serverThread.start()
+        try:
+            url = 'http://127.0.0.1:{0}/write'.format(listener.getsockname()[1])
+            for i in range(4):
+                with urllib.request.urlopen(url, timeout=10) as response:
+                    self.assertEqual(b'OK', response.read())
+        finally:
+            for server in servers:
+                server.close()
+            for serverThread in serverThreads:
+                serverThread.join(1)
+        self.assertEqual(4, self.writes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+import logging
+import sys
+import os
+import threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tests.datafile import Datafile
+from artshowkeeper.model.table import Table
+from artshowkeeper.model.session import SessionStore, SessionSweeper, Field, StatisticsField
+
+class TestSession(unittest.TestCase):
+    def setUpClass(cls):
+        logging.basicConfig(level=logging.DEBUG)
+
+    def setUp(self):
+        self.logger = logging.getLogger()
+        self.sessionFile = Datafile('test.model.session.xml', self.id())
+        self.store = SessionStore(self.logger, self.createTable())
+
+    def tearDown(self):
+        self.sessionFile.clear()
+        del self.store
+
+    def createTable(self):
+        return Table(self.logger, self.sessionFile.getFilename(), 'SessionDictionary', 'KeyValuePair', ['SessionID', 'Key', 'Value'])
+
+    def test_sweep(self):
+        now = datetime(2014, 2, 16, 12, 0, 0, 1)
+        self.store.update(1, **{Field.CREATED_TIMESTAMP: now, Field.VALID_UNTIL_TIMESTAMP: now + timedelta(hours=1)})
+        self.store.update(2, **{Field.CREATED_TIMESTAMP: now, Field.VALID_UNTIL_TIMESTAMP: now + timedelta(hours=2)})
+        self.store.update(3, **{Field.CREATED_TIMESTAMP: now})
+        self.store.update(SessionStore.GLOBAL_SESSION_ID, ItemCodeInAuction='A2')
+
+        # Sessions without a valid timestamp are dropped immediately
+        self.assertListEqual([3], self.store.sweep(now))
+        self.assertListEqual([1, 2], sorted(self.store.getSessionIDs()))
+
+        # Renewed session does not expire
+        self.store.update(1, **{Field.VALID_UNTIL_TIMESTAMP: now + timedelta(hours=3)})
+        self.assertListEqual([2], self.store.sweep(now + timedelta(hours=2)))
+        self.assertListEqual([1], self.store.sweep(now + timedelta(hours=3)))
+        self.assertListEqual([], self.store.getSessionIDs())
+        self.assertEqual('A2', self.store.getValue(SessionStore.GLOBAL_SESSION_ID, 'ItemCodeInAuction'))
+
+        # Shortened validity is respected
+        self.store.update(4, **{Field.VALID_UNTIL_TIMESTAMP: now + timedelta(hours=2)})
+        self.store.update(4, **{Field.VALID_UNTIL_TIMESTAMP: now + timedelta(hours=1)})
+        self.assertListEqual([4], self.store.sweep(now + timedelta(hours=1)))
+
+    def test_findValid(self):
+        now = datetime(2014, 2, 16, 12, 0, 0, 1)
+        self.store.update(1, **{Field.VALID_UNTIL_TIMESTAMP: now + timedelta(hours=1)})
+        self.assertIsNotNone(self.store.findValid(1, now))
+
+        # Expired session is not found even before it is swept
+        self.assertIsNone(self.store.findValid(1, now + timedelta(hours=1)))
+        self.assertIsNotNone(self.store.find(1))
+
+    def test_statistics(self):
+        now = datetime(2014, 2, 16, 12, 0, 0, 1)
+        self.store.update(1, **{Field.VALID_UNTIL_TIMESTAMP: now})
+        self.store.update(2, **{Field.VALID_UNTIL_TIMESTAMP: now + timedelta(hours=1)})
+        self.store.sweep(now)
+        self.store.sweep(now)
+        statistics = self.store.getStatistics()
+        self.assertEqual(1, statistics[StatisticsField.SESSIONS])
+        self.assertEqual(2, statistics[StatisticsField.SWEEPS])
+        self.assertEqual(1, statistics[StatisticsField.SWEPT_SESSIONS])
+        self.assertGreaterEqual(statistics[StatisticsField.SWEEP_TIME], 0)
+
+    def test_sweeper(self):
+        swept = threading.Event()
+        class ModelMock:
+            def sweepSessions(self):
+                swept.set()
+        sweeper = SessionSweeper(self.logger, ModelMock(), interval=0.05)
+        sweeper.start()
+        try:
+            self.assertTrue(swept.wait(5))
+        finally:
+            sweeper.stop()
+
+    def test_snapshot(self):
+        self.assertTrue(self.store.load())
+        self.assertEqual('K11,K92,K95,K64,K89,K36,K68,', self.store.getValue(1051183055, Field.ADDED_ITEM_CODES))
+        self.assertFalse(self.store.changed())
+
+        validUntil = datetime(2014, 2, 16, 12, 0, 0, 1)
+        self.store.update(1051183055, **{Field.VALID_UNTIL_TIMESTAMP: validUntil})
+        self.store.update(7, Language='cz')
+        self.store.save()
+        self.assertFalse(self.store.changed())
+
+        store = SessionStore(self.logger, self.createTable())
+        self.assertTrue(store.load())
+        self.assertDictEqual(
+                {key: str(value) for key, value in self.store.getPairs(1051183055).items()},
+                store.getPairs(1051183055))
+        self.assertEqual(validUntil, store.find(1051183055).validUntil)
+        self.assertEqual('cz', store.getValue(7, 'Language'))
+
+        # Dropping the last pair drops the session
+        store.update(7, Language=None)
+        self.assertIsNone(store.find(7))
+
+if __name__ == '__main__':
+    unittest.main()
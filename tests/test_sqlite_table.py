@@ -0,0 +1,216 @@
+# Artshow Keeper: A support tool for keeping an Artshow running.
+# Copyright (C) 2014  Ivo Hanak
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+import logging
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tests.datafile import Datafile
+from artshowkeeper.model.item import ItemField
+from artshowkeeper.model.table import Table
+from artshowkeeper.model.sqlite_table import SqliteDatabase, SqliteTable
+from artshowkeeper.model.dataset import Dataset, Storage
+
+class TestSqliteTable(unittest.TestCase):
+    def setUpClass(cls):
+        logging.basicConfig(level=logging.DEBUG)
+
+    def setUp(self):
+        self.logger = logging.getLogger()
+        self.dataFile = Datafile('test.model.items.xml', self.id())
+        self.databaseFilename = os.path.join(self.dataFile.path, 'test.model{0}.sqlite'.format(self.id()))
+        self.database = SqliteDatabase(self.logger, self.databaseFilename)
+        self.table = self.createTable(self.database)
+
+        # Fill the table by the same rows as the XML table
+        self.xmlTable = Table(self.logger, self.dataFile.getFilename(), 'ArtShowItems', 'Item', ItemField.ALL_PERSISTENT)
+        self.xmlTable.load()
+        for row in self.xmlTable.select(ItemField.ALL_PERSISTENT):
+            self.table.insert(row, None)
+        self.table.save()
+
+    def tearDown(self):
+        self.database.close()
+        self.dataFile.clear()
+        for suffix in ['', '-wal', '-shm']:
+            if os.path.isfile(self.databaseFilename + suffix):
+                os.remove(self.databaseFilename + suffix)
+
+    def createTable(self, database, converter=None):
+        table = SqliteTable(self.logger, database, 'ArtShowItems', 'Item', ItemField.ALL_PERSISTENT, converter=converter)
+        table.createIndex([ItemField.CODE], unique=True)
+        table.createIndex([ItemField.STATE])
+        return table
+
+    def test_select(self):
+        self.assertEqual(self.xmlTable.len(), self.table.len())
+        for expression in [
+                None,
+                ('Code', '==', 'A2'),
+                ('Buyer', '==', None),
+                ('Buyer', '!=', None),
+                ('Buyer', '!=', '100'),
+                [('Owner', '==', '1'), ('State', 'in', ['SOLD', 'ON_SALE'])],
+                ('State', 'not in', ['SOLD', None]),
+                ('Buyer', 'in', ['100', None]),
+                ('Buyer', 'not in', ['100']),
+                ('Code', '<', 'A5'),
+                ('Code', 'in', []),
+                ('Owner', 'is', '1'),
+                'Owner == "1" and Title is not None',
+                'Code == "A2" or Code == "A3"']:
+            self.assertListEqual(
+                    self.xmlTable.select(ItemField.ALL_PERSISTENT, expression),
+                    self.table.select(ItemField.ALL_PERSISTENT, expression),
+                    'Expression: {0}'.format(expression))
+            self.assertEqual(self.xmlTable.count(expression), self.table.count(expression))
+
+        # Unknown columns behave as in the XML table
+        with self.assertRaises(NameError):
+            self.table.select([ItemField.CODE], 'Unknown == 1')
+
+    def test_update(self):
+        self.assertEqual(1, self.table.update({ItemField.STATE: 'SOLD', ItemField.AMOUNT: 10}, (ItemField.CODE, '==', 'A2')))
+        self.assertListEqual(
+                [{ItemField.STATE: 'SOLD', ItemField.AMOUNT: '10'}],
+                self.table.select([ItemField.STATE, ItemField.AMOUNT], (ItemField.CODE, '==', 'A2')))
+        self.assertEqual(0, self.table.update({ItemField.STATE: 'SOLD'}, (ItemField.CODE, '==', 'Z99')))
+        self.assertTrue(self.table.changed())
+
+        # Unique index refuses duplicates
+        self.assertFalse(self.table.insert({ItemField.CODE: 'A2'}, None))
+        self.assertFalse(self.table.insert({ItemField.CODE: 'A2'}, ItemField.CODE))
+        self.assertTrue(self.table.insert({ItemField.CODE: 'Z1', ItemField.OWNER: '7'}, ItemField.CODE))
+
+        numRows = self.table.len()
+        self.assertEqual(1, self.table.delete([(ItemField.CODE, '==', 'Z1'), (ItemField.OWNER, 'is', '7')]))
+        self.assertEqual(numRows - 1, self.table.len())
+
+    def test_saveRollback(self):
+        self.table.update({ItemField.STATE: 'SOLD'}, (ItemField.CODE, '==', 'A2'))
+        self.table.save()
+        self.assertFalse(self.table.changed())
+        self.table.update({ItemField.STATE: 'DELIVERED'}, (ItemField.CODE, '==', 'A2'))
+        self.database.rollback()
+
+        self.database.close()
+        self.database = SqliteDatabase(self.logger, self.databaseFilename)
+        table = self.createTable(self.database)
+        self.assertListEqual(
+                [{ItemField.STATE: 'SOLD'}],
+                table.select([ItemField.STATE], (ItemField.CODE, '==', 'A2')))
+
+    def test_batch(self):
+        expectedRows = self.table.select(ItemField.ALL_PERSISTENT)
+        self.table.begin()
+        self.assertTrue(self.table.insert({ItemField.CODE: 'Z1'}, ItemField.CODE))
+        self.assertEqual(1, self.table.delete((ItemField.CODE, '==', 'A2')))
+        self.table.rollback()
+        self.assertListEqual(expectedRows, self.table.select(ItemField.ALL_PERSISTENT))
+        self.assertFalse(self.table.changed())
+
+        self.table.begin()
+        self.assertTrue(self.table.insert({ItemField.CODE: 'Z1'}, ItemField.CODE))
+        self.table.commit()
+        self.assertTrue(self.table.changed())
+        self.assertEqual(1, self.table.count((ItemField.CODE, '==', 'Z1')))
+
+    def test_selectConverted(self):
+        table = self.createTable(self.database, converter=lambda row: dict(row) if row[ItemField.OWNER] is not None else None)
+        items = {item[ItemField.CODE]: item for item in table.selectConverted((ItemField.CODE, 'in', ['A2', 'A3']))}
+        self.assertEqual(2, len(items))
+        self.assertIs(items['A2'], table.selectConverted((ItemField.CODE, '==', 'A2'))[0])
+
+        table.update({ItemField.STATE: 'SOLD'}, (ItemField.CODE, '==', 'A2'))
+        item = table.selectConverted((ItemField.CODE, '==', 'A2'))[0]
+        self.assertIsNot(items['A2'], item)
+        self.assertEqual('SOLD', item[ItemField.STATE])
+
+    def test_aggregate(self):
+        def countByState(row):
+            return {row[ItemField.STATE]: 1} if row[ItemField.STATE] is not None else None
+        xmlAggregate = self.xmlTable.createAggregate([ItemField.STATE], countByState)
+        aggregate = self.table.createAggregate([ItemField.STATE], countByState)
+        self.assertDictEqual(self.xmlTable.aggregate(xmlAggregate), self.table.aggregate(aggregate))
+
+        # Totals are calculated again after a change
+        self.xmlTable.update({ItemField.STATE: 'DLVR'}, (ItemField.CODE, '==', 'A2'))
+        self.table.update({ItemField.STATE: 'DLVR'}, (ItemField.CODE, '==', 'A2'))
+        self.assertDictEqual(
+                {state: count for state, count in self.xmlTable.aggregate(xmlAggregate).items() if count != 0},
+                self.table.aggregate(aggregate))
+
+class TestSqliteDataset(unittest.TestCase):
+    def setUpClass(cls):
+        logging.basicConfig(level=logging.DEBUG)
+
+    def setUp(self):
+        self.logger = logging.getLogger()
+        self.itemFile = Datafile('test.model.items.xml', self.id())
+        self.sessionFile = Datafile('test.model.session.xml', self.id())
+        self.currencyFile = Datafile('test.model.currency.xml', self.id())
+        self.path = self.itemFile.path
+        self.databaseFilename = os.path.join(self.path, 'test.model{0}.sqlite'.format(self.id()))
+
+    def tearDown(self):
+        self.itemFile.clear()
+        self.sessionFile.clear()
+        self.currencyFile.clear()
+        for filename in [os.path.join(self.path, 'attendees.xml'), os.path.join(self.path, 'attendees.xml.bak')]:
+            if os.path.isfile(filename):
+                os.remove(filename)
+        for suffix in ['', '-wal', '-shm']:
+            if os.path.isfile(self.databaseFilename + suffix):
+                os.remove(self.databaseFilename + suffix)
+
+    def createDataset(self, storage):
+        return Dataset(
+                self.logger, self.path,
+                os.path.basename(self.sessionFile.getFilename()),
+                os.path.basename(self.itemFile.getFilename()),
+                os.path.basename(self.currencyFile.getFilename()),
+                storage=storage,
+                databaseFilename=os.path.basename(self.databaseFilename))
+
+    def test_migrateExport(self):
+        xmlDataset = self.createDataset(Storage.XML)
+        xmlDataset.restore()
+        dataset = self.createDataset(Storage.SQLITE)
+        dataset.restore()
+        self.assertListEqual(xmlDataset.getItems(None), dataset.getItems(None))
+        self.assertListEqual(xmlDataset.getCurrencyInfo(['czk', 'eur']), dataset.getCurrencyInfo(['czk', 'eur']))
+        self.assertDictEqual(xmlDataset.getSessionPairs(1051183055), dataset.getSessionPairs(1051183055))
+
+        # Changes are kept in the database and exported to XML
+        self.assertTrue(dataset.updateItem('A2', **{ItemField.STATE: 'SOLD'}))
+        dataset.persist()
+        dataset = self.createDataset(Storage.SQLITE)
+        dataset.restore()
+        self.assertEqual('SOLD', dataset.getItem('A2')[ItemField.STATE])
+        dataset.exportXml()
+        xmlDataset.restore()
+        self.assertEqual('SOLD', xmlDataset.getItem('A2')[ItemField.STATE])
+        self.assertListEqual(xmlDataset.getItems(None), dataset.getItems(None))
+
+    def test_unknownStorage(self):
+        with self.assertRaises(ValueError):
+            self.createDataset('csv')
+
+if __name__ == '__main__':
+    unittest.main()
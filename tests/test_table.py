@@ -24,6 +24,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from tests.datafile import Datafile
 from artshowkeeper.model.item import ItemField
 from artshowkeeper.model.table import Table
+from artshowkeeper.model.predicate import compilePredicate
 
 class TestTable(unittest.TestCase):
     def setUpClass(cls):
@@ -43,6 +44,42 @@ class TestTable(unittest.TestCase):
         self.table.save(True)
         self.assertTrue(self.table.load())
         
+    def test_loadStream(self):
+        filename = self.dataFile.getFilename()
+        with open(filename, mode='w', encoding='utf-8') as xmlFile:
+            xmlFile.write(
+                    '<?xml version="1.0" encoding="utf-8"?>\n'
+                    '<ArtShowItems>\n'
+                    '    <Item><Code>A1</Code><Title>Cat &amp; &lt;Mouse&gt;</Title><Note></Note></Item>\n'
+                    '    <Other><Code>B1</Code></Other>\n'
+                    '    <Item><Code>A2</Code><Note>Line1\nLine2</Note></Item>\n'
+                    '</ArtShowItems>\n')
+        self.assertTrue(self.table.load())
+        self.assertListEqual(
+                [{'Code': 'A1', 'Title': 'Cat & <Mouse>', 'Note': None},
+                 {'Code': 'A2', 'Title': None, 'Note': 'Line1\nLine2'}],
+                self.table.select(['Code', 'Title', 'Note']))
+
+        # Rows are kept if the root does not match
+        with open(filename, mode='w', encoding='utf-8') as xmlFile:
+            xmlFile.write('<?xml version="1.0" encoding="utf-8"?><Other><Item><Code>C1</Code></Item></Other>')
+        self.assertFalse(self.table.load())
+        self.assertEqual(2, self.table.len())
+
+    def test_saveStream(self):
+        self.assertTrue(self.table.load())
+        self.assertTrue(self.table.insert({'Code': 'Z1', 'Title': 'Cat & <"Mouse">', 'Note': 'Line1\nLine2'}, 'Code'))
+        expectedRows = self.table.select(ItemField.ALL_PERSISTENT)
+        self.table.save()
+        with open(self.dataFile.getFilename(), mode='rb') as xmlFile:
+            content = xmlFile.read()
+        self.assertTrue(content.startswith(b'<?xml version="1.0" encoding="utf-8"?><ArtShowItems><Item>'))
+        self.assertIn(b'<Title>Cat &amp; &lt;&quot;Mouse&quot;&gt;</Title>', content)
+
+        table = Table(self.logger, self.dataFile.getFilename(), 'ArtShowItems', 'Item', ItemField.ALL_PERSISTENT)
+        self.assertTrue(table.load())
+        self.assertListEqual(expectedRows, table.select(ItemField.ALL_PERSISTENT))
+
     def test_select(self):
         self.assertTrue(self.table.load())
 
@@ -123,5 +160,301 @@ class TestTable(unittest.TestCase):
                 len(rows), 0,
                 'Table.Delete: Deleted record selected ({0}).'.format(rows))
 
+    def test_structuredPredicate(self):
+        self.assertTrue(self.table.load())
+
+        # Structured predicate selects the same rows as the expression
+        self.assertListEqual(
+                self.table.select(['Code'], 'Owner == "1" and State in ["SOLD", "SHOW"]'),
+                self.table.select(['Code'], [('Owner', '==', '1'), ('State', 'in', ['SOLD', 'SHOW'])]))
+        self.assertEqual(1, self.table.count(('Code', '==', 'A2')))
+        self.assertEqual(0, self.table.count(('Code', '==', 'A"2')))
+
+        # Update and delete accept structured predicates
+        self.assertEqual(1, self.table.update({'Title': 'ragouC'}, ('Code', '==', 'A2')))
+        self.assertEqual(1, self.table.count([('Code', '==', 'A2'), ('Title', '==', 'ragouC')]))
+        self.assertEqual(1, self.table.delete(('Code', '==', 'A2')))
+        self.assertEqual(0, self.table.count(('Code', '==', 'A2')))
+
+    def test_index(self):
+        self.table.createIndex(['Code'], unique=True)
+        self.table.createIndex(['Owner', 'State'])
+        self.assertTrue(self.table.load())
+
+        # Indexed lookups return the same rows as a scan
+        self.assertListEqual(
+                self.table.select(['Code'], 'Owner == "1" and State == "SOLD"'),
+                [row for row in self.table.select(['Code', 'Owner', 'State'])
+                        if row.pop('Owner') == '1' and row.pop('State') == 'SOLD'])
+
+        # Unique index refuses duplicates even without a primary key
+        self.assertFalse(self.table.insert({'Code': 'A2', 'Title': 'Meow'}, None))
+        self.assertTrue(self.table.insert({'Code': 'A234', 'Owner': '1', 'State': 'SOLD'}, None))
+        self.assertEqual(1, self.table.count(('Code', '==', 'A234')))
+
+        # Index follows updates and deletes
+        numSold = self.table.count([('Owner', '==', '1'), ('State', '==', 'SOLD')])
+        self.assertEqual(1, self.table.update({'Code': 'A235', 'State': 'DLVR'}, ('Code', '==', 'A234')))
+        self.assertEqual(0, self.table.count(('Code', '==', 'A234')))
+        self.assertEqual(1, self.table.count(('Code', '==', 'A235')))
+        self.assertEqual(numSold - 1, self.table.count([('Owner', '==', '1'), ('State', '==', 'SOLD')]))
+        self.assertEqual(1, self.table.delete('Code == "A235"'))
+        self.assertEqual(0, self.table.count([('Owner', '==', '1'), ('State', '==', 'DLVR'), ('Code', '==', 'A235')]))
+        self.assertTrue(self.table.insert({'Code': 'A235'}, 'Code'))
+
+    def test_indexIn(self):
+        self.table.createIndex(['State'])
+        self.table.createIndex(['Owner'])
+        self.assertTrue(self.table.load())
+        expression = 'Owner == "1" and State in ["SOLD", "NSOL", "XXXX"]'
+        expected = [row for row in self.table.select(['Code', 'Owner', 'State'])
+                if row.pop('Owner') == '1' and row.pop('State') in ['SOLD', 'NSOL']]
+        self.assertLess(0, len(expected))
+        self.assertListEqual(expected, self.table.select(['Code'], expression))
+        self.assertListEqual([], self.table.select(['Code'], ('State', 'in', [])))
+        self.assertEqual(
+                self.table.count('Title is None'),
+                self.table.count([('Owner', 'in', ['1', None]), ('Title', 'is', None)]) + self.table.count('Title is None and Owner not in ["1", None]'))
+
+    def test_selectConverted(self):
+        convertedCodes = []
+        def convert(row):
+            convertedCodes.append(row['Code'])
+            if row['Owner'] is None:
+                return None
+            else:
+                return {'Code': row['Code'], 'Owner': int(row['Owner'])}
+        table = Table(self.logger, self.dataFile.getFilename(), 'ArtShowItems', 'Item', ItemField.ALL_PERSISTENT, converter=convert)
+        self.assertTrue(table.load())
+        numRows = table.len()
+
+        # Rows are converted once and rows converted to None are skipped
+        rows = table.selectConverted()
+        self.assertEqual(table.count('Owner is not None'), len(rows))
+        self.assertEqual(numRows, len(convertedCodes))
+        self.assertListEqual(rows, table.selectConverted())
+        self.assertEqual(numRows, len(convertedCodes))
+
+        # Converted rows are shared
+        self.assertIs(rows[0], table.selectConverted(('Code', '==', rows[0]['Code']))[0])
+
+        # Updated row is converted again
+        self.assertEqual(1, table.update({'Owner': '99'}, ('Code', '==', 'A2')))
+        self.assertListEqual([{'Code': 'A2', 'Owner': 99}], table.selectConverted('Code == "A2"'))
+        self.assertListEqual(['A2'], convertedCodes[numRows:])
+
+    def test_aggregate(self):
+        def countByState(row):
+            if row['State'] is None:
+                return None
+            else:
+                return {row['State']: 1, 'Amount': int(row['Amount'] or 0)}
+        def scan():
+            totals = {}
+            for row in self.table.select(['State', 'Amount'], 'State is not None'):
+                for name, value in countByState(row).items():
+                    totals[name] = totals.get(name, 0) + value
+            return {name: value for name, value in totals.items() if value != 0}
+        def totals(aggregate, rebuild=False):
+            return {name: value for name, value in self.table.aggregate(aggregate, rebuild).items() if value != 0}
+
+        self.assertTrue(self.table.load())
+        aggregate = self.table.createAggregate(['State', 'Amount'], countByState)
+        self.assertLess(0, len(totals(aggregate)))
+        self.assertDictEqual(scan(), totals(aggregate))
+
+        # Totals follow inserts, updates and deletes
+        self.assertTrue(self.table.insert({'Code': 'A999', 'State': 'SOLD', 'Amount': '10'}, 'Code'))
+        self.assertEqual(1, self.table.update({'State': 'DLVR', 'Amount': '20'}, ('Code', '==', 'A2')))
+        self.assertEqual(1, self.table.update({'Title': 'Ignored'}, ('Code', '==', 'A999')))
+        self.assertEqual(1, self.table.delete('Code == "A3"'))
+        self.assertDictEqual(scan(), totals(aggregate))
+
+        # Rolled back batch restores totals
+        expectedTotals = totals(aggregate)
+        self.table.begin()
+        self.assertEqual(1, self.table.update({'State': 'FINI'}, ('Code', '==', 'A999')))
+        self.assertEqual(1, self.table.delete('Code == "A2"'))
+        self.table.rollback()
+        self.assertDictEqual(expectedTotals, totals(aggregate))
+
+        # Totals are calculated again on load and on rebuild
+        self.assertTrue(self.table.load())
+        self.assertDictEqual(scan(), totals(aggregate))
+        self.assertDictEqual(scan(), totals(aggregate, rebuild=True))
+
+    def test_journal(self):
+        filename = self.dataFile.getFilename()
+        journalFilename = filename + '.journal'
+        def createTable():
+            return Table(self.logger, filename, 'ArtShowItems', 'Item', ItemField.ALL_PERSISTENT, journal=True)
+        try:
+            table = createTable()
+            self.assertTrue(table.load())
+            self.assertTrue(table.insert({'Code': 'A999', 'Title': 'Meow'}, 'Code'))
+            self.assertEqual(1, table.update({'Title': 'ragouC'}, ('Code', '==', 'A2')))
+            self.assertEqual(1, table.delete('Code == "A3"'))
+            expectedRows = table.select(ItemField.ALL_PERSISTENT)
+
+            # Changes are in the journal, not in the file
+            table.save()
+            self.assertTrue(os.path.isfile(journalFilename))
+            self.assertTrue(self.table.load())
+            self.assertEqual(1, self.table.count('Code == "A3"'))
+
+            # Journal is replayed on load
+            table = createTable()
+            self.assertTrue(table.load())
+            self.assertListEqual(expectedRows, table.select(ItemField.ALL_PERSISTENT))
+
+            # Incomplete record is dropped
+            with open(journalFilename, mode='a') as journalFile:
+                journalFile.write('{"op":"delete","where":"Code')
+            table = createTable()
+            self.assertTrue(table.load())
+            self.assertListEqual(expectedRows, table.select(ItemField.ALL_PERSISTENT))
+            self.assertTrue(table.insert({'Code': 'A1000'}, 'Code'))
+            expectedRows = table.select(ItemField.ALL_PERSISTENT)
+
+            # Compacting saves the file and drops the journal
+            table.compact()
+            self.assertFalse(os.path.isfile(journalFilename))
+            table = createTable()
+            self.assertTrue(table.load())
+            self.assertListEqual(expectedRows, table.select(ItemField.ALL_PERSISTENT))
+        finally:
+            if os.path.isfile(journalFilename):
+                os.remove(journalFilename)
+
+    def test_journalTypedTerms(self):
+        filename = self.dataFile.getFilename()
+        journalFilename = filename + '.journal'
+        def createTable():
+            return Table(self.logger, filename, 'ArtShowItems', 'Item', ItemField.ALL_PERSISTENT, journal=True)
+        try:
+            # Loaded rows contain strings, inserted ones keep their types
+            table = createTable()
+            self.assertTrue(table.load())
+            self.assertTrue(table.insert({'Code': 'A999', 'Charity': 10}, 'Code'))
+            self.assertTrue(table.insert({'Code': 'A1000', 'Charity': 20}, 'Code'))
+            self.assertEqual(1, table.update({'Title': 'Updated'}, ('Charity', '==', 10)))
+            self.assertEqual(1, table.delete(('Charity', '==', 20)))
+            expectedRows = table.select(['Code', 'Title'])
+            table.save()
+
+            # Replay changes the same rows
+            table = createTable()
+            self.assertTrue(table.load())
+            self.assertListEqual(expectedRows, table.select(['Code', 'Title']))
+            self.assertListEqual([{'Code': 'A999'}], table.select(['Code'], ('Title', '==', 'Updated')))
+        finally:
+            if os.path.isfile(journalFilename):
+                os.remove(journalFilename)
+
+    def test_staleJournal(self):
+        filename = self.dataFile.getFilename()
+        journalFilename = filename + '.journal'
+        def createTable():
+            return Table(self.logger, filename, 'ArtShowItems', 'Item', ItemField.ALL_PERSISTENT, journal=True)
+        try:
+            table = createTable()
+            self.assertTrue(table.load())
+            self.assertTrue(table.insert({'Code': 'A999', 'Title': 'Meow'}, 'Code'))
+            self.assertEqual(1, table.delete('Code == "A3"'))
+            table.save()
+            with open(journalFilename, mode='rb') as journalFile:
+                journal = journalFile.read()
+            expectedRows = table.select(ItemField.ALL_PERSISTENT)
+
+            # Crash after the file is saved but before the journal is removed
+            table.compact()
+            with open(journalFilename, mode='wb') as journalFile:
+                journalFile.write(journal)
+
+            # Records included in the file are not replayed
+            table = createTable()
+            self.assertTrue(table.load())
+            self.assertListEqual(expectedRows, table.select(ItemField.ALL_PERSISTENT))
+            self.assertEqual(1, table.count(('Code', '==', 'A999')))
+        finally:
+            if os.path.isfile(journalFilename):
+                os.remove(journalFilename)
+
+    def test_batch(self):
+        filename = self.dataFile.getFilename()
+        journalFilename = filename + '.journal'
+        def createTable():
+            table = Table(self.logger, filename, 'ArtShowItems', 'Item', ItemField.ALL_PERSISTENT, journal=True)
+            table.createIndex(['Code'], unique=True)
+            return table
+        try:
+            table = createTable()
+            self.assertTrue(table.load())
+            expectedRows = table.select(ItemField.ALL_PERSISTENT)
+
+            # Rolled back batch restores rows, their order and indexes
+            table.begin()
+            self.assertTrue(table.insert({'Code': 'A999', 'Title': 'Meow'}, 'Code'))
+            self.assertEqual(1, table.update({'Title': 'ragouC', 'Extra': 1}, ('Code', '==', 'A2')))
+            self.assertEqual(1, table.delete('Code == "A3"'))
+            self.assertFalse(table.changed())
+            table.rollback()
+            self.assertListEqual(expectedRows, table.select(ItemField.ALL_PERSISTENT))
+            self.assertListEqual([{'Code': 'A2', 'Extra': None}], table.select(['Code', 'Extra'], ('Code', '==', 'A2')))
+            self.assertEqual(0, table.count(('Code', '==', 'A999')))
+            self.assertEqual(1, table.count(('Code', '==', 'A3')))
+            self.assertFalse(table.changed())
+            self.assertFalse(os.path.isfile(journalFilename))
+
+            # Committed batch is a single change and a single journal record
+            table.begin()
+            with self.assertRaises(RuntimeError):
+                table.begin()
+            self.assertTrue(table.insert({'Code': 'A999', 'Title': 'Meow'}, 'Code'))
+            self.assertEqual(1, table.delete('Code == "A3"'))
+            table.commit()
+            self.assertTrue(table.changed())
+            self.assertEqual(1, table.mutations())
+            expectedRows = table.select(ItemField.ALL_PERSISTENT)
+            with open(journalFilename, mode='r') as journalFile:
+                self.assertEqual(1, len(journalFile.readlines()))
+
+            table = createTable()
+            self.assertTrue(table.load())
+            self.assertListEqual(expectedRows, table.select(ItemField.ALL_PERSISTENT))
+        finally:
+            if os.path.isfile(journalFilename):
+                os.remove(journalFilename)
+
+    def test_compilePredicate(self):
+        # Expressions are compiled once
+        self.assertIs(
+                compilePredicate('Code == "A2" and Title is None'),
+                compilePredicate('Code == "A2" and Title is None'))
+        self.assertIsNone(compilePredicate(None))
+
+        # Simple expressions are decomposed to terms
+        self.assertTupleEqual(
+                (('Code', '==', 'A2'), ('Title', 'is', None)),
+                compilePredicate('Code == "A2" and Title is None').terms)
+        self.assertIsNone(compilePredicate('Code == "A2" or Title is None').terms)
+
+        # All forms evaluate the same way
+        row = {'Code': 'A2', 'Title': None, 'State': 'SOLD'}
+        for expression in [
+                'Code == "A2" and Title is None',
+                'Code == "A2" or Title is None',
+                'State in ["SOLD", "DLVR"]',
+                ('State', 'in', ['SOLD', 'DLVR']),
+                [('Code', '==', 'A2'), ('Title', 'is', None)]]:
+            self.assertTrue(compilePredicate(expression)(row), str(expression))
+        self.assertFalse(compilePredicate(('Code', '!=', 'A2'))(row))
+
+        # Unknown columns behave as undefined names
+        with self.assertRaises(NameError):
+            compilePredicate(('Unknown', '==', 'A2'))(row)
+        with self.assertRaises(ValueError):
+            compilePredicate(('Code', '~', 'A2'))
+
 if __name__ == '__main__':
     unittest.main()